@@ -0,0 +1,134 @@
+"""
+Fast JSON responses
+Endpoints keep declaring their response_model, so the OpenAPI schema is
+unchanged, but return FastJSONResponse bodies built straight from the
+storage models instead of having FastAPI validate them into the response
+schema and run them through jsonable_encoder. project() copies exactly the
+fields the response schema declares, so the bodies are the same.
+
+Rarely changing bodies are kept rendered in RenderedBodies, with a strong
+ETag, and served by conditional_response(), which answers a matching
+If-None-Match with 304 Not Modified.
+"""
+import hashlib
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Union, get_args, get_origin
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from app.models.serialization import dumps
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when available; bytes content is sent as is"""
+    
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+_projections: Dict[type, Callable[[Any], Dict]] = {}
+_projections_lock = threading.RLock()
+
+
+def _value(annotation: Any, names: Dict[str, Any]) -> str:
+    """Expression template over `{}` converting one attribute value for the given annotation"""
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        inner = _value(args[0], names)
+        return "{}" if inner == "{}" else f"(None if (_v := {{}}) is None else {inner.format('_v')})"
+    if get_origin(annotation) in (list, List):
+        inner = _value(get_args(annotation)[0], names)
+        return "{}" if inner == "{}" else f"[{inner.format('x')} for x in {{}}]"
+    if annotation is datetime:
+        return "{}.isoformat()"
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        names[f"_project_{annotation.__name__}"] = projection(annotation)
+        return f"_project_{annotation.__name__}({{}})"
+    # Enums are written as their value by the encoder
+    return "{}"
+
+
+def projection(schema: type) -> Callable[[Any], Dict]:
+    """Function turning an object with the schema's fields as attributes into a JSON-ready dict"""
+    project = _projections.get(schema)
+    if project is None:
+        with _projections_lock:
+            names: Dict[str, Any] = {}
+            items = [
+                f"{name!r}: {_value(field.annotation, names).format('obj.' + name)}"
+                for name, field in schema.model_fields.items()
+            ]
+            source = f"def project(obj):\n    return {{{', '.join(items)}}}\n"
+            exec(compile(source, f"<projection {schema.__name__}>", "exec"), names)
+            project = _projections[schema] = names["project"]
+    return project
+
+
+def render(schema: type, obj: Any) -> bytes:
+    return dumps(projection(schema)(obj))
+
+
+def render_list(schema: type, objs: Iterable[Any]) -> bytes:
+    project = projection(schema)
+    return dumps([project(obj) for obj in objs])
+
+
+class RenderedBody:
+    __slots__ = ("body", "etag")
+    
+    def __init__(self, body: bytes):
+        self.body = body
+        # Strong validator: equal tags mean byte-identical bodies
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+class RenderedBodies:
+    """
+    Rendered response bodies by key, all dropped at once when the version
+    of the data they were rendered from changes
+    """
+    
+    def __init__(self):
+        self._version: Hashable = None
+        self._bodies: Dict[Hashable, RenderedBody] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, version: Hashable, key: Hashable, render: Callable[[], Optional[bytes]]) -> Optional[RenderedBody]:
+        """
+        Get the body for key at version, rendering it on a miss
+        version must be read before the data render() uses: a body rendered
+        from newer data is then at worst dropped early, never kept stale.
+        """
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._bodies = {}
+            body = self._bodies.get(key)
+        if body is None:
+            rendered = render()
+            if rendered is None:
+                return None
+            body = RenderedBody(rendered)
+            with self._lock:
+                if version == self._version:
+                    self._bodies[key] = body
+        return body
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def conditional_response(request: Request, rendered: RenderedBody, cache_control: str, status_code: int = 200) -> Response:
+    """The rendered body, or 304 Not Modified when the client already has it"""
+    headers = {"ETag": rendered.etag, "Cache-Control": cache_control}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _matches(if_none_match, rendered.etag):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(rendered.body, status_code=status_code, headers=headers)
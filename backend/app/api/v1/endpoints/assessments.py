@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from typing import List
 import uuid
 from datetime import datetime
+from app.api.responses import FastJSONResponse, RenderedBodies, RenderedBody, conditional_response, render, render_list
+from app.core.config import settings
 from app.schemas.assessment import AssessmentResponse, AssessmentCreate
 from app.models.assessment import Assessment, Question, TestCase, TestCaseType, Language
 from app.db.json_storage import storage
@@ -9,19 +11,33 @@ from app.db.seed_data import create_default_assessment
 
 router = APIRouter()
 
+# Assessments are read by every candidate at page load but rarely change,
+# so their rendered bodies and ETags are kept until the next create or
+# update, and clients that have the current one get a 304
+rendered_assessments = RenderedBodies()
+ALL_ASSESSMENTS = object()
+
 
 @router.get("", response_model=List[AssessmentResponse])
-async def get_assessments():
+async def get_assessments(request: Request):
     """Get all assessments"""
-    assessments = storage.get_all_assessments()
-    return assessments
+    rendered = rendered_assessments.get(
+        storage.assessments_version(),
+        ALL_ASSESSMENTS,
+        lambda: render_list(AssessmentResponse, storage.get_all_assessments()),
+    )
+    return conditional_response(request, rendered, settings.assessment_cache_control)
 
 
 @router.get("/{assessment_id}", response_model=AssessmentResponse)
-async def get_assessment(assessment_id: str):
+async def get_assessment(assessment_id: str, request: Request):
     """Get assessment by ID"""
-    assessment = storage.get_assessment(assessment_id)
-    if not assessment:
+    def render_assessment():
+        assessment = storage.get_assessment(assessment_id)
+        return render(AssessmentResponse, assessment) if assessment else None
+    
+    rendered = rendered_assessments.get(storage.assessments_version(), assessment_id, render_assessment)
+    if rendered is None:
         # Auto-create default assessment if requested
         if assessment_id == 'default-assessment':
             try:
@@ -31,9 +47,10 @@ async def get_assessment(assessment_id: str):
                 import logging
                 logging.error(f"Error creating default assessment: {e}")
                 raise HTTPException(status_code=500, detail=f"Failed to create default assessment: {str(e)}")
+            rendered = RenderedBody(render(AssessmentResponse, assessment))
         else:
             raise HTTPException(status_code=404, detail="Assessment not found")
-    return assessment
+    return conditional_response(request, rendered, settings.assessment_cache_control)
 
 
 @router.post("/assessments", response_model=AssessmentResponse, status_code=201)
@@ -72,6 +89,8 @@ async def create_assessment(assessment_data: AssessmentCreate):
             hidden_test_cases=hidden_tcs,
             allowed_languages=[Language(lang) for lang in q_data.get("allowed_languages", ["python"])],
             time_limit=q_data.get("time_limit", 60),
+            cache_results=q_data.get("cache_results", True),
+            isolate_test_cases=q_data.get("isolate_test_cases", False),
         )
         questions.append(question)
     
@@ -85,5 +104,5 @@ async def create_assessment(assessment_data: AssessmentCreate):
     )
     
     created_assessment = storage.create_assessment(assessment)
-    return created_assessment
+    return FastJSONResponse(render(AssessmentResponse, created_assessment), status_code=201)
 
@@ -1,15 +1,24 @@
-from fastapi import APIRouter, HTTPException
-from typing import Optional
-import uuid
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, Literal, Optional, Tuple
+import asyncio
+import itertools
 from datetime import datetime
+from app.api.responses import FastJSONResponse, projection, render, render_list
 from app.schemas.assessment import (
     CodeExecutionRequest,
     CodeExecutionResponse,
+    SubmissionJobResponse,
     SubmissionResponse,
+    SubmissionSummaryResponse,
     TestExecutionRequest,
+    TestResultResponse,
 )
-from app.models.assessment import Language, Submission, TestCaseType
-from app.services.code_executor import code_executor_service
+from app.models.assessment import Language, TestCaseType
+from app.models.serialization import dumps, loads
+from app.services.code_executor import COMPILED, RESULT, code_executor_service
+from app.services.grading import NotFoundError, grade_submission, grading_events
+from app.services.submission_queue import submission_workers
 from app.db.json_storage import storage
 
 router = APIRouter()
@@ -18,7 +27,7 @@ router = APIRouter()
 @router.post("", response_model=CodeExecutionResponse)
 async def execute_code(request: CodeExecutionRequest):
     """Execute code with optional input"""
-    result = code_executor_service.execute_code(
+    result = await code_executor_service.execute_code_async(
         code=request.code,
         language=request.language,
         input_data=request.input,
@@ -40,76 +49,105 @@ async def execute_with_tests(request: TestExecutionRequest):
     Returns results for sample test cases, and optionally hidden test cases
     """
     try:
-        # Get assessment first (this will auto-create default-assessment if needed)
-        assessment = storage.get_assessment(request.assessment_id)
-        if not assessment:
-            # Try to auto-create default assessment
-            if request.assessment_id == 'default-assessment':
-                from app.db.seed_data import create_default_assessment
-                assessment = create_default_assessment()
-            else:
-                raise HTTPException(status_code=404, detail="Assessment not found")
-        
-        # Run test cases
-        test_results, compilation_logs = code_executor_service.run_test_cases(
-            code=request.code,
-            language=request.language,
-            question_id=request.question_id,
-            include_hidden=request.include_hidden,
-        )
-        
-        question = None
-        for q in assessment.questions:
-            if q.id == request.question_id:
-                question = q
-                break
-        
-        if not question:
-            raise HTTPException(status_code=404, detail="Question not found")
-        
-        # Create sets of test case IDs for quick lookup
-        sample_test_case_ids = {tc.id for tc in question.sample_test_cases}
-        hidden_test_case_ids = {tc.id for tc in question.hidden_test_cases}
-        
-        # Count passed test cases
-        sample_passed = sum(
-            1 for tr in test_results 
-            if tr.passed and tr.test_case_id in sample_test_case_ids
-        )
-        sample_total = len(question.sample_test_cases)
-        
-        hidden_passed = sum(
-            1 for tr in test_results 
-            if tr.passed and tr.test_case_id in hidden_test_case_ids
-        )
-        hidden_total = len(question.hidden_test_cases) if request.include_hidden else 0
-        
-        # Create submission
-        submission = Submission(
-            id=str(uuid.uuid4()),
-            assessment_id=request.assessment_id,
-            question_id=request.question_id,
-            candidate_id=request.candidate_id,
-            code=request.code,
-            language=request.language,
-            test_results=test_results,
-            sample_passed=sample_passed,
-            sample_total=sample_total,
-            hidden_passed=hidden_passed,
-            hidden_total=hidden_total,
-            compilation_logs=compilation_logs,
-            submitted_at=datetime.utcnow(),
-        )
-        
-        # Save submission
-        saved_submission = storage.create_submission(submission)
-        
-        return saved_submission
-    
+        saved_submission = await grade_submission(request)
+        return FastJSONResponse(render(SubmissionResponse, saved_submission))
+    except NotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Execution error: {str(e)}")
+
+
+def _sse(event: str, data: Any) -> bytes:
+    """One Server-Sent Event; the JSON data is encoded on a single line"""
+    return b"event: " + event.encode("ascii") + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+def _grading_sse(event: Tuple) -> bytes:
+    if event[0] == COMPILED:
+        return _sse("compiled", {"compiled": event[1], "compile_error": event[2]})
+    if event[0] == RESULT:
+        return _sse("result", {"index": event[1], "test_result": projection(TestResultResponse)(event[2])})
+    return _sse("submission", projection(SubmissionResponse)(event[1]))
+
+
+@router.post("/test/stream")
+async def stream_with_tests(request: TestExecutionRequest):
+    """
+    Execute code and run test cases like POST /execute/test, streaming the
+    results as Server-Sent Events (text/event-stream):
+        compiled: {"compiled": bool, "compile_error": str | null}
+        result: {"index": int, "test_result": TestResultResponse}, per test
+            case as soon as its result is final
+        submission: SubmissionResponse, once the graded submission is stored
+    Errors found before the first event are answered with an error status
+    as for POST /execute/test; later ones end the stream with an error event.
+    """
+    events = grading_events(request)
+    try:
+        first = await events.__anext__()
+    except NotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Execution error: {str(e)}")
+    
+    async def stream():
+        try:
+            yield _grading_sse(first)
+            async for event in events:
+                yield _grading_sse(event)
+        except Exception as e:
+            yield _sse("error", {"detail": f"Execution error: {str(e)}"})
+        finally:
+            # A client that went away stops the test cases not started yet
+            await events.aclose()
+    
+    # Proxies must not buffer the events
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
+
+
+def _job_body(job: Dict) -> Dict:
+    """A job from the queue in the shape of SubmissionJobResponse"""
+    def timestamp(value: Optional[float]) -> Optional[str]:
+        # Naive UTC, like submitted_at
+        return datetime.utcfromtimestamp(value).isoformat() if value is not None else None
+    
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "position": job["position"],
+        "enqueued_at": timestamp(job["enqueued_at"]),
+        "started_at": timestamp(job["started_at"]),
+        "finished_at": timestamp(job["finished_at"]),
+        "submission": loads(job["result"]) if job["result"] else None,
+        "error": job["error"],
+    }
+
+
+@router.post("/jobs", response_model=SubmissionJobResponse, status_code=202)
+async def enqueue_submission(request: TestExecutionRequest):
+    """
+    Queue code to be run against the test cases, like POST /execute/test
+    Returns the job at once; poll GET /execute/jobs/{job_id} for the graded submission
+    """
+    job = await submission_workers.submit(request)
+    return FastJSONResponse(_job_body(job), status_code=202)
+
+
+@router.get("/jobs/{job_id}", response_model=SubmissionJobResponse)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=25, description="Seconds to wait for the job to finish before answering"),
+):
+    """Get a queued submission, with the graded submission once it is done"""
+    job = await submission_workers.wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return FastJSONResponse(_job_body(job))
 
 
 @router.get("/submissions", response_model=list[SubmissionResponse])
@@ -117,12 +155,50 @@ async def get_submissions(
     assessment_id: Optional[str] = None,
     question_id: Optional[str] = None,
     candidate_id: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; the next page's cursor is sent in the X-Next-Cursor header"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value of the previous page"),
+    fields: Literal["full", "summary"] = Query("full", description="summary leaves out code and test results"),
+    format: Literal["json", "ndjson"] = Query("json", description="ndjson streams one submission per line"),
 ):
     """Get submissions with optional filters"""
-    submissions = storage.get_submissions(
+    if cursor is not None:
+        try:
+            after = int(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    else:
+        after = None
+    
+    if limit is None and cursor is None and fields == "full" and format == "json":
+        body = await asyncio.to_thread(lambda: render_list(SubmissionResponse, storage.get_submissions(
+            assessment_id=assessment_id,
+            question_id=question_id,
+            candidate_id=candidate_id,
+        )))
+        return FastJSONResponse(body)
+    
+    project = projection(SubmissionSummaryResponse if fields == "summary" else SubmissionResponse)
+    rows = storage.iter_submissions(
         assessment_id=assessment_id,
         question_id=question_id,
         candidate_id=candidate_id,
+        after=after,
     )
-    return submissions
-
+    if limit is not None:
+        rows = itertools.islice(rows, limit)
+    
+    if format == "ndjson":
+        # Rows are encoded as they are read, so memory stays flat however
+        # many submissions match
+        def lines():
+            for _, submission in rows:
+                yield dumps(project(submission)) + b"\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    
+    def page():
+        return [(position, project(submission)) for position, submission in rows]
+    items = await asyncio.to_thread(page)
+    headers = {}
+    if limit is not None and len(items) == limit:
+        headers["X-Next-Cursor"] = str(items[-1][0])
+    return FastJSONResponse([item for _, item in items], headers=headers)
@@ -1,5 +1,12 @@
+import asyncio
 from fastapi import APIRouter
 from pydantic import BaseModel
+from typing import Any, Dict
+from app.services.gvisor_executor import executor as gvisor_executor
+from app.services.direct_executor import direct_executor
+from app.services.code_executor import code_executor_service
+from app.services.submission_queue import submission_workers
+from app.db.json_storage import storage
 
 router = APIRouter()
 
@@ -14,3 +21,15 @@ async def health_check():
     """Health check endpoint"""
     return HealthResponse(status="healthy", message="Service is running")
 
+
+
+@router.get("/metrics", response_model=Dict[str, Any])
+async def metrics():
+    """Cache, pool and queue metrics"""
+    return {
+        "sandbox_pool": gvisor_executor.pool.stats(),
+        "compile_cache": direct_executor.compile_cache.stats() if direct_executor.compile_cache else None,
+        "result_cache": code_executor_service.result_cache.stats(),
+        "storage": storage.stats(),
+        "submission_queue": await asyncio.to_thread(submission_workers.stats),
+    }
@@ -1,5 +1,7 @@
+import os
 from pydantic_settings import BaseSettings
-from typing import Optional, List
+from typing import Optional, List, Dict
+from app.models.assessment import Language
 
 
 class Settings(BaseSettings):
@@ -11,15 +13,58 @@ class Settings(BaseSettings):
     # CORS - in production, set specific origins
     cors_origins: str = "*"  # Comma-separated list of allowed origins
     
+    # HTTP caching
+    assessment_cache_control: str = "no-cache"  # Cache-Control of assessment reads; clients revalidate them by ETag
+    
     # gVisor
     gvisor_runtime_path: str = "/usr/local/bin/runsc"
     gvisor_timeout: int = 60  # Increased for C++ compilation
     gvisor_memory_limit: str = "512m"
     gvisor_cpu_limit: str = "1"
     gvisor_fallback_to_docker: bool = False  # Fallback to regular Docker if gVisor unavailable
+    gvisor_image_prefix: str = "assessment-sandbox"  # Runtime images are tagged <prefix>-<language>:<version>
+    gvisor_prebuild_images: bool = False  # Build/verify runtime images at startup
+    
+    # gVisor warm sandbox pool
+    gvisor_pool_size: int = 2  # Idle pre-started sandboxes kept per language (0 disables warming)
+    gvisor_pool_sizes: str = ""  # Per-language overrides, e.g. "python=4,java=2"
+    gvisor_pool_max_reuse: int = 1  # Submissions a sandbox serves before it is destroyed
+    gvisor_pool_idle_ttl: int = 300  # Seconds an idle sandbox is kept before it is destroyed
+    
+    # Compile cache (DirectExecutor)
+    compile_cache_enabled: bool = True
+    compile_cache_path: Optional[str] = None  # Defaults to <tmp>/compile_cache, shared by all workers on the host
+    compile_cache_max_mb: int = 256
+    
+    # Piston API
+    piston_api_url: str = "https://emkc.org/api/v2/piston/"
+    piston_api_key: Optional[str] = None
+    piston_max_connections: int = 32  # Concurrent requests per event loop
+    piston_max_parallel_test_cases: int = 1  # Test cases sent at once per submission; the public API is rate limited
+    piston_rate_limit_retries: int = 3  # Retries of a request answered with 429 Too Many Requests
+    piston_rate_limit_backoff: float = 0.5  # Seconds before the first retry, doubled for each further one
+    
+    # Test case execution
+    max_parallel_test_cases: int = 4  # Test cases run concurrently per submission
+    max_concurrent_executions: int = 16  # Test cases running at once across all submissions
+    result_cache_size: int = 10000  # Memoized test case outcomes (0 disables the cache)
+    result_cache_ttl: int = 600  # Seconds a memoized outcome stays valid
+    batch_test_cases: bool = False  # Run a submission's test cases in one runner process where supported
     
     # Storage
+    storage_backend: str = "json"  # "json" (files under storage_path) or "sqlite"
     storage_path: str = "./storage"
+    sqlite_path: Optional[str] = None  # Defaults to <storage_path>/assessments.db
+    submission_log_fsync_interval: float = 0.1  # Seconds between fsyncs of the submission log (0 = every submission)
+    submission_segment_max_mb: float = 64  # Roll the submission log into a compressed segment past this size (0 = never)
+    submission_segment_max_age_hours: float = 0  # ... or once its oldest submission is this old (0 = never)
+    
+    # Submission job queue (POST /execute/jobs)
+    submission_workers: int = 2  # Queued submissions graded at once per server process (0 = only enqueue)
+    submission_queue_path: Optional[str] = None  # Defaults to <storage_path>/jobs.db
+    submission_job_lease: int = 30  # Seconds a dead worker's job waits before another worker runs it again
+    submission_job_max_attempts: int = 3  # Runs of a job whose workers keep dying before it is failed
+    submission_job_retention_hours: float = 24  # Finished jobs are kept this long for polling
     
     @property
     def allowed_origins(self) -> List[str]:
@@ -28,10 +73,35 @@ class Settings(BaseSettings):
             return ["*"]
         return [origin.strip() for origin in self.cors_origins.split(",") if origin.strip()]
     
+    @property
+    def sandbox_pool_sizes(self) -> Dict[Language, int]:
+        """Parse per-language sandbox pool sizes, falling back to gvisor_pool_size"""
+        sizes = {language: self.gvisor_pool_size for language in Language}
+        for entry in self.gvisor_pool_sizes.split(","):
+            if "=" in entry:
+                language, size = entry.split("=", 1)
+                sizes[Language(language.strip())] = int(size)
+        return sizes
+    
+    @property
+    def compile_cache_dir(self) -> str:
+        """Get the compile cache directory"""
+        import tempfile
+        return self.compile_cache_path or os.path.join(tempfile.gettempdir(), "compile_cache")
+    
+    @property
+    def sqlite_database(self) -> str:
+        """Get the SQLite database file used by the sqlite storage backend"""
+        return self.sqlite_path or os.path.join(self.storage_path, "assessments.db")
+    
+    @property
+    def submission_queue_database(self) -> str:
+        """Get the SQLite database file holding the submission job queue"""
+        return self.submission_queue_path or os.path.join(self.storage_path, "jobs.db")
+    
     @property
     def actual_port(self) -> int:
         """Get port from PORT env var (for Railway/cloud) or use configured port"""
-        import os
         return int(os.getenv("PORT", self.port))
     
     class Config:
@@ -0,0 +1,60 @@
+"""
+Content-addressed store for submitted source code
+Each distinct source is written once, to blobs/<first 2 hex digits>/<rest of
+the SHA-256>, and submissions reference it by hash. Blobs are immutable;
+the references to them are counted by the submission index, and
+unreferenced blobs are removed by collect().
+"""
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Callable
+from app.models.assessment import source_hash
+
+
+class BlobStore:
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+    
+    def _path(self, blob_hash: str) -> Path:
+        return self.root / blob_hash[:2] / blob_hash[2:]
+    
+    def put(self, code: str, blob_hash: str = None) -> str:
+        """Store code unless it is already stored; returns its hash"""
+        blob_hash = blob_hash or source_hash(code)
+        path = self._path(blob_hash)
+        if path.exists():
+            return blob_hash
+        path.parent.mkdir(exist_ok=True)
+        staging = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(staging, "w", encoding="utf-8") as f:
+                f.write(code)
+                f.flush()
+                os.fsync(f.fileno())
+            # Concurrent writers of the same blob write the same bytes
+            os.replace(staging, path)
+        except BaseException:
+            staging.unlink(missing_ok=True)
+            raise
+        return blob_hash
+    
+    def get(self, blob_hash: str) -> str:
+        return self._path(blob_hash).read_text(encoding="utf-8")
+    
+    def collect(self, references: Callable[[str], int]) -> int:
+        """
+        Delete blobs with no references; returns the number deleted
+        The caller must keep new references from being added meanwhile.
+        """
+        deleted = 0
+        for path in self.root.glob("??/*"):
+            if path.name.startswith("."):
+                continue
+            if references(path.parent.name + path.name) == 0:
+                path.unlink(missing_ok=True)
+                deleted += 1
+        logging.info(f"Collected {deleted} unreferenced blobs from {self.root}")
+        return deleted
@@ -0,0 +1,196 @@
+"""
+Persistent queue of submissions waiting to be graded
+A SQLite database in WAL mode next to the other storage files, so queued
+jobs survive a restart and the workers of every server process share one
+queue. A worker claims a job with a lease that it keeps renewing while it
+grades; the job of a worker that died is claimed again once its lease has
+run out.
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Most recently started jobs the wait time statistics are taken over
+WAIT_SAMPLE_SIZE = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    owner TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, seq);
+"""
+
+JOB_COLUMNS = ("id", "status", "result", "error", "attempts", "enqueued_at", "started_at", "finished_at")
+
+
+class JobQueue:
+    def __init__(self, database_path: str = None):
+        self.database_path = Path(database_path or settings.submission_queue_database)
+        self.database_path.parent.mkdir(parents=True, exist_ok=True)
+        # sqlite3 connections must not be shared between threads
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection; use it as a context manager for a transaction"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.database_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    def enqueue(self, job_id: str, request: str) -> Dict:
+        """Add a job for a JSON-encoded TestExecutionRequest"""
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, request, enqueued_at) VALUES (?, ?, ?, ?)",
+                (job_id, QUEUED, request, time.time()),
+            )
+        return self.get(job_id)
+    
+    def claim(self, owner: str, lease: float, max_attempts: int) -> Optional[Tuple[str, str, int]]:
+        """
+        Take the oldest queued job, or one whose worker's lease has run out
+        Returns: (job ID, request, attempt number) or None when there is nothing to do
+        """
+        now = time.time()
+        with self._connection() as conn:
+            # A job whose workers keep dying is given up on rather than
+            # taking down every worker in turn
+            conn.execute(
+                """
+                UPDATE jobs SET status = ?, error = ?, finished_at = ?, owner = NULL, lease_until = NULL
+                WHERE status = ? AND lease_until < ? AND attempts >= ?
+                """,
+                (FAILED, f"Gave up after {max_attempts} attempts", now, RUNNING, now, max_attempts),
+            )
+            row = conn.execute(
+                """
+                UPDATE jobs SET
+                    status = ?, owner = ?, lease_until = ?, attempts = attempts + 1,
+                    started_at = COALESCE(started_at, ?)
+                WHERE seq = (
+                    SELECT seq FROM jobs
+                    WHERE status = ? OR (status = ? AND lease_until < ?)
+                    ORDER BY seq LIMIT 1
+                )
+                RETURNING id, request, attempts
+                """,
+                (RUNNING, owner, now + lease, now, QUEUED, RUNNING, now),
+            ).fetchone()
+        return tuple(row) if row else None
+    
+    def renew(self, owner: str, lease: float):
+        """Extend the leases of every job the owner is running"""
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = ?",
+                (time.time() + lease, owner, RUNNING),
+            )
+    
+    def finish(self, job_id: str, owner: str, result: Optional[str], error: Optional[str]) -> bool:
+        """Record a job's outcome; False if its lease was lost to another worker meanwhile"""
+        with self._connection() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, owner = NULL, lease_until = NULL
+                WHERE id = ? AND owner = ? AND status = ?
+                """,
+                (FAILED if error else DONE, result, error, time.time(), job_id, owner, RUNNING),
+            )
+        return cursor.rowcount > 0
+    
+    def release(self, owner: str):
+        """Put the owner's running jobs back in the queue, e.g. on shutdown"""
+        with self._connection() as conn:
+            conn.execute(
+                """
+                UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, attempts = attempts - 1
+                WHERE owner = ? AND status = ?
+                """,
+                (QUEUED, owner, RUNNING),
+            )
+    
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Get a job, with its position in the queue while it is queued"""
+        conn = self._connection()
+        row = conn.execute(
+            f"SELECT seq, {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(JOB_COLUMNS, row[1:]))
+        job["position"] = None
+        if job["status"] == QUEUED:
+            job["position"] = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND seq < ?", (QUEUED, row[0])
+            ).fetchone()[0]
+        return job
+    
+    def purge(self, finished_before: float) -> int:
+        """Delete jobs that finished before the given time; returns the number deleted"""
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (DONE, FAILED, finished_before),
+            )
+        return cursor.rowcount
+    
+    def stats(self) -> Dict:
+        conn = self._connection()
+        now = time.time()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        (oldest,) = conn.execute(
+            "SELECT MIN(enqueued_at) FROM jobs WHERE status = ?", (QUEUED,)
+        ).fetchone()
+        average_wait, max_wait = conn.execute(
+            """
+            SELECT AVG(started_at - enqueued_at), MAX(started_at - enqueued_at) FROM (
+                SELECT enqueued_at, started_at FROM jobs WHERE started_at IS NOT NULL
+                ORDER BY started_at DESC LIMIT ?
+            )
+            """,
+            (WAIT_SAMPLE_SIZE,),
+        ).fetchone()
+        return {
+            "depth": counts.get(QUEUED, 0),
+            "running": counts.get(RUNNING, 0),
+            "done": counts.get(DONE, 0),
+            "failed": counts.get(FAILED, 0),
+            "oldest_queued_seconds": now - oldest if oldest is not None else None,
+            "average_wait_seconds": average_wait,
+            "max_wait_seconds": max_wait,
+        }
+
+
+# Global queue instance
+job_queue = JobQueue()
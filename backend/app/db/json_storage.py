@@ -1,25 +1,137 @@
+import bisect
+import fcntl
 import json
+import logging
 import os
-from typing import Dict, List, Optional
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
-from app.models.assessment import Assessment, Submission
+from app.models.assessment import Assessment, Question, Submission, TestCase
+from app.models.serialization import dumps, loads
+from app.db.blob_store import BlobStore
+from app.db.submission_index import SubmissionIndex
+from app.db.submission_segments import SegmentStore, position, split_position
 from app.core.config import settings
 
+# (inode, mtime in ns, size) of a storage file; changes when anything rewrites it
+FileSignature = Optional[Tuple[int, int, int]]
+
 
 class JSONStorage:
     def __init__(self, storage_path: str = None):
         self.storage_path = Path(storage_path or settings.storage_path)
         self.storage_path.mkdir(parents=True, exist_ok=True)
         self.assessments_file = self.storage_path / "assessments.json"
+        # Submissions are an append-only log with one JSON record per line;
+        # submissions.json is the legacy array format it is migrated from
         self.submissions_file = self.storage_path / "submissions.json"
+        self.submission_log = self.storage_path / "submissions.jsonl"
+        self.submission_index_file = self.storage_path / "submissions.idx.json"
+        # Older submissions, rolled out of the live log and compressed
+        self.segments = SegmentStore(self.storage_path / "segments")
+        # Test data of edited test cases, by version, for the submissions
+        # that were graded against it
+        self.test_case_archive_file = self.storage_path / "test_cases.json"
+        # Submitted code, stored once per distinct source
+        self.blobs = BlobStore(self.storage_path / "blobs")
+        
+        # Parsed file contents, reused until the file's signature changes.
+        # Cached containers are replaced on write, never mutated, so callers
+        # can hold on to what they were given.
+        self._cache: Dict[Path, Tuple[FileSignature, Any]] = {}
+        self._cache_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "tail_reads": 0}
+        
+        # question_id -> (assessment, question), rebuilt whenever the
+        # cached assessments change
+        self._question_index: Tuple[Optional[Dict], Dict[str, Tuple[Assessment, Question]]] = (None, {})
+        
+        self._log_handle = None
+        self._fsync_timer: Optional[threading.Timer] = None
+        # (inode, submitted_at of its first record) of the live log
+        self._live_log_started: Tuple[Optional[int], Optional[datetime]] = (None, None)
+        
         self._ensure_files_exist()
+        self._migrate_submissions()
+        self._recover_submission_log()
+        
+        self._index_lock = threading.Lock()
+        self.submission_index = SubmissionIndex.load(
+            self.submission_index_file, self.submission_log, self.segments.next_id()
+        )
+        self.submission_index.save(self.submission_index_file)
+        # Finish compressing segments a crash or shutdown left behind
+        threading.Thread(target=self._close_segments, daemon=True).start()
+    
+    @contextmanager
+    def _file_lock(self, file_path: Path, shared: bool = False):
+        """
+        Advisory lock on a storage file, shared by every process using this
+        storage directory (e.g. several uvicorn workers). Exclusive unless
+        `shared`; shared holders only exclude exclusive ones.
+        """
+        with open(file_path.with_name(file_path.name + ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
     
     def _ensure_files_exist(self):
         """Create JSON files if they don't exist"""
-        if not self.assessments_file.exists():
-            self.assessments_file.write_text(json.dumps([], indent=2))
-        if not self.submissions_file.exists():
-            self.submissions_file.write_text(json.dumps([], indent=2))
+        for file_path in (self.assessments_file, self.test_case_archive_file):
+            try:
+                # Exclusive create, so a worker starting up never clobbers a
+                # file another worker has just written
+                with open(file_path, "x") as f:
+                    f.write(json.dumps([], indent=2))
+            except FileExistsError:
+                pass
+    
+    def _migrate_submissions(self):
+        """Convert a legacy submissions.json array into the submission log (once)"""
+        with self._file_lock(self.submission_log):
+            self._migrate_submissions_locked()
+    
+    def _migrate_submissions_locked(self):
+        if self.submission_log.exists():
+            return
+        if self.submissions_file.exists():
+            records = self._read_json(self.submissions_file)
+            staging = self.submission_log.with_suffix(".jsonl.tmp")
+            with open(staging, "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(staging, self.submission_log)
+            # Keep the original as a backup rather than deleting it
+            self.submissions_file.rename(self.submissions_file.with_suffix(".json.migrated"))
+            logging.info(f"Migrated {len(records)} submissions to {self.submission_log}")
+        else:
+            self.submission_log.touch()
+    
+    def _recover_submission_log(self):
+        """Truncate a torn final record left behind by a crash mid-append"""
+        # Appends hold the lock, so a partial line seen here is really torn
+        with self._file_lock(self.submission_log), open(self.submission_log, "rb+") as f:
+            content = f.read()
+            end = content.rfind(b"\n") + 1
+            if end == len(content):
+                return
+            tail = content[end:]
+            try:
+                # A complete record that only lost its newline is kept
+                loads(tail)
+                f.seek(len(content))
+                f.write(b"\n")
+            except ValueError:
+                logging.warning(f"Dropping torn final record ({len(tail)} bytes) from {self.submission_log}")
+                f.truncate(end)
     
     def _read_json(self, file_path: Path) -> List[Dict]:
         """Read and parse JSON file"""
@@ -30,46 +142,373 @@ class JSONStorage:
             return []
     
     def _write_json(self, file_path: Path, data: List[Dict]):
-        """Write data to JSON file"""
-        file_path.write_text(json.dumps(data, indent=2, default=str))
+        """Write data to JSON file atomically, so readers never see a partial file"""
+        staging = file_path.with_name(f".{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(staging, "w") as f:
+                f.write(json.dumps(data, indent=2, default=str))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(staging, file_path)
+        except BaseException:
+            staging.unlink(missing_ok=True)
+            raise
+    
+    # Cache
+    def _file_signature(self, file_path: Path) -> FileSignature:
+        try:
+            stat = file_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+    
+    def _cached(self, file_path: Path, parse: Callable[[List[Dict]], Any]) -> Any:
+        """Get the parsed contents of a file, re-reading it only if it changed on disk"""
+        # Stat before reading: the data read is then at least as new as the
+        # signature, so a concurrent change is at worst re-read next time
+        signature = self._file_signature(file_path)
+        with self._cache_lock:
+            entry = self._cache.get(file_path)
+            if entry is not None and entry[0] == signature:
+                self._stats["hits"] += 1
+                return entry[1]
+        
+        data = parse(self._read_json(file_path))
+        with self._cache_lock:
+            self._stats["misses"] += 1
+            if entry is not None:
+                self._stats["invalidations"] += 1
+            self._cache[file_path] = (signature, data)
+        return data
+    
+    def _store(self, file_path: Path, raw: List[Dict], data: Any):
+        """Write a file and put its parsed contents in the cache (write-through)"""
+        self._write_json(file_path, raw)
+        signature = self._file_signature(file_path)
+        with self._cache_lock:
+            self._cache[file_path] = (signature, data)
+    
+    def _assessments(self) -> Dict[str, Assessment]:
+        return self._cached(
+            self.assessments_file,
+            lambda raw: {a["id"]: Assessment.from_dict(a) for a in raw},
+        )
+    
+    def _archived_test_cases(self) -> Dict[str, Tuple[str, str]]:
+        return self._cached(
+            self.test_case_archive_file,
+            lambda raw: {tc["version"]: (tc["input"], tc["expected_output"]) for tc in raw},
+        )
+    
+    def _load_test_case(self, question_id: str, test_case_id: str, version: str) -> Optional[Tuple[str, str]]:
+        """(input, expected_output) of a test case version, for joining into stored test results"""
+        found = self.get_question(question_id)
+        test_case = found[1].find_test_case(test_case_id, version) if found else None
+        if test_case is not None:
+            return test_case.input, test_case.expected_output
+        return self._archived_test_cases().get(version)
+    
+    def _parse_submission(self, record: Dict) -> Submission:
+        return Submission.from_dict(record, self._load_test_case, self.blobs.get)
+    
+    def _read_log(self, offset: int) -> Tuple[List[Submission], int]:
+        """
+        Parse complete records from the submission log starting at a byte offset
+        Returns: (submissions, offset just past the last complete record)
+        """
+        with open(self.submission_log, "rb") as f:
+            f.seek(offset)
+            content = f.read()
+        # A trailing partial line is an append still in progress; leave it
+        # for the next read
+        end = content.rfind(b"\n") + 1
+        submissions = []
+        for line in content[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                submissions.append(self._parse_submission(loads(line)))
+            except (ValueError, KeyError) as e:
+                logging.warning(f"Skipping unreadable submission record: {e}")
+        return submissions, offset + end
+    
+    def _submissions(self) -> List[Submission]:
+        """
+        Get all submissions, re-reading only what was appended since the last read
+        The cache entry holds (submissions, offset of the first unread byte).
+        """
+        signature = self._file_signature(self.submission_log)
+        with self._cache_lock:
+            entry = self._cache.get(self.submission_log)
+            if entry is not None and entry[0] == signature:
+                self._stats["hits"] += 1
+                return entry[1][0]
+        
+        if (
+            entry is not None
+            and signature is not None
+            and entry[0] is not None
+            and entry[0][0] == signature[0]
+            and signature[2] >= entry[1][1]
+        ):
+            # Same file, only grown: parse just the new tail
+            submissions, offset = entry[1]
+            appended, offset = self._read_log(offset)
+            submissions = submissions + appended
+            with self._cache_lock:
+                self._stats["tail_reads"] += 1
+        else:
+            submissions, offset = self._read_log(0)
+            with self._cache_lock:
+                self._stats["misses"] += 1
+                if entry is not None:
+                    self._stats["invalidations"] += 1
+        
+        with self._cache_lock:
+            self._cache[self.submission_log] = (signature, (submissions, offset))
+        return submissions
+    
+    def _append_submission(self, line: bytes, code: str, code_hash: str) -> int:
+        """Append one record to the submission log; returns the log size after it"""
+        if self._log_handle is None:
+            # Unbuffered, so tell() asks the OS for the position instead of
+            # trusting a cached one that other processes' appends make stale
+            self._log_handle = open(self.submission_log, "ab", buffering=0)
+        # Large records can take several write() calls, so appends from
+        # different processes are serialized to keep lines whole
+        with self._file_lock(self.submission_log):
+            if os.fstat(self._log_handle.fileno()).st_ino != self.submission_log.stat().st_ino:
+                # Another process rolled the log into a segment
+                os.fsync(self._log_handle.fileno())
+                self._log_handle.close()
+                self._log_handle = open(self.submission_log, "ab", buffering=0)
+            # The blob is normally written already; this only makes sure a
+            # blob collection since then has not removed it
+            self.blobs.put(code, code_hash)
+            remaining = memoryview(line)
+            while remaining:
+                remaining = remaining[self._log_handle.write(remaining):]
+            end = self._log_handle.tell()
+        
+        # Group commit: one fsync covers every append within the interval
+        interval = settings.submission_log_fsync_interval
+        if interval <= 0:
+            os.fsync(self._log_handle.fileno())
+        elif self._fsync_timer is None:
+            self._fsync_timer = threading.Timer(interval, self._sync_submission_log)
+            self._fsync_timer.daemon = True
+            self._fsync_timer.start()
+        return end
+    
+    def _sync_submission_log(self):
+        with self._write_lock:
+            self._fsync_timer = None
+            if self._log_handle is not None:
+                os.fsync(self._log_handle.fileno())
+        self._save_submission_index()
+    
+    def _save_submission_index(self):
+        """Checkpoint the submission index; it is caught up from the log on load"""
+        with self._index_lock:
+            try:
+                self.submission_index.save(self.submission_index_file)
+            except OSError as e:
+                logging.warning(f"Could not save submission index: {e}")
+    
+    def _segment_due(self, size: int) -> bool:
+        """Whether the live log has outgrown its size or age bound"""
+        max_bytes = settings.submission_segment_max_mb * 1024 * 1024
+        if max_bytes > 0 and size >= max_bytes:
+            return True
+        max_age = settings.submission_segment_max_age_hours
+        if max_age <= 0 or size == 0:
+            return False
+        with open(self.submission_log, "rb") as f:
+            inode = os.fstat(f.fileno()).st_ino
+            if self._live_log_started[0] != inode:
+                try:
+                    started = datetime.fromisoformat(loads(f.readline())["submitted_at"])
+                except (ValueError, KeyError):
+                    started = None
+                self._live_log_started = (inode, started)
+        started = self._live_log_started[1]
+        return started is not None and datetime.utcnow() - started > timedelta(hours=max_age)
+    
+    def _roll_submission_log(self):
+        """Move the live log out to a new segment and compress it in the background"""
+        with self._file_lock(self.submission_log):
+            if not self._segment_due(self.submission_log.stat().st_size):
+                # Another process rolled it first
+                return
+            if self._log_handle is not None:
+                os.fsync(self._log_handle.fileno())
+                self._log_handle.close()
+                self._log_handle = None
+            # Link the log into the segment and swap an empty file in, so the
+            # live log path never goes missing for readers
+            staging = self.submission_log.with_suffix(f".jsonl.{os.getpid()}.tmp")
+            staging.touch()
+            os.link(self.submission_log, self.segments.path(self.segments.next_id()))
+            os.replace(staging, self.submission_log)
+        threading.Thread(target=self._close_segments, daemon=True).start()
+    
+    def _close_segments(self):
+        for path in self.segments.unclosed():
+            try:
+                self.segments.close(path)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Could not close submission log segment {path}: {e}")
+    
+    def _open_live_log(self, filters: Dict[str, Optional[str]]) -> Tuple[int, BinaryIO, Optional[List[int]]]:
+        """
+        Open the live log, with the index caught up to that very file
+        Returns: (its segment ID, the open file, offsets matching the filters
+        or None without filters)
+        """
+        # Rolls hold the lock exclusively, so the log and the segment list
+        # are consistent while it is held. The open file stays readable (as
+        # the same segment ID) if the log is rolled afterwards.
+        with self._file_lock(self.submission_log, shared=True):
+            segment_id = self.segments.next_id()
+            f = open(self.submission_log, "rb")
+            with self._index_lock:
+                self.submission_index.catch_up(self.submission_log, segment_id)
+                offsets = self.submission_index.lookup(filters) if any(filters.values()) else None
+        return segment_id, f, offsets
+    
+    def close(self):
+        """Flush pending submission log writes to disk"""
+        with self._write_lock:
+            if self._fsync_timer is not None:
+                self._fsync_timer.cancel()
+                self._fsync_timer = None
+            if self._log_handle is not None:
+                os.fsync(self._log_handle.fileno())
+                self._log_handle.close()
+                self._log_handle = None
+        self._save_submission_index()
+    
+    def stats(self) -> Dict:
+        """Cache hit/miss counters and segment counts"""
+        with self._cache_lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            stats = {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else None,
+            }
+        return {**stats, **self.segments.stats()}
     
     # Assessment methods
+    def assessments_version(self) -> FileSignature:
+        """Token that changes whenever any process creates or updates an assessment"""
+        return self._file_signature(self.assessments_file)
+    
     def get_assessment(self, assessment_id: str) -> Optional[Assessment]:
         """Get assessment by ID"""
-        assessments = self._read_json(self.assessments_file)
-        for assessment_data in assessments:
-            if assessment_data.get("id") == assessment_id:
-                return Assessment.from_dict(assessment_data)
-        return None
+        return self._assessments().get(assessment_id)
     
     def get_all_assessments(self) -> List[Assessment]:
         """Get all assessments"""
-        assessments = self._read_json(self.assessments_file)
-        return [Assessment.from_dict(a) for a in assessments]
+        return list(self._assessments().values())
+    
+    def get_question(self, question_id: str) -> Optional[Tuple[Assessment, Question]]:
+        """Get a question by ID together with the assessment it belongs to"""
+        assessments = self._assessments()
+        indexed, questions = self._question_index
+        if indexed is not assessments:
+            questions = {}
+            for assessment in assessments.values():
+                for question in assessment.questions:
+                    # Question IDs are looked up globally; the first one wins
+                    questions.setdefault(question.id, (assessment, question))
+            self._question_index = (assessments, questions)
+        return questions.get(question_id)
     
     def create_assessment(self, assessment: Assessment) -> Assessment:
         """Create a new assessment"""
-        assessments = self._read_json(self.assessments_file)
-        assessments.append(assessment.to_dict())
-        self._write_json(self.assessments_file, assessments)
+        with self._write_lock, self._file_lock(self.assessments_file):
+            assessments = {**self._assessments(), assessment.id: assessment}
+            raw = self._read_json(self.assessments_file)
+            raw.append(assessment.to_dict())
+            self._store(self.assessments_file, raw, assessments)
         return assessment
     
     def update_assessment(self, assessment: Assessment) -> Optional[Assessment]:
         """Update an existing assessment"""
-        assessments = self._read_json(self.assessments_file)
-        for i, assessment_data in enumerate(assessments):
-            if assessment_data.get("id") == assessment.id:
-                assessments[i] = assessment.to_dict()
-                self._write_json(self.assessments_file, assessments)
-                return assessment
+        with self._write_lock, self._file_lock(self.assessments_file):
+            raw = self._read_json(self.assessments_file)
+            for i, assessment_data in enumerate(raw):
+                if assessment_data.get("id") == assessment.id:
+                    # Keep the data of edited test cases for the submissions
+                    # graded against it. The previous version is taken from
+                    # the file, as the cached assessment may have been
+                    # modified in place by the caller.
+                    current = {tc.version for tc in assessment.test_cases()}
+                    self.archive_test_cases(
+                        tc for tc in Assessment.from_dict(assessment_data).test_cases()
+                        if tc.version not in current
+                    )
+                    raw[i] = assessment.to_dict()
+                    assessments = {**self._assessments(), assessment.id: assessment}
+                    self._store(self.assessments_file, raw, assessments)
+                    return assessment
         return None
     
+    def archive_test_cases(self, test_cases: Iterable[TestCase]):
+        """Keep the data of test case versions that are being replaced"""
+        test_cases = list(test_cases)
+        if not test_cases:
+            return
+        with self._write_lock, self._file_lock(self.test_case_archive_file):
+            raw = self._read_json(self.test_case_archive_file)
+            archived = {**self._archived_test_cases()}
+            for tc in test_cases:
+                if tc.version not in archived:
+                    archived[tc.version] = (tc.input, tc.expected_output)
+                    raw.append({"version": tc.version, "input": tc.input, "expected_output": tc.expected_output})
+            self._store(self.test_case_archive_file, raw, archived)
+    
+    def collect_blobs(self) -> int:
+        """Delete stored code that no submission refers to; returns the number of blobs deleted"""
+        # Holding the log lock keeps new references from being appended (and
+        # the log from being rolled) meanwhile
+        with self._file_lock(self.submission_log):
+            references = Counter()
+            for segment in self.segments.segments():
+                references.update(segment.references())
+            with self._index_lock:
+                self.submission_index.catch_up(self.submission_log, self.segments.next_id())
+                for code_hash, offsets in self.submission_index.fields["code_hash"].items():
+                    references[code_hash] += len(offsets)
+            return self.blobs.collect(lambda code_hash: references.get(code_hash, 0))
+    
     # Submission methods
     def create_submission(self, submission: Submission) -> Submission:
         """Create a new submission"""
-        submissions = self._read_json(self.submissions_file)
-        submissions.append(submission.to_dict())
-        self._write_json(self.submissions_file, submissions)
+        record = submission.to_dict()
+        code = record.pop("code")
+        # Written outside the log lock, as it may need an fsync
+        self.blobs.put(code, record["code_hash"])
+        line = dumps(record) + b"\n"
+        with self._write_lock:
+            submissions = self._submissions()
+            with self._cache_lock:
+                offset = self._cache[self.submission_log][1][1]
+            end = self._append_submission(line, code, record["code_hash"])
+            with self._index_lock:
+                if self.submission_index.covered == end - len(line):
+                    self.submission_index.add(record, end - len(line))
+                    self.submission_index.covered = end
+            if end - len(line) == offset:
+                # Nobody else appended since our last read: write through
+                with self._cache_lock:
+                    self._cache[self.submission_log] = (
+                        self._file_signature(self.submission_log),
+                        (submissions + [submission], end),
+                    )
+            # Otherwise the next read picks our record up from the log tail
+            if self._segment_due(end):
+                self._roll_submission_log()
         return submission
     
     def get_submissions(
@@ -79,19 +518,95 @@ class JSONStorage:
         candidate_id: Optional[str] = None,
     ) -> List[Submission]:
         """Get submissions with optional filters"""
-        submissions_data = self._read_json(self.submissions_file)
-        submissions = [Submission.from_dict(s) for s in submissions_data]
+        if assessment_id or question_id or candidate_id:
+            return [
+                submission for _, submission in self.iter_submissions(
+                    assessment_id=assessment_id,
+                    question_id=question_id,
+                    candidate_id=candidate_id,
+                )
+            ]
         
-        if assessment_id:
-            submissions = [s for s in submissions if s.assessment_id == assessment_id]
-        if question_id:
-            submissions = [s for s in submissions if s.question_id == question_id]
-        if candidate_id:
-            submissions = [s for s in submissions if s.candidate_id == candidate_id]
+        # The live log comes from the cache; the lock keeps it from being
+        # rolled into a segment between listing the segments and reading it
+        with self._file_lock(self.submission_log, shared=True):
+            segments = self.segments.segments()
+            live = self._submissions()
+        archived = [
+            self._parse_submission(record)
+            for segment in segments
+            for _, record in segment.records()
+        ]
+        return archived + list(live)
+    
+    def iter_submissions(
+        self,
+        assessment_id: Optional[str] = None,
+        question_id: Optional[str] = None,
+        candidate_id: Optional[str] = None,
+        after: Optional[int] = None,
+    ) -> Iterator[Tuple[int, Submission]]:
+        """
+        Yield (position, submission) in log order, reading records as they are consumed
+        Closed segments whose manifest rules out a match are skipped. Pass the
+        last position seen as `after` to resume from the next record.
+        """
+        filters = {
+            "assessment_id": assessment_id,
+            "question_id": question_id,
+            "candidate_id": candidate_id,
+        }
+        after_segment, after_offset = split_position(after) if after is not None else (0, None)
+        segment_id = after_segment
+        while True:
+            for segment in self.segments.segments():
+                if segment.id < segment_id:
+                    continue
+                if segment.may_match(filters):
+                    skip = after_offset if segment.id == after_segment else None
+                    for offset, record in segment.records(skip):
+                        if all(record.get(field) == value for field, value in filters.items() if value):
+                            yield position(segment.id, offset), self._parse_submission(record)
+                segment_id = segment.id + 1
+            
+            live_id, f, offsets = self._open_live_log(filters)
+            if live_id == segment_id:
+                break
+            f.close()
+            if live_id < segment_id:
+                # The cursor is past the end of the log
+                return
+            # Rolled into a segment since the segments were listed
         
-        return submissions
+        skip = after_offset if live_id == after_segment else None
+        with f:
+            if offsets is not None:
+                if skip is not None:
+                    offsets = offsets[bisect.bisect_right(offsets, skip):]
+                for offset in offsets:
+                    f.seek(offset)
+                    yield position(live_id, offset), self._parse_submission(loads(f.readline()))
+                return
+            
+            offset = 0
+            if skip is not None:
+                f.seek(skip)
+                offset = skip + len(f.readline())
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Append still in progress
+                    break
+                if line.strip():
+                    try:
+                        yield position(live_id, offset), self._parse_submission(loads(line))
+                    except (ValueError, KeyError) as e:
+                        logging.warning(f"Skipping unreadable submission record: {e}")
+                offset += len(line)
 
 
 # Global storage instance
-storage = JSONStorage()
-
+if settings.storage_backend == "sqlite":
+    from app.db.sqlite_storage import SQLiteStorage
+    storage = SQLiteStorage()
+else:
+    storage = JSONStorage()
@@ -0,0 +1,286 @@
+"""
+SQLite storage backend
+Drop-in replacement for JSONStorage, selected with STORAGE_BACKEND=sqlite.
+The database runs in WAL mode, so readers never block the writer and several
+worker processes can share one database file.
+"""
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from app.models.assessment import Assessment, Question, Submission, TestCase
+from app.models.serialization import dumps, loads
+from app.core.config import settings
+
+# Rows fetched per query when iterating submissions
+ITER_CHUNK_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assessments (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS questions (
+    question_id TEXT NOT NULL,
+    assessment_id TEXT NOT NULL REFERENCES assessments(id),
+    PRIMARY KEY (question_id, assessment_id)
+);
+CREATE TABLE IF NOT EXISTS submissions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    assessment_id TEXT NOT NULL,
+    question_id TEXT NOT NULL,
+    candidate_id TEXT NOT NULL,
+    submitted_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS submissions_assessment ON submissions (assessment_id);
+CREATE INDEX IF NOT EXISTS submissions_question ON submissions (question_id);
+CREATE INDEX IF NOT EXISTS submissions_candidate ON submissions (candidate_id);
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    refs INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS test_case_archive (
+    version TEXT PRIMARY KEY,
+    input TEXT NOT NULL,
+    expected_output TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class SQLiteStorage:
+    def __init__(self, database_path: str = None):
+        self.database_path = Path(database_path or settings.sqlite_database)
+        self.database_path.parent.mkdir(parents=True, exist_ok=True)
+        # sqlite3 connections must not be shared between threads
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection; use it as a context manager for a transaction"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.database_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL is durable across process crashes; only an OS
+            # crash can lose the last transactions
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+    
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    def stats(self) -> Dict:
+        return {"backend": "sqlite", "path": str(self.database_path)}
+    
+    def _index_questions(self, conn: sqlite3.Connection, assessment: Assessment):
+        conn.execute("DELETE FROM questions WHERE assessment_id = ?", (assessment.id,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO questions (question_id, assessment_id) VALUES (?, ?)",
+            [(question.id, assessment.id) for question in assessment.questions],
+        )
+    
+    def _bump_assessments_version(self, conn: sqlite3.Connection):
+        conn.execute(
+            """
+            INSERT INTO counters (name, value) VALUES ('assessments_version', 1)
+            ON CONFLICT (name) DO UPDATE SET value = value + 1
+            """
+        )
+    
+    def _load_test_case(self, question_id: str, test_case_id: str, version: str) -> Optional[Tuple[str, str]]:
+        """(input, expected_output) of a test case version, for joining into stored test results"""
+        found = self.get_question(question_id)
+        test_case = found[1].find_test_case(test_case_id, version) if found else None
+        if test_case is not None:
+            return test_case.input, test_case.expected_output
+        row = self._connection().execute(
+            "SELECT input, expected_output FROM test_case_archive WHERE version = ?", (version,)
+        ).fetchone()
+        return tuple(row) if row else None
+    
+    def _load_code(self, code_hash: str) -> str:
+        row = self._connection().execute("SELECT data FROM blobs WHERE hash = ?", (code_hash,)).fetchone()
+        return row[0]
+    
+    def _parse_submission(self, data: str) -> Submission:
+        return Submission.from_dict(loads(data), self._load_test_case, self._load_code)
+    
+    # Assessment methods
+    def assessments_version(self) -> int:
+        """Token that changes whenever any process creates or updates an assessment"""
+        row = self._connection().execute(
+            "SELECT value FROM counters WHERE name = 'assessments_version'"
+        ).fetchone()
+        return row[0] if row else 0
+    
+    def get_assessment(self, assessment_id: str) -> Optional[Assessment]:
+        """Get assessment by ID"""
+        row = self._connection().execute(
+            "SELECT data FROM assessments WHERE id = ?", (assessment_id,)
+        ).fetchone()
+        return Assessment.from_dict(json.loads(row[0])) if row else None
+    
+    def get_all_assessments(self) -> List[Assessment]:
+        """Get all assessments"""
+        rows = self._connection().execute("SELECT data FROM assessments ORDER BY seq")
+        return [Assessment.from_dict(json.loads(data)) for (data,) in rows]
+    
+    def get_question(self, question_id: str) -> Optional[Tuple[Assessment, Question]]:
+        """Get a question by ID together with the assessment it belongs to"""
+        row = self._connection().execute(
+            """
+            SELECT a.data FROM questions q JOIN assessments a ON a.id = q.assessment_id
+            WHERE q.question_id = ? ORDER BY a.seq LIMIT 1
+            """,
+            (question_id,),
+        ).fetchone()
+        if not row:
+            return None
+        assessment = Assessment.from_dict(json.loads(row[0]))
+        question = next(q for q in assessment.questions if q.id == question_id)
+        return assessment, question
+    
+    def create_assessment(self, assessment: Assessment) -> Assessment:
+        """Create a new assessment"""
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO assessments (id, data) VALUES (?, ?)",
+                (assessment.id, json.dumps(assessment.to_dict(), default=str)),
+            )
+            self._index_questions(conn, assessment)
+            self._bump_assessments_version(conn)
+        return assessment
+    
+    def update_assessment(self, assessment: Assessment) -> Optional[Assessment]:
+        """Update an existing assessment"""
+        with self._connection() as conn:
+            row = conn.execute("SELECT data FROM assessments WHERE id = ?", (assessment.id,)).fetchone()
+            if row:
+                # Keep the data of edited test cases for the submissions graded against it
+                current = {tc.version for tc in assessment.test_cases()}
+                self._archive_test_cases(conn, (
+                    tc for tc in Assessment.from_dict(json.loads(row[0])).test_cases()
+                    if tc.version not in current
+                ))
+            cursor = conn.execute(
+                "UPDATE assessments SET data = ? WHERE id = ?",
+                (json.dumps(assessment.to_dict(), default=str), assessment.id),
+            )
+            if cursor.rowcount == 0:
+                return None
+            self._index_questions(conn, assessment)
+            self._bump_assessments_version(conn)
+        return assessment
+    
+    def _archive_test_cases(self, conn: sqlite3.Connection, test_cases: Iterable[TestCase]):
+        conn.executemany(
+            "INSERT OR IGNORE INTO test_case_archive (version, input, expected_output) VALUES (?, ?, ?)",
+            [(tc.version, tc.input, tc.expected_output) for tc in test_cases],
+        )
+    
+    def archive_test_cases(self, test_cases: Iterable[TestCase]):
+        """Keep the data of test case versions that are being replaced"""
+        with self._connection() as conn:
+            self._archive_test_cases(conn, test_cases)
+    
+    def collect_blobs(self) -> int:
+        """Delete stored code that no submission refers to; returns the number of blobs deleted"""
+        with self._connection() as conn:
+            return conn.execute("DELETE FROM blobs WHERE refs <= 0").rowcount
+    
+    # Submission methods
+    def create_submission(self, submission: Submission) -> Submission:
+        """Create a new submission"""
+        data = submission.to_dict()
+        code = data.pop("code")
+        with self._connection() as conn:
+            # Code is stored once per distinct source, with a count of the
+            # submissions referring to it
+            conn.execute(
+                """
+                INSERT INTO blobs (hash, data, refs) VALUES (?, ?, 1)
+                ON CONFLICT (hash) DO UPDATE SET refs = refs + 1
+                """,
+                (data["code_hash"], code),
+            )
+            conn.execute(
+                """
+                INSERT INTO submissions (id, assessment_id, question_id, candidate_id, submitted_at, data)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    submission.id,
+                    submission.assessment_id,
+                    submission.question_id,
+                    submission.candidate_id,
+                    data["submitted_at"],
+                    dumps(data).decode("utf-8"),
+                ),
+            )
+        return submission
+    
+    def _submission_filters(self, **filters: Optional[str]) -> Tuple[List[str], List[str]]:
+        clauses = [f"{column} = ?" for column, value in filters.items() if value]
+        params = [value for value in filters.values() if value]
+        return clauses, params
+    
+    def get_submissions(
+        self,
+        assessment_id: Optional[str] = None,
+        question_id: Optional[str] = None,
+        candidate_id: Optional[str] = None,
+    ) -> List[Submission]:
+        """Get submissions with optional filters"""
+        clauses, params = self._submission_filters(
+            assessment_id=assessment_id, question_id=question_id, candidate_id=candidate_id
+        )
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connection().execute(
+            f"SELECT data FROM submissions {where} ORDER BY seq", params
+        )
+        return [self._parse_submission(data) for (data,) in rows]
+    
+    def iter_submissions(
+        self,
+        assessment_id: Optional[str] = None,
+        question_id: Optional[str] = None,
+        candidate_id: Optional[str] = None,
+        after: Optional[int] = None,
+    ) -> Iterator[Tuple[int, Submission]]:
+        """
+        Yield (position, submission) in insertion order, a chunk of rows at a time
+        The position is the row's seq; pass the last one seen as `after` to
+        resume from the next row. Each chunk is its own query, so the
+        iterator can be advanced from different threads.
+        """
+        clauses, params = self._submission_filters(
+            assessment_id=assessment_id, question_id=question_id, candidate_id=candidate_id
+        )
+        where = " AND ".join(clauses + ["seq > ?"])
+        last = after if after is not None else 0
+        while True:
+            rows = self._connection().execute(
+                f"SELECT seq, data FROM submissions WHERE {where} ORDER BY seq LIMIT ?",
+                params + [last, ITER_CHUNK_SIZE],
+            ).fetchall()
+            for seq, data in rows:
+                yield seq, self._parse_submission(data)
+            if len(rows) < ITER_CHUNK_SIZE:
+                return
+            last = rows[-1][0]
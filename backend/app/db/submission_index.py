@@ -0,0 +1,108 @@
+"""
+Secondary indexes over the submission log
+Maps assessment_id, question_id and candidate_id values to the byte offsets
+of matching records in submissions.jsonl, so a filtered lookup only reads
+the records it returns. The code_hash postings double as the reference
+counts of the code blob store. The index is checkpointed next to the log and
+caught up from the log's tail on load, so the checkpoint may lag behind.
+It only covers the live log; closed segments have their own manifests.
+"""
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.models.serialization import loads
+
+INDEXED_FIELDS = ("assessment_id", "question_id", "candidate_id", "code_hash")
+INDEX_VERSION = 3
+
+
+class SubmissionIndex:
+    """Field value -> record offsets for each indexed field of the submission log"""
+    
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        self.inode: Optional[int] = None
+        # ID of the segment the live log will become; inodes alone can be
+        # reused once a closed segment's original file is deleted
+        self.segment: Optional[int] = None
+        # Offset just past the last indexed record
+        self.covered = 0
+        self.fields: Dict[str, Dict[str, List[int]]] = {field: {} for field in INDEXED_FIELDS}
+    
+    def add(self, record: Dict, offset: int):
+        for field in INDEXED_FIELDS:
+            value = record.get(field)
+            if value is not None:
+                self.fields[field].setdefault(str(value), []).append(offset)
+    
+    def lookup(self, filters: Dict[str, Optional[str]]) -> List[int]:
+        """Offsets of records matching every given filter, in log order"""
+        postings = [
+            self.fields[field].get(value, [])
+            for field, value in filters.items()
+            if value
+        ]
+        postings.sort(key=len)
+        matches = set(postings[0])
+        for posting in postings[1:]:
+            matches.intersection_update(posting)
+        return sorted(matches)
+    
+    def catch_up(self, log_path: Path, segment: int):
+        """Index records appended to the log since the last update, rebuilding if the log was replaced"""
+        stat = log_path.stat()
+        if stat.st_ino != self.inode or segment != self.segment or stat.st_size < self.covered:
+            self.clear()
+            self.inode = stat.st_ino
+            self.segment = segment
+        if stat.st_size == self.covered:
+            return
+        
+        with open(log_path, "rb") as f:
+            f.seek(self.covered)
+            offset = self.covered
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Append still in progress
+                    break
+                try:
+                    self.add(loads(line), offset)
+                except ValueError:
+                    pass
+                offset += len(line)
+        self.covered = offset
+    
+    def save(self, path: Path):
+        """Write a checkpoint atomically"""
+        staging = path.with_suffix(f"{path.suffix}.{os.getpid()}.tmp")
+        staging.write_text(json.dumps({
+            "version": INDEX_VERSION,
+            "inode": self.inode,
+            "segment": self.segment,
+            "covered": self.covered,
+            "fields": self.fields,
+        }))
+        os.replace(staging, path)
+    
+    @classmethod
+    def load(cls, path: Path, log_path: Path, segment: int) -> "SubmissionIndex":
+        """Load the checkpoint and catch up with the log, rebuilding it if missing or unreadable"""
+        index = cls()
+        try:
+            data = json.loads(path.read_text())
+            if data.get("version") == INDEX_VERSION:
+                index.inode = data["inode"]
+                index.segment = data["segment"]
+                index.covered = data["covered"]
+                index.fields = {field: data["fields"].get(field, {}) for field in INDEXED_FIELDS}
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError, AttributeError):
+            logging.warning(f"Rebuilding unreadable submission index {path}")
+            index = cls()
+        index.catch_up(log_path, segment)
+        return index
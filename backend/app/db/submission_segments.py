@@ -0,0 +1,251 @@
+"""
+Closed segments of the submission log
+Once submissions.jsonl grows past a size or age bound it is moved to
+segments/<id>.jsonl and compressed to segments/<id>.jsonl.gz. Each segment
+has a small manifest with bloom filters over the indexed fields and the
+range of submitted_at, so filtered queries skip segments that cannot
+match, and a refs file counting the code blobs it refers to.
+
+A submission's position is (segment id << SEGMENT_SHIFT) | byte offset in
+the uncompressed segment; the live log counts as the segment after the
+last closed one.
+"""
+import base64
+import fcntl
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.models.serialization import loads
+
+SEGMENT_SHIFT = 40
+MANIFEST_VERSION = 1
+BLOOM_FIELDS = ("assessment_id", "question_id", "candidate_id")
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+SEGMENT_NAME = re.compile(r"^(\d+)\.jsonl(\.gz)?$")
+
+
+def position(segment_id: int, offset: int) -> int:
+    return (segment_id << SEGMENT_SHIFT) | offset
+
+
+def split_position(value: int) -> Tuple[int, int]:
+    return value >> SEGMENT_SHIFT, value & ((1 << SEGMENT_SHIFT) - 1)
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives"""
+    
+    def __init__(self, size: int, hashes: int, bits: Optional[bytearray] = None):
+        self.size = size
+        self.hashes = hashes
+        self.bits = bits if bits is not None else bytearray((size + 7) // 8)
+    
+    @classmethod
+    def for_capacity(cls, capacity: int) -> "BloomFilter":
+        capacity = max(1, capacity)
+        size = max(64, int(-capacity * math.log(BLOOM_FALSE_POSITIVE_RATE) / math.log(2) ** 2))
+        return cls(size, max(1, round(size / capacity * math.log(2))))
+    
+    def _positions(self, value: str) -> Iterator[int]:
+        # Double hashing: the i-th probe is h1 + i * h2
+        digest = hashlib.sha256(value.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+    
+    def add(self, value: str):
+        for bit in self._positions(value):
+            self.bits[bit // 8] |= 1 << (bit % 8)
+    
+    def might_contain(self, value: str) -> bool:
+        return all(self.bits[bit // 8] & (1 << (bit % 8)) for bit in self._positions(value))
+    
+    def to_dict(self) -> Dict:
+        return {"size": self.size, "hashes": self.hashes, "bits": base64.b64encode(self.bits).decode("ascii")}
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BloomFilter":
+        return cls(data["size"], data["hashes"], bytearray(base64.b64decode(data["bits"])))
+
+
+class Segment:
+    def __init__(self, directory: Path, segment_id: int, manifest: Optional[Dict]):
+        self.directory = directory
+        self.id = segment_id
+        # None while the segment is not compressed yet: it is then never skipped
+        self.manifest = manifest
+        self._blooms = (
+            {field: BloomFilter.from_dict(data) for field, data in manifest["blooms"].items()}
+            if manifest else {}
+        )
+    
+    @property
+    def name(self) -> str:
+        return f"{self.id:06d}"
+    
+    def may_match(self, filters: Dict[str, Optional[str]]) -> bool:
+        for field, value in filters.items():
+            if value and field in self._blooms and not self._blooms[field].might_contain(value):
+                return False
+        return True
+    
+    def _open(self):
+        compressed = self.directory / f"{self.name}.jsonl.gz"
+        try:
+            return gzip.open(compressed, "rb")
+        except FileNotFoundError:
+            pass
+        try:
+            return open(self.directory / f"{self.name}.jsonl", "rb")
+        except FileNotFoundError:
+            # Compressed (and the original removed) since the first attempt
+            return gzip.open(compressed, "rb")
+    
+    def records(self, after: Optional[int] = None) -> Iterator[Tuple[int, Dict]]:
+        """Yield (offset, record) for the records past the `after` offset"""
+        offset = 0
+        with self._open() as f:
+            for line in f:
+                if line.strip() and (after is None or offset > after):
+                    yield offset, loads(line)
+                offset += len(line)
+    
+    def references(self) -> Dict[str, int]:
+        """Number of records referring to each code blob"""
+        try:
+            return json.loads((self.directory / f"{self.name}.refs.json").read_text())
+        except FileNotFoundError:
+            return Counter(record["code_hash"] for _, record in self.records() if record.get("code_hash"))
+
+
+class SegmentStore:
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Segments with a manifest never change, so they are decoded once
+        self._segments: Dict[int, Segment] = {}
+    
+    def _ids(self) -> List[int]:
+        ids = set()
+        for name in os.listdir(self.directory):
+            match = SEGMENT_NAME.match(name)
+            if match:
+                ids.add(int(match.group(1)))
+        return sorted(ids)
+    
+    def next_id(self) -> int:
+        """ID of the live log, i.e. of the next segment to be closed"""
+        ids = self._ids()
+        return ids[-1] + 1 if ids else 0
+    
+    def path(self, segment_id: int) -> Path:
+        return self.directory / f"{segment_id:06d}.jsonl"
+    
+    def segments(self) -> List[Segment]:
+        segments = []
+        for segment_id in self._ids():
+            segment = self._segments.get(segment_id)
+            if segment is None:
+                try:
+                    manifest = json.loads((self.directory / f"{segment_id:06d}.manifest.json").read_text())
+                except (FileNotFoundError, ValueError):
+                    manifest = None
+                segment = Segment(self.directory, segment_id, manifest)
+                if manifest is not None:
+                    self._segments[segment_id] = segment
+            segments.append(segment)
+        return segments
+    
+    def unclosed(self) -> List[Path]:
+        """Moved-out logs still waiting to be compressed, e.g. after a crash"""
+        return [
+            self.path(segment_id) for segment_id in self._ids()
+            if self.path(segment_id).exists()
+        ]
+    
+    def close(self, path: Path):
+        """Write the manifest and refs file of a moved-out log, then compress it"""
+        # One closer at a time across threads and processes
+        with open(self.directory / ".close.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._close_locked(path)
+    
+    def _close_locked(self, path: Path):
+        segment_id = int(path.name.split(".")[0])
+        name = f"{segment_id:06d}"
+        compressed = self.directory / f"{name}.jsonl.gz"
+        if not path.exists():
+            # Closed by someone else meanwhile
+            return
+        if compressed.exists():
+            # Compressed already; only the original was left behind
+            path.unlink()
+            return
+        
+        values = {field: set() for field in BLOOM_FIELDS}
+        references = Counter()
+        count = 0
+        first = last = None
+        for _, record in Segment(self.directory, segment_id, None).records():
+            count += 1
+            for field in BLOOM_FIELDS:
+                if record.get(field) is not None:
+                    values[field].add(str(record[field]))
+            if record.get("code_hash"):
+                references[record["code_hash"]] += 1
+            submitted_at = record.get("submitted_at")
+            if submitted_at:
+                first = min(first or submitted_at, submitted_at)
+                last = max(last or submitted_at, submitted_at)
+        blooms = {}
+        for field, distinct in values.items():
+            blooms[field] = BloomFilter.for_capacity(len(distinct))
+            for value in distinct:
+                blooms[field].add(value)
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "id": segment_id,
+            "records": count,
+            "bytes": path.stat().st_size,
+            "min_submitted_at": first,
+            "max_submitted_at": last,
+            "blooms": {field: bloom.to_dict() for field, bloom in blooms.items()},
+        }
+        
+        self._write(self.directory / f"{name}.refs.json", json.dumps(references).encode("utf-8"))
+        self._write(self.directory / f"{name}.manifest.json", json.dumps(manifest).encode("utf-8"))
+        staging = self.directory / f".{name}.jsonl.gz.{os.getpid()}.tmp"
+        with open(path, "rb") as source, gzip.open(staging, "wb") as target:
+            while chunk := source.read(1024 * 1024):
+                target.write(chunk)
+        with open(staging, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(staging, compressed)
+        path.unlink()
+        logging.info(
+            f"Archived {count} submissions to {compressed} "
+            f"({manifest['bytes']:,} -> {compressed.stat().st_size:,} bytes)"
+        )
+    
+    def _write(self, path: Path, data: bytes):
+        staging = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(staging, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(staging, path)
+    
+    def stats(self) -> Dict:
+        segments = self.segments()
+        return {
+            "segments": len(segments),
+            "archived_submissions": sum(s.manifest["records"] for s in segments if s.manifest),
+        }
@@ -1,6 +1,11 @@
-from typing import List, Optional, Dict, Any
+from typing import Callable, Iterator, List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from enum import Enum
+import functools
+import hashlib
+import json
+import logging
+from app.models.serialization import Field, serializable
 
 
 class Language(str, Enum):
@@ -15,7 +20,33 @@ class TestCaseType(str, Enum):
     HIDDEN = "hidden"
 
 
+class GradingPolicy(str, Enum):
+    RUN_ALL = "run_all"  # Run every test case
+    FAIL_FAST = "fail_fast"  # Stop at the first failing test case
+    STOP_ON_ERROR = "stop_on_error"  # Stop on a compile error or timeout
+
+
+def source_hash(code: str) -> str:
+    """Content hash of submitted source code; names its blob and keys its caches"""
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def test_case_version(input: str, expected_output: str) -> str:
+    """Content hash of a test case's data; changes whenever the test case is edited"""
+    return hashlib.sha256(json.dumps([input, expected_output]).encode("utf-8")).hexdigest()[:16]
+
+
+@serializable
 class TestCase:
+    __slots__ = ("id", "input", "expected_output", "type", "description", "_version")
+    __fields__ = (
+        Field("id"),
+        Field("input"),
+        Field("expected_output"),
+        Field("type", TestCaseType),
+        Field("description", default=None),
+    )
+    
     def __init__(
         self,
         id: str,
@@ -29,9 +60,34 @@ class TestCase:
         self.expected_output = expected_output
         self.type = type
         self.description = description
+        self._version: Optional[str] = None
+    
+    @property
+    def version(self) -> str:
+        if self._version is None:
+            self._version = test_case_version(self.input, self.expected_output)
+        return self._version
 
 
+@serializable
 class Question:
+    __slots__ = (
+        "id", "title", "description", "difficulty", "sample_test_cases", "hidden_test_cases",
+        "allowed_languages", "time_limit", "cache_results", "isolate_test_cases",
+    )
+    __fields__ = (
+        Field("id"),
+        Field("title"),
+        Field("description"),
+        Field("difficulty"),
+        Field("sample_test_cases", [TestCase]),
+        Field("hidden_test_cases", [TestCase]),
+        Field("allowed_languages", [Language]),
+        Field("time_limit", default=60),
+        Field("cache_results", default=True),
+        Field("isolate_test_cases", default=False),
+    )
+    
     def __init__(
         self,
         id: str,
@@ -42,6 +98,8 @@ class Question:
         hidden_test_cases: List[TestCase],
         allowed_languages: List[Language],
         time_limit: int = 60,  # minutes
+        cache_results: bool = True,  # False for nondeterministic questions
+        isolate_test_cases: bool = False,  # Never batch test cases into one process
     ):
         self.id = id
         self.title = title
@@ -51,9 +109,29 @@ class Question:
         self.hidden_test_cases = hidden_test_cases
         self.allowed_languages = allowed_languages
         self.time_limit = time_limit
+        self.cache_results = cache_results
+        self.isolate_test_cases = isolate_test_cases
+    
+    def find_test_case(self, test_case_id: str, version: str) -> Optional[TestCase]:
+        """Get a test case by ID, if its data is still at the given version"""
+        for test_case in self.sample_test_cases + self.hidden_test_cases:
+            if test_case.id == test_case_id and test_case.version == version:
+                return test_case
+        return None
 
 
+@serializable
 class Assessment:
+    __slots__ = ("id", "title", "description", "questions", "duration", "created_at")
+    __fields__ = (
+        Field("id"),
+        Field("title"),
+        Field("description"),
+        Field("questions", [Question]),
+        Field("duration"),
+        Field("created_at", datetime, default_factory=datetime.utcnow),
+    )
+    
     def __init__(
         self,
         id: str,
@@ -70,93 +148,15 @@ class Assessment:
         self.duration = duration
         self.created_at = created_at or datetime.utcnow()
     
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            "id": self.id,
-            "title": self.title,
-            "description": self.description,
-            "questions": [
-                {
-                    "id": q.id,
-                    "title": q.title,
-                    "description": q.description,
-                    "difficulty": q.difficulty,
-                    "sample_test_cases": [
-                        {
-                            "id": tc.id,
-                            "input": tc.input,
-                            "expected_output": tc.expected_output,
-                            "type": tc.type.value,
-                            "description": tc.description,
-                        }
-                        for tc in q.sample_test_cases
-                    ],
-                    "hidden_test_cases": [
-                        {
-                            "id": tc.id,
-                            "input": tc.input,
-                            "expected_output": tc.expected_output,
-                            "type": tc.type.value,
-                            "description": tc.description,
-                        }
-                        for tc in q.hidden_test_cases
-                    ],
-                    "allowed_languages": [lang.value for lang in q.allowed_languages],
-                    "time_limit": q.time_limit,
-                }
-                for q in self.questions
-            ],
-            "duration": self.duration,
-            "created_at": self.created_at.isoformat(),
-        }
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> "Assessment":
-        questions = []
-        for q_data in data["questions"]:
-            sample_tcs = [
-                TestCase(
-                    id=tc["id"],
-                    input=tc["input"],
-                    expected_output=tc["expected_output"],
-                    type=TestCaseType(tc["type"]),
-                    description=tc.get("description"),
-                )
-                for tc in q_data["sample_test_cases"]
-            ]
-            hidden_tcs = [
-                TestCase(
-                    id=tc["id"],
-                    input=tc["input"],
-                    expected_output=tc["expected_output"],
-                    type=TestCaseType(tc["type"]),
-                    description=tc.get("description"),
-                )
-                for tc in q_data["hidden_test_cases"]
-            ]
-            question = Question(
-                id=q_data["id"],
-                title=q_data["title"],
-                description=q_data["description"],
-                difficulty=q_data["difficulty"],
-                sample_test_cases=sample_tcs,
-                hidden_test_cases=hidden_tcs,
-                allowed_languages=[Language(lang) for lang in q_data["allowed_languages"]],
-                time_limit=q_data.get("time_limit", 60),
-            )
-            questions.append(question)
-        
-        return cls(
-            id=data["id"],
-            title=data["title"],
-            description=data["description"],
-            questions=questions,
-            duration=data["duration"],
-            created_at=datetime.fromisoformat(data["created_at"]) if data.get("created_at") else None,
-        )
+    def test_cases(self) -> Iterator[TestCase]:
+        for question in self.questions:
+            yield from question.sample_test_cases
+            yield from question.hidden_test_cases
 
 
 class ExecutionResult:
+    __slots__ = ("success", "output", "error", "execution_time", "memory_used")
+    
     def __init__(
         self,
         success: bool,
@@ -172,34 +172,170 @@ class ExecutionResult:
         self.memory_used = memory_used
 
 
+class PreparedSubmission:
+    """
+    A submission that has been written out and compiled once by an executor
+    and can be run against any number of inputs until it is released.
+    """
+    __slots__ = (
+        "code", "language", "workdir", "run_cmd", "image", "sandbox",
+        "compile_error", "compile_time", "_code_hash",
+    )
+    
+    def __init__(
+        self,
+        code: str,
+        language: Language,
+        workdir: Optional[str] = None,
+        run_cmd: Optional[List[str]] = None,
+        image: Optional[str] = None,
+        sandbox: Optional[Any] = None,
+        compile_error: Optional[str] = None,
+        compile_time: Optional[float] = None,
+    ):
+        self.code = code
+        self.language = language
+        self.workdir = workdir
+        self.run_cmd = run_cmd
+        self.image = image
+        self.sandbox = sandbox
+        self.compile_error = compile_error
+        self.compile_time = compile_time
+        self._code_hash: Optional[str] = None
+    
+    @property
+    def compiled(self) -> bool:
+        return self.compile_error is None
+    
+    @property
+    def code_hash(self) -> str:
+        if self._code_hash is None:
+            self._code_hash = source_hash(self.code)
+        return self._code_hash
+
+
+@serializable
 class TestResult:
+    """
+    Outcome of one test case. Stored submissions keep only the test case ID
+    and version; input and expected_output are then loaded on first access.
+    """
+    __slots__ = (
+        "test_case_id", "passed", "_input", "_expected_output", "actual_output", "error",
+        "execution_time", "skipped", "test_case_version", "_load_test_case",
+    )
+    __fields__ = (
+        Field("test_case_id"),
+        Field("test_case_version", default=None),
+        Field("passed"),
+        Field("actual_output"),
+        Field("error", default=None),
+        Field("execution_time", default=None),
+        Field("skipped", default=False),
+        # Written by to_dict only when they cannot be joined back in
+        Field("input", default=None, dump=False),
+        Field("expected_output", default=None, dump=False),
+    )
+    
     def __init__(
         self,
         test_case_id: str,
         passed: bool,
-        input: str,
-        expected_output: str,
+        input: Optional[str],
+        expected_output: Optional[str],
         actual_output: str,
         error: Optional[str] = None,
         execution_time: Optional[float] = None,
+        skipped: bool = False,  # Not run because the grading policy stopped early
+        test_case_version: Optional[str] = None,
+        load_test_case: Optional[Callable[[str, str], Optional[Tuple[str, str]]]] = None,
     ):
         self.test_case_id = test_case_id
         self.passed = passed
-        self.input = input
-        self.expected_output = expected_output
+        self._input = input
+        self._expected_output = expected_output
         self.actual_output = actual_output
         self.error = error
         self.execution_time = execution_time
+        self.skipped = skipped
+        self.test_case_version = test_case_version
+        self._load_test_case = load_test_case
+    
+    def _join_test_case(self):
+        load, self._load_test_case = self._load_test_case, None
+        data = load(self.test_case_id, self.test_case_version) if load else None
+        if data is None:
+            logging.warning(
+                f"Test data for {self.test_case_id} (version {self.test_case_version}) not found"
+            )
+            data = ("", "")
+        self._input, self._expected_output = data
+    
+    @property
+    def input(self) -> str:
+        if self._input is None:
+            self._join_test_case()
+        return self._input
+    
+    @property
+    def expected_output(self) -> str:
+        if self._expected_output is None:
+            self._join_test_case()
+        return self._expected_output
+    
+    def to_dict(self) -> Dict[str, Any]:
+        data = self._to_dict()
+        if self.test_case_version is None:
+            # Without a version the test data cannot be joined back in later
+            data["input"] = self.input
+            data["expected_output"] = self.expected_output
+        return data
+    
+    @classmethod
+    def from_dict(
+        cls,
+        data: Dict[str, Any],
+        load_test_case: Optional[Callable[[str, str], Optional[Tuple[str, str]]]] = None,
+    ) -> "TestResult":
+        return cls._from_dict(data, _load_test_case=load_test_case)
 
 
+@serializable
 class Submission:
+    """
+    A graded submission. Stored submissions keep only the hash of their code;
+    the code is then loaded from the blob store on first access.
+    """
+    __slots__ = (
+        "id", "assessment_id", "question_id", "candidate_id", "_code", "_code_hash", "_load_code",
+        "language", "test_results", "sample_passed", "sample_total", "hidden_passed", "hidden_total",
+        "compilation_logs", "submitted_at",
+    )
+    __fields__ = (
+        Field("id"),
+        Field("assessment_id"),
+        Field("question_id"),
+        Field("candidate_id"),
+        Field("code", default=None),
+        Field("code_hash", default=None),
+        Field("language", Language),
+        # Loaded by from_dict, which hands the results their test data loader
+        Field("test_results", [TestResult], load=False),
+        Field("sample_passed"),
+        Field("sample_total"),
+        Field("hidden_passed"),
+        Field("hidden_total"),
+        Field("compilation_logs", default=None),
+        Field("submitted_at", datetime, default_factory=datetime.utcnow),
+    )
+    
     def __init__(
         self,
         id: str,
         assessment_id: str,
         question_id: str,
         candidate_id: str,
-        code: str,
+        code: Optional[str],
         language: Language,
         test_results: List[TestResult],
         sample_passed: int,
@@ -208,12 +344,16 @@ class Submission:
         hidden_total: int,
         compilation_logs: Optional[str] = None,
         submitted_at: Optional[datetime] = None,
+        code_hash: Optional[str] = None,
+        load_code: Optional[Callable[[str], str]] = None,
     ):
         self.id = id
         self.assessment_id = assessment_id
         self.question_id = question_id
         self.candidate_id = candidate_id
-        self.code = code
+        self._code = code
+        self._code_hash = code_hash
+        self._load_code = load_code
         self.language = language
         self.test_results = test_results
         self.sample_passed = sample_passed
@@ -223,62 +363,31 @@ class Submission:
         self.compilation_logs = compilation_logs
         self.submitted_at = submitted_at or datetime.utcnow()
     
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            "id": self.id,
-            "assessment_id": self.assessment_id,
-            "question_id": self.question_id,
-            "candidate_id": self.candidate_id,
-            "code": self.code,
-            "language": self.language.value,
-            "test_results": [
-                {
-                    "test_case_id": tr.test_case_id,
-                    "passed": tr.passed,
-                    "input": tr.input,
-                    "expected_output": tr.expected_output,
-                    "actual_output": tr.actual_output,
-                    "error": tr.error,
-                    "execution_time": tr.execution_time,
-                }
-                for tr in self.test_results
-            ],
-            "sample_passed": self.sample_passed,
-            "sample_total": self.sample_total,
-            "hidden_passed": self.hidden_passed,
-            "hidden_total": self.hidden_total,
-            "compilation_logs": self.compilation_logs,
-            "submitted_at": self.submitted_at.isoformat(),
-        }
+    @property
+    def code(self) -> str:
+        if self._code is None:
+            self._code = self._load_code(self._code_hash)
+        return self._code
+    
+    @property
+    def code_hash(self) -> str:
+        if self._code_hash is None:
+            self._code_hash = source_hash(self._code)
+        return self._code_hash
     
     @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> "Submission":
-        from app.models.assessment import TestResult
-        test_results = [
-            TestResult(
-                test_case_id=tr["test_case_id"],
-                passed=tr["passed"],
-                input=tr["input"],
-                expected_output=tr["expected_output"],
-                actual_output=tr["actual_output"],
-                error=tr.get("error"),
-                execution_time=tr.get("execution_time"),
-            )
-            for tr in data["test_results"]
-        ]
-        return cls(
-            id=data["id"],
-            assessment_id=data["assessment_id"],
-            question_id=data["question_id"],
-            candidate_id=data["candidate_id"],
-            code=data["code"],
-            language=Language(data["language"]),
-            test_results=test_results,
-            sample_passed=data["sample_passed"],
-            sample_total=data["sample_total"],
-            hidden_passed=data["hidden_passed"],
-            hidden_total=data["hidden_total"],
-            compilation_logs=data.get("compilation_logs"),
-            submitted_at=datetime.fromisoformat(data["submitted_at"]) if data.get("submitted_at") else None,
-        )
-
+    def from_dict(
+        cls,
+        data: Dict[str, Any],
+        load_test_case: Optional[Callable[[str, str, str], Optional[Tuple[str, str]]]] = None,
+        load_code: Optional[Callable[[str], str]] = None,
+    ) -> "Submission":
+        """
+        load_test_case(question_id, test_case_id, version) returns the
+        (input, expected_output) of results stored without their test data;
+        load_code(code_hash) returns the code of records stored without it
+        """
+        if load_test_case is not None:
+            load_test_case = functools.partial(load_test_case, data["question_id"])
+        test_results = [TestResult.from_dict(tr, load_test_case) for tr in data["test_results"]]
+        return cls._from_dict(data, test_results=test_results, _load_code=load_code)
@@ -0,0 +1,134 @@
+"""
+Schema-driven (de)serialization of the storage models
+Each model lists its stored fields in __fields__; @serializable compiles
+them into a flat to_dict/from_dict pair once at import, so converting a
+record costs one dict literal or one run of slot assignments, with no
+per-field dispatch at run time. dumps/loads use orjson when it is installed.
+"""
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    import json
+
+REQUIRED = object()
+
+
+class Field:
+    """
+    A stored field
+    kind: None for plain JSON values, an Enum or datetime, a serializable
+    model, or a one-element list of any of those for a list of them.
+    default/default_factory: used when the field is missing or null.
+    dump/load: whether to_dict writes the field and from_dict reads it.
+    """
+    __slots__ = ("name", "kind", "default", "default_factory", "dump", "load")
+    
+    def __init__(
+        self,
+        name: str,
+        kind: Any = None,
+        default: Any = REQUIRED,
+        default_factory: Optional[Callable[[], Any]] = None,
+        dump: bool = True,
+        load: bool = True,
+    ):
+        self.name = name
+        self.kind = kind
+        self.default = default
+        self.default_factory = default_factory
+        self.dump = dump
+        self.load = load
+
+
+def _codec(kind: Any, names: Dict[str, Any]):
+    """Expression templates (encode, decode) for one value of the given kind, over `{}`"""
+    if kind is None:
+        return "{}", "{}"
+    if kind is datetime:
+        names["_fromisoformat"] = datetime.fromisoformat
+        return "{}.isoformat()", "_fromisoformat({})"
+    if isinstance(kind, type) and issubclass(kind, Enum):
+        # The member map skips Enum.__call__; unknown values still raise through it
+        members = f"_{kind.__name__}_members"
+        names[kind.__name__] = kind
+        names[members] = kind._value2member_map_
+        return "{}.value", f"({members}.get({{0}}) or {kind.__name__}({{0}}))"
+    if isinstance(kind, list):
+        encode, decode = _codec(kind[0], names)
+        return (
+            f"[{encode.format('x')} for x in {{}}]",
+            f"[{decode.format('x')} for x in {{}}]",
+        )
+    names[kind.__name__] = kind
+    return "{}.to_dict()", f"{kind.__name__}.from_dict({{}})"
+
+
+def serializable(cls):
+    """
+    Class decorator compiling cls.__fields__ into _to_dict and _from_dict
+    They become to_dict and from_dict unless the class defines its own,
+    which then usually wrap them. to_dict reads each field through its
+    attribute, so lazy properties are honoured. from_dict bypasses __init__
+    and sets the slots directly: a field's slot is its name, or _name when
+    a property of that name fronts it. Slots no loaded field fills are
+    keyword arguments of _from_dict, defaulting to None.
+    """
+    names: Dict[str, Any] = {"_new": object.__new__}
+    items, assignments, filled = [], [], set()
+    for field in cls.__fields__:
+        encode, decode = _codec(field.kind, names)
+        key = repr(field.name)
+        if field.dump:
+            items.append(f"{key}: {encode.format('self.' + field.name)}")
+        if not field.load:
+            continue
+        slot = field.name if field.name in cls.__slots__ else f"_{field.name}"
+        filled.add(slot)
+        if field.default_factory is not None:
+            names[f"_factory_{field.name}"] = field.default_factory
+            value = f"_factory_{field.name}() if (_v := data.get({key})) is None else {decode.format('_v')}"
+        elif field.default is not REQUIRED:
+            names[f"_default_{field.name}"] = field.default
+            value = f"data.get({key}, _default_{field.name})"
+            if field.kind is not None:
+                value = f"_default_{field.name} if (_v := {value}) is None else {decode.format('_v')}"
+        else:
+            value = decode.format(f"data[{key}]")
+        assignments.append(f"    self.{slot} = {value}\n")
+    arguments = [slot for slot in cls.__slots__ if slot not in filled]
+    
+    source = (
+        "def _to_dict(self):\n"
+        f"    return {{{', '.join(items)}}}\n"
+        f"def _from_dict({', '.join(['cls', 'data'] + [f'{a}=None' for a in arguments])}):\n"
+        "    self = _new(cls)\n"
+        + "".join(assignments)
+        + "".join(f"    self.{a} = {a}\n" for a in arguments)
+        + "    return self\n"
+    )
+    exec(compile(source, f"<serializer {cls.__name__}>", "exec"), names)
+    cls._to_dict = names["_to_dict"]
+    cls._from_dict = classmethod(names["_from_dict"])
+    if "to_dict" not in cls.__dict__:
+        cls.to_dict = cls._to_dict
+    if "from_dict" not in cls.__dict__:
+        cls.from_dict = cls._from_dict
+    return cls
+
+
+def dumps(data: Any) -> bytes:
+    """Compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def loads(data) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
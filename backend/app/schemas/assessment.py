@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
-from app.models.assessment import Language, TestCaseType
+from app.models.assessment import Language, TestCaseType, GradingPolicy
 
 
 class TestCaseResponse(BaseModel):
@@ -54,6 +54,7 @@ class TestExecutionRequest(BaseModel):
     assessment_id: str
     candidate_id: str = "anonymous"
     include_hidden: bool = False
+    grading_policy: GradingPolicy = GradingPolicy.RUN_ALL
 
 
 class ExecutionResultResponse(BaseModel):
@@ -76,6 +77,22 @@ class TestResultResponse(BaseModel):
     actual_output: str
     error: Optional[str] = None
     execution_time: Optional[float] = None
+    skipped: bool = False
+
+
+class SubmissionSummaryResponse(BaseModel):
+    """A submission without its code and test results"""
+    id: str
+    assessment_id: str
+    question_id: str
+    candidate_id: str
+    language: str
+    sample_passed: int
+    sample_total: int
+    hidden_passed: int
+    hidden_total: int
+    compilation_logs: Optional[str] = None
+    submitted_at: datetime
 
 
 class SubmissionResponse(BaseModel):
@@ -92,3 +109,15 @@ class SubmissionResponse(BaseModel):
     hidden_total: int
     compilation_logs: Optional[str] = None
     submitted_at: datetime
+
+
+class SubmissionJobResponse(BaseModel):
+    """A queued submission; submission is set once it is done, error once it has failed"""
+    id: str
+    status: Literal["queued", "running", "done", "failed"]
+    position: Optional[int] = None  # Jobs ahead of it while queued
+    enqueued_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    submission: Optional[SubmissionResponse] = None
+    error: Optional[str] = None
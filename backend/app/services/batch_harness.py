@@ -0,0 +1,75 @@
+"""
+Single-process multi-test harness
+All inputs of a submission are streamed into one runner process per language
+(see app/services/runners), which runs the solution once per input and
+reports per-case status, output and timing. This amortizes interpreter and
+JVM startup over the whole batch.
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from app.models.assessment import Language
+
+RUNNERS_DIR = Path(__file__).parent / "runners"
+
+# Runner source file per language that can be batched. C++ has no startup
+# cost worth amortizing and JavaScript solutions commonly read stdin
+# asynchronously, so both always run one process per test case.
+RUNNER_FILES = {
+    Language.PYTHON: "batch_runner.py",
+    Language.JAVA: "BatchRunner.java",
+}
+
+
+def supports(language: Language) -> bool:
+    return language in RUNNER_FILES
+
+
+def runner_path(language: Language) -> Path:
+    return RUNNERS_DIR / RUNNER_FILES[language]
+
+
+def runner_source(language: Language) -> str:
+    return runner_path(language).read_text(encoding='utf-8')
+
+
+def encode_inputs(inputs: List[Optional[str]], timeout: float) -> bytes:
+    """Frame the inputs of a batch for the runner's stdin"""
+    frames = [f"{timeout} {len(inputs)}\n".encode('utf-8')]
+    for input_data in inputs:
+        data = (input_data or "").encode('utf-8')
+        frames.append(f"{len(data)}\n".encode('utf-8'))
+        frames.append(data)
+    return b"".join(frames)
+
+
+def timeout_message(timeout: float) -> str:
+    return f"Execution timeout after {timeout} seconds"
+
+
+def frame_output(frame: Dict, timeout: float) -> Tuple[str, str, Optional[float]]:
+    """
+    Turn a result frame into what a one-off process run would have produced
+    Returns: (stdout, stderr, execution_time)
+    """
+    if frame.get("status") == "timeout":
+        return "", timeout_message(timeout), frame.get("time")
+    return frame.get("stdout") or "", frame.get("stderr") or "", frame.get("time")
+
+
+def decode_results(stdout: str, count: int) -> List[Optional[Dict]]:
+    """
+    Parse the runner's result frames
+    Returns one {"status", "stdout", "stderr", "time"} dict per case, or None
+    for cases the runner never reported (e.g. it crashed or was killed)
+    """
+    results: List[Optional[Dict]] = [None] * count
+    for line in stdout.splitlines():
+        try:
+            frame = json.loads(line)
+            index = frame["case"]
+        except (ValueError, KeyError, TypeError):
+            continue
+        if isinstance(index, int) and 0 <= index < count:
+            results[index] = frame
+    return results
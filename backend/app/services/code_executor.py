@@ -1,21 +1,114 @@
-from typing import List, Tuple, Optional
+from typing import AsyncIterator, Dict, List, Set, Tuple, Optional
 import subprocess
+import asyncio
+import threading
+import concurrent.futures
 from app.models.assessment import (
     Language,
     TestCase,
     TestCaseType,
     TestResult,
     ExecutionResult,
+    GradingPolicy,
+    source_hash,
 )
 from app.services.pyston_executor import executor as pyston_executor
 from app.services.direct_executor import direct_executor
+from app.services.result_cache import ResultCache, Outcome
 from app.db.json_storage import storage
-from app.models.assessment import Question
+from app.models.assessment import Question, PreparedSubmission
+from app.core.config import settings
+
+# Events of CodeExecutorService.iter_test_cases_async()
+COMPILED = "compiled"
+RESULT = "result"
+FINISHED = "finished"
+
+
+class GradingCutoff:
+    """Tracks the first test case that ends a run under a grading policy"""
+    
+    def __init__(self, policy: GradingPolicy, total: int):
+        self.policy = policy
+        # Test cases after this index are skipped
+        self.index = total
+        self._lock = threading.Lock()
+    
+    def skips(self, index: int) -> bool:
+        return index > self.index
+    
+    def stop(self):
+        """Skip every test case that has not started yet"""
+        with self._lock:
+            self.index = -1
+    
+    def record(self, index: int, outcome: Outcome, prepared: Optional[PreparedSubmission] = None):
+        """Move the cutoff up to index if the outcome stops the run"""
+        if self.policy == GradingPolicy.RUN_ALL:
+            return
+        passed, _, error, _ = outcome
+        # Piston reports compile errors from the first test case run
+        stops = prepared is not None and not prepared.compiled
+        if self.policy == GradingPolicy.FAIL_FAST:
+            stops = stops or not passed
+        elif self.policy == GradingPolicy.STOP_ON_ERROR:
+            stops = stops or bool(error and error.startswith("Execution timeout"))
+        if stops:
+            with self._lock:
+                self.index = min(self.index, index)
+
+
+class SettledResults:
+    """
+    Tracks which finished test cases have a final result: one that no test
+    case before it still running can turn into a skipped one by ending the
+    run under the grading policy
+    """
+    
+    def __init__(self, cutoff: GradingCutoff, outcomes: List[Optional[Outcome]]):
+        self.cutoff = cutoff
+        self.total = len(outcomes)
+        self.outcomes: Dict[int, Outcome] = {i: o for i, o in enumerate(outcomes) if o is not None}
+        self.finished: Set[int] = set(self.outcomes)
+        self.reported: Set[int] = set()
+    
+    def finish(self, index: int, outcome: Optional[Outcome]):
+        self.finished.add(index)
+        if outcome is not None:
+            self.outcomes[index] = outcome
+    
+    def take(self) -> List[int]:
+        """Indexes of the results that have become final since the last call, in order"""
+        frontier = self.total
+        if self.cutoff.policy != GradingPolicy.RUN_ALL:
+            frontier = next(
+                (i for i in range(self.total) if i not in self.finished and not self.cutoff.skips(i)),
+                self.total,
+            )
+        settled = [
+            index for index in sorted(self.outcomes)
+            if index < frontier and index not in self.reported and not self.cutoff.skips(index)
+        ]
+        self.reported.update(settled)
+        return settled
 
 
 class CodeExecutorService:
     """Service for executing code and running test cases"""
     
+    def __init__(self):
+        # Caps the number of test cases running at once across all submissions
+        self._execution_slots = threading.BoundedSemaphore(
+            max(1, settings.max_concurrent_executions)
+        )
+        self._async_execution_slots = asyncio.Semaphore(
+            max(1, settings.max_concurrent_executions)
+        )
+        self.result_cache = ResultCache(
+            max_entries=settings.result_cache_size,
+            ttl=settings.result_cache_ttl,
+        )
+    
     def _get_executor(self):
         """Get the appropriate executor based on availability"""
         # Use Pyston executor (Piston API) as primary executor
@@ -32,92 +125,394 @@ class CodeExecutorService:
         executor = self._get_executor()
         return executor.execute(code, language, input_data)
     
-    def run_test_cases(
+    async def execute_code_async(
         self,
         code: str,
         language: Language,
+        input_data: Optional[str] = None,
+    ) -> ExecutionResult:
+        """Execute code with optional input without blocking the event loop"""
+        executor = self._get_executor()
+        async with self._async_execution_slots:
+            return await executor.execute_async(code, language, input_data)
+    
+    def _get_test_cases(
+        self,
+        language: Language,
         question_id: str,
-        include_hidden: bool = False,
-    ) -> Tuple[List[TestResult], str]:
+        include_hidden: bool,
+    ) -> Tuple[Question, List[TestCase]]:
         """
-        Run test cases for a question
-        Returns: (test_results, compilation_logs)
+        Look up the question and the test cases to run, in order
+        Returns: (question, test_cases)
         """
         # Get question from storage
-        assessments = storage.get_all_assessments()
-        question = None
-        for assessment in assessments:
-            for q in assessment.questions:
-                if q.id == question_id:
-                    question = q
-                    break
-            if question:
-                break
-        
-        if not question:
+        found = storage.get_question(question_id)
+        if not found:
             raise ValueError(f"Question {question_id} not found")
+        _, question = found
         
         # Check if language is allowed
         if language not in question.allowed_languages:
             raise ValueError(f"Language {language.value} not allowed for this question")
         
-        test_results = []
-        compilation_logs = ""
+        test_cases = list(question.sample_test_cases)
+        # Run hidden test cases if requested
+        if include_hidden:
+            test_cases.extend(question.hidden_test_cases)
+        return question, test_cases
+    
+    def _cached_outcomes(
+        self,
+        executor,
+        code: str,
+        language: Language,
+        question: Question,
+        test_cases: List[TestCase],
+    ) -> Tuple[List[Optional[Outcome]], Optional[List[str]]]:
+        """
+        Look test cases up in the result cache
+        Returns: (outcomes with None for misses, cache keys or None when not cached)
+        """
+        if not self.result_cache.enabled or not question.cache_results:
+            return [None] * len(test_cases), None
+        
+        executor_id = type(executor).__name__
+        code_hash = source_hash(code)
+        keys = [self.result_cache.key(code_hash, language, tc, executor_id) for tc in test_cases]
+        return [self.result_cache.get(key) for key in keys], keys
+    
+    def _batched(self, executor, question: Question, language: Language) -> bool:
+        """Whether to run a submission's test cases in one runner process"""
+        return (
+            settings.batch_test_cases
+            and not question.isolate_test_cases
+            and executor.supports_batch(language)
+        )
+    
+    def _batch_cases(self, test_cases: List[TestCase], pending: List[int]) -> List[Tuple[str, str]]:
+        return [(test_cases[i].input, test_cases[i].expected_output) for i in pending]
+    
+    def _record_batch(
+        self,
+        pending: List[int],
+        batch: List[Optional[Outcome]],
+        cutoff: GradingCutoff,
+        prepared: PreparedSubmission,
+    ) -> Dict[int, Optional[Outcome]]:
+        """Map batch outcomes back to test case indexes and apply them to the cutoff"""
+        fresh = dict(zip(pending, batch))
+        for index, outcome in fresh.items():
+            if outcome is not None:
+                cutoff.record(index, outcome, prepared)
+        return fresh
+    
+    def _cutoff(self, grading_policy: GradingPolicy, outcomes: List[Optional[Outcome]]) -> GradingCutoff:
+        """Start a grading cutoff, applying any cached outcomes that already end the run"""
+        cutoff = GradingCutoff(grading_policy, len(outcomes))
+        for index, outcome in enumerate(outcomes):
+            if outcome is not None:
+                cutoff.record(index, outcome)
+        return cutoff
+    
+    def _remember_outcomes(
+        self,
+        outcomes: List[Optional[Outcome]],
+        keys: Optional[List[str]],
+        pending: List[int],
+        fresh: List[Optional[Outcome]],
+    ):
+        """Fill in freshly run outcomes and cache the clean ones"""
+        for index, outcome in zip(pending, fresh):
+            outcomes[index] = outcome
+            # Errors can be transient (timeouts, API failures), so only
+            # clean runs are memoized
+            if keys is not None and outcome is not None and outcome[2] is None:
+                self.result_cache.put(keys[index], outcome)
+    
+    def run_test_cases(
+        self,
+        code: str,
+        language: Language,
+        question_id: str,
+        include_hidden: bool = False,
+        grading_policy: GradingPolicy = GradingPolicy.RUN_ALL,
+    ) -> Tuple[List[TestResult], str]:
+        """
+        Run test cases for a question
+        Returns: (test_results, compilation_logs)
+        """
+        question, test_cases = self._get_test_cases(language, question_id, include_hidden)
         
         # Get executor
         executor = self._get_executor()
         
-        # Run sample test cases
-        for test_case in question.sample_test_cases:
-            passed, actual_output, error, exec_time = executor.execute_with_test_case(
-                code=code,
-                language=language,
-                input_data=test_case.input,
-                expected_output=test_case.expected_output,
-            )
+        outcomes, keys = self._cached_outcomes(executor, code, language, question, test_cases)
+        cutoff = self._cutoff(grading_policy, outcomes)
+        pending = [i for i, outcome in enumerate(outcomes) if outcome is None and not cutoff.skips(i)]
+        if not pending:
+            return self._collect_results(test_cases, outcomes, cutoff)
+        
+        # Compile once and reuse the build for every test case
+        prepared = executor.prepare(code, language)
+        try:
+            if not prepared.compiled:
+                return self._compile_failure(test_cases, prepared.compile_error)
             
-            # Collect compilation errors
-            if error and "error" in error.lower():
-                compilation_logs += f"Test {test_case.id}: {error}\n"
+            def run_one(index: int) -> Optional[Outcome]:
+                # Wait for a global execution slot, then skip the test
+                # case if an earlier one has ended the run meanwhile
+                with self._execution_slots:
+                    if cutoff.skips(index):
+                        return None
+                    test_case = test_cases[index]
+                    outcome = executor.run_test_case(
+                        prepared,
+                        input_data=test_case.input,
+                        expected_output=test_case.expected_output,
+                    )
+                cutoff.record(index, outcome, prepared)
+                return outcome
             
-            test_result = TestResult(
-                test_case_id=test_case.id,
-                passed=passed,
-                input=test_case.input,
-                expected_output=test_case.expected_output,
-                actual_output=actual_output,
-                error=error,
-                execution_time=exec_time,
-            )
-            test_results.append(test_result)
+            fresh = {}
+            if self._batched(executor, question, language):
+                with self._execution_slots:
+                    batch = executor.run_test_case_batch(prepared, self._batch_cases(test_cases, pending))
+                fresh = self._record_batch(pending, batch, cutoff, prepared)
+            
+            # Fan the remaining test cases out concurrently, one process each
+            retry = [i for i in pending if fresh.get(i) is None]
+            workers = max(1, min(executor.parallel_test_cases(), len(retry)))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                fresh.update(zip(retry, pool.map(run_one, retry)))
+        finally:
+            executor.release(prepared)
         
-        # Run hidden test cases if requested
-        if include_hidden:
-            for test_case in question.hidden_test_cases:
-                passed, actual_output, error, exec_time = executor.execute_with_test_case(
-                    code=code,
-                    language=language,
-                    input_data=test_case.input,
-                    expected_output=test_case.expected_output,
-                )
+        if not prepared.compiled:
+            # Piston compiles remotely, so a compile error only
+            # shows up once the test cases have run
+            return self._compile_failure(test_cases, prepared.compile_error)
+        
+        self._remember_outcomes(outcomes, keys, pending, [fresh[i] for i in pending])
+        return self._collect_results(test_cases, outcomes, cutoff)
+    
+    async def iter_test_cases_async(
+        self,
+        code: str,
+        language: Language,
+        question_id: str,
+        include_hidden: bool = False,
+        grading_policy: GradingPolicy = GradingPolicy.RUN_ALL,
+    ) -> AsyncIterator[Tuple]:
+        """
+        Run test cases for a question, yielding each result as soon as it is known
+        Yields, in this order:
+            (COMPILED, compiled, compile_error) once the compile status is known
+            (RESULT, index, test_result) for every test case, once its result is final
+            (FINISHED, test_results, compilation_logs) as run_test_cases_async() returns them
+        Closing the iterator early skips the test cases that have not started.
+        """
+        question, test_cases = self._get_test_cases(language, question_id, include_hidden)
+        
+        # Get executor
+        executor = self._get_executor()
+        
+        outcomes, keys = self._cached_outcomes(executor, code, language, question, test_cases)
+        cutoff = self._cutoff(grading_policy, outcomes)
+        pending = [i for i, outcome in enumerate(outcomes) if outcome is None and not cutoff.skips(i)]
+        settled = SettledResults(cutoff, outcomes)
+        if not pending:
+            yield COMPILED, True, None
+            for event in self._final_events(*self._collect_results(test_cases, outcomes, cutoff), settled):
+                yield event
+            return
+        
+        # Compile once and reuse the build for every test case
+        prepared = await executor.prepare_async(code, language)
+        running: Dict[asyncio.Task, int] = {}
+        try:
+            if prepared.compiled:
+                # At most this many of the submission's test cases run at once
+                submission_slots = asyncio.Semaphore(max(1, executor.parallel_test_cases()))
                 
-                if error and "error" in error.lower():
-                    compilation_logs += f"Test {test_case.id}: {error}\n"
+                async def run_one(index: int) -> Optional[Outcome]:
+                    async with submission_slots, self._async_execution_slots:
+                        if cutoff.skips(index):
+                            return None
+                        test_case = test_cases[index]
+                        outcome = await executor.run_test_case_async(
+                            prepared,
+                            input_data=test_case.input,
+                            expected_output=test_case.expected_output,
+                        )
+                    cutoff.record(index, outcome, prepared)
+                    return outcome
                 
-                test_result = TestResult(
+                fresh = {}
+                if self._batched(executor, question, language):
+                    async with self._async_execution_slots:
+                        batch = await executor.run_test_case_batch_async(
+                            prepared, self._batch_cases(test_cases, pending)
+                        )
+                    fresh = self._record_batch(pending, batch, cutoff, prepared)
+                ran = False
+                for index, outcome in fresh.items():
+                    if outcome is not None:
+                        settled.finish(index, outcome)
+                        ran = True
+                
+                # Fan the remaining test cases out concurrently, one process each
+                running = {
+                    asyncio.create_task(run_one(i)): i
+                    for i in pending if fresh.get(i) is None
+                }
+                announced = False
+                while True:
+                    # Piston compiles remotely, so the compile status is
+                    # only known once a test case has run
+                    if not announced and (ran or not running):
+                        if not prepared.compiled:
+                            break
+                        announced = True
+                        yield COMPILED, True, None
+                    if announced:
+                        for index in settled.take():
+                            yield RESULT, index, self._test_result(test_cases[index], settled.outcomes[index])
+                    if not running:
+                        break
+                    done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        index = running.pop(task)
+                        fresh[index] = task.result()
+                        settled.finish(index, fresh[index])
+                        ran = ran or fresh[index] is not None
+            
+            if not prepared.compiled:
+                # Reported before the runs still going, which can only
+                # fail the same way, are waited for
+                yield COMPILED, False, prepared.compile_error
+                for event in self._final_events(*self._compile_failure(test_cases, prepared.compile_error), settled):
+                    yield event
+                return
+        finally:
+            if running:
+                # Stopped early: test cases that have not started are
+                # skipped, the running ones finish before the build goes
+                cutoff.stop()
+                await asyncio.gather(*running, return_exceptions=True)
+            await executor.release_async(prepared)
+        
+        self._remember_outcomes(outcomes, keys, pending, [fresh[i] for i in pending])
+        for event in self._final_events(*self._collect_results(test_cases, outcomes, cutoff), settled):
+            yield event
+    
+    def _final_events(
+        self,
+        test_results: List[TestResult],
+        compilation_logs: str,
+        settled: SettledResults,
+    ) -> List[Tuple]:
+        """RESULT events for the test cases not reported yet, then the FINISHED event"""
+        events = [
+            (RESULT, index, test_result)
+            for index, test_result in enumerate(test_results)
+            if index not in settled.reported
+        ]
+        events.append((FINISHED, test_results, compilation_logs))
+        return events
+    
+    async def run_test_cases_async(
+        self,
+        code: str,
+        language: Language,
+        question_id: str,
+        include_hidden: bool = False,
+        grading_policy: GradingPolicy = GradingPolicy.RUN_ALL,
+    ) -> Tuple[List[TestResult], str]:
+        """
+        Run test cases for a question without blocking the event loop
+        Returns: (test_results, compilation_logs)
+        """
+        events = self.iter_test_cases_async(code, language, question_id, include_hidden, grading_policy)
+        async for event in events:
+            if event[0] == FINISHED:
+                _, test_results, compilation_logs = event
+        return test_results, compilation_logs
+    
+    def _collect_results(
+        self,
+        test_cases: List[TestCase],
+        outcomes: List[Optional[Outcome]],
+        cutoff: GradingCutoff,
+    ) -> Tuple[List[TestResult], str]:
+        """
+        Build test results from executor outcomes, in test case order
+        Test cases past the grading cutoff are reported as skipped
+        Returns: (test_results, compilation_logs)
+        """
+        test_results = []
+        compilation_logs = ""
+        
+        for index, (test_case, outcome) in enumerate(zip(test_cases, outcomes)):
+            if outcome is None or cutoff.skips(index):
+                test_results.append(TestResult(
                     test_case_id=test_case.id,
-                    passed=passed,
+                    passed=False,
                     input=test_case.input,
                     expected_output=test_case.expected_output,
-                    actual_output=actual_output,
-                    error=error,
-                    execution_time=exec_time,
-                )
-                test_results.append(test_result)
+                    test_case_version=test_case.version,
+                    actual_output="",
+                    skipped=True,
+                ))
+                continue
+            
+            error = outcome[2]
+            # Collect runtime errors
+            if error and "error" in error.lower():
+                compilation_logs += f"Test {test_case.id}: {error}\n"
+            
+            test_results.append(self._test_result(test_case, outcome))
         
         return test_results, compilation_logs.strip()
+    
+    def _test_result(self, test_case: TestCase, outcome: Outcome) -> TestResult:
+        """Build the test result of a test case that ran"""
+        passed, actual_output, error, exec_time = outcome
+        return TestResult(
+            test_case_id=test_case.id,
+            passed=passed,
+            input=test_case.input,
+            expected_output=test_case.expected_output,
+            test_case_version=test_case.version,
+            actual_output=actual_output,
+            error=error,
+            execution_time=exec_time,
+        )
+    
+    def _compile_failure(
+        self,
+        test_cases: List[TestCase],
+        compile_error: Optional[str],
+    ) -> Tuple[List[TestResult], str]:
+        """
+        Fail every test case of a submission that did not compile
+        The compile error is reported once in the compilation logs
+        """
+        test_results = [
+            TestResult(
+                test_case_id=test_case.id,
+                passed=False,
+                input=test_case.input,
+                expected_output=test_case.expected_output,
+                test_case_version=test_case.version,
+                actual_output="",
+                error="Compilation failed",
+                execution_time=None,
+            )
+            for test_case in test_cases
+        ]
+        return test_results, (compile_error or "").strip()
 
 
 # Global service instance
 code_executor_service = CodeExecutorService()
-
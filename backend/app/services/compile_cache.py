@@ -0,0 +1,143 @@
+"""
+Content-addressed on-disk cache of compiled submissions
+Entries are keyed by a hash of the source, language, compile command and
+toolchain version, so unchanged code is only ever compiled once. Compile
+errors are cached too. The cache directory can be shared by several worker
+processes: entries are published with an atomic rename and read by
+hard-linking their files into the caller's working directory.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.models.assessment import Language
+
+META_FILE = "meta.json"
+
+
+class CompileCache:
+    """Size-bounded LRU cache of compile outputs shared across workers"""
+    
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+    
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._stats[key] += n
+    
+    def key(
+        self,
+        language: Language,
+        code_hash: str,
+        compile_cmd: List[str],
+        toolchain_version: str,
+    ) -> str:
+        """Hash everything that can change the compile output"""
+        digest = hashlib.sha256()
+        digest.update(json.dumps([language.value, compile_cmd, toolchain_version]).encode('utf-8'))
+        digest.update(b"\0")
+        digest.update(code_hash.encode('utf-8'))
+        return digest.hexdigest()
+    
+    def lookup(self, key: str, workdir: str) -> Optional[Dict]:
+        """
+        Link a cached compile output into workdir
+        Returns: the entry's metadata ({"files", "compile_error"}), or None on a miss
+        """
+        entry = self.root / key
+        linked = []
+        try:
+            meta = json.loads((entry / META_FILE).read_text())
+            for name in meta["files"]:
+                self._link(entry / name, Path(workdir) / name)
+                linked.append(Path(workdir) / name)
+            # Mark as recently used for LRU eviction
+            os.utime(entry / META_FILE)
+        except (OSError, ValueError, KeyError):
+            # Missing, half-evicted or unreadable entry. Drop partial links so
+            # the compiler never writes through them into the cache.
+            for path in linked:
+                path.unlink(missing_ok=True)
+            self._count("misses")
+            return None
+        self._count("hits")
+        return meta
+    
+    def store(
+        self,
+        key: str,
+        workdir: str,
+        files: List[str],
+        compile_error: Optional[str],
+    ):
+        """Publish the compile output of workdir under key"""
+        staging = self.root / f".tmp-{uuid.uuid4().hex}"
+        try:
+            staging.mkdir()
+            for name in files:
+                self._link(Path(workdir) / name, staging / name)
+            (staging / META_FILE).write_text(json.dumps({
+                "files": files,
+                "compile_error": compile_error,
+            }))
+            # Atomic publish; if another worker got there first keep theirs
+            os.rename(staging, self.root / key)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        self._count("stores")
+        self.evict()
+    
+    def _link(self, source: Path, target: Path):
+        """Hard-link a file, copying when linking is not possible"""
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+    
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        for entry in self.root.iterdir():
+            try:
+                if entry.name.startswith(".tmp-"):
+                    # Staging directories left behind by a crashed worker
+                    if time.time() - entry.stat().st_mtime > 3600:
+                        shutil.rmtree(entry, ignore_errors=True)
+                    continue
+                used = (entry / META_FILE).stat().st_mtime
+                size = sum(f.stat().st_size for f in entry.iterdir())
+            except OSError:
+                continue
+            entries.append((used, size, entry))
+            total += size
+        
+        entries.sort()
+        evicted = 0
+        for used, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            evicted += 1
+        if evicted:
+            self._count("evictions", evicted)
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else None,
+            }
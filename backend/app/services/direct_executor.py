@@ -2,15 +2,20 @@
 Direct code executor using subprocess with resource limits
 Used as fallback when Docker/gVisor is not available (e.g., Railway)
 """
+import asyncio
 import subprocess
 import tempfile
 import os
 import time
 import shutil
 import resource
+import hashlib
+import threading
 from pathlib import Path
-from typing import Optional, Tuple
-from app.models.assessment import Language, ExecutionResult
+from typing import List, Optional, Tuple
+from app.models.assessment import Language, ExecutionResult, PreparedSubmission
+from app.services import batch_harness
+from app.services.compile_cache import CompileCache
 from app.core.config import settings
 
 
@@ -21,6 +26,15 @@ class DirectExecutor:
         self.timeout = settings.gvisor_timeout
         self.memory_limit_mb = self._parse_memory_limit(settings.gvisor_memory_limit)
         self.cpu_limit = float(settings.gvisor_cpu_limit)
+        self._toolchain_versions = {}
+        self._toolchain_lock = threading.Lock()
+        self._java_runner_lock = threading.Lock()
+        self._java_runner_dir: Optional[Path] = None
+        self.compile_cache = (
+            CompileCache(settings.compile_cache_dir, settings.compile_cache_max_mb * 1024 * 1024)
+            if settings.compile_cache_enabled
+            else None
+        )
     
     def _parse_memory_limit(self, limit_str: str) -> int:
         """Parse memory limit string (e.g., '512m') to MB"""
@@ -34,8 +48,8 @@ class DirectExecutor:
         else:
             return int(limit_str)  # Assume MB
     
-    def _set_resource_limits(self):
-        """Set resource limits for the current process"""
+    def _set_resource_limits(self, cases: int = 1):
+        """Set resource limits for the current process (cases > 1 for a batch run)"""
         try:
             # Set memory limit (RSS - Resident Set Size)
             if self.memory_limit_mb:
@@ -44,37 +58,37 @@ class DirectExecutor:
             
             # Set CPU time limit (soft and hard)
             # Note: This is a per-process limit, not per-thread
-            cpu_seconds = int(self.timeout * self.cpu_limit)
+            cpu_seconds = int(self.timeout * self.cpu_limit * cases)
             resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
         except (ValueError, OSError) as e:
             # Resource limits might not be available on all systems
             print(f"Warning: Could not set resource limits: {e}")
     
-    def _get_code_file_extension(self, language: Language) -> str:
-        """Get file extension for the given language"""
-        extensions = {
-            Language.PYTHON: ".py",
-            Language.JAVA: ".java",
-            Language.CPP: ".cpp",
-            Language.JAVASCRIPT: ".js",
+    def _get_code_filename(self, language: Language) -> str:
+        """Get the code filename for the given language"""
+        filenames = {
+            Language.PYTHON: "solution.py",
+            Language.JAVA: "Solution.java",
+            Language.CPP: "solution.cpp",
+            Language.JAVASCRIPT: "solution.js",
         }
-        return extensions[language]
+        return filenames[language]
     
     def _get_execution_command(self, language: Language, code_file: Path) -> list:
         """Get the command to execute code for the given language"""
         if language == Language.PYTHON:
             return ["python3", str(code_file)]
         elif language == Language.JAVA:
-            # Compile first, then run
+            # Compile first (in the code directory), then run
             class_dir = code_file.parent
             class_name = code_file.stem
-            compile_cmd = ["javac", str(code_file)]
+            compile_cmd = ["javac", code_file.name]
             run_cmd = ["java", "-cp", str(class_dir), class_name]
             return {"compile": compile_cmd, "run": run_cmd}
         elif language == Language.CPP:
-            # Compile first, then run
+            # Compile first (in the code directory), then run
             exe_file = code_file.parent / "solution"
-            compile_cmd = ["g++", "-std=c++17", "-O2", "-o", str(exe_file), str(code_file)]
+            compile_cmd = ["g++", "-std=c++17", "-O2", "-o", exe_file.name, code_file.name]
             run_cmd = [str(exe_file)]
             return {"compile": compile_cmd, "run": run_cmd}
         elif language == Language.JAVASCRIPT:
@@ -82,6 +96,77 @@ class DirectExecutor:
         else:
             raise ValueError(f"Unsupported language: {language}")
     
+    def _get_toolchain_version(self, compiler: str) -> str:
+        """
+        Get the compiler version, so a toolchain upgrade never reuses old builds
+        Asked once per compiler and process; the lock keeps concurrent first
+        compiles from all running the compiler to ask.
+        """
+        version = self._toolchain_versions.get(compiler)
+        if version is not None:
+            return version
+        with self._toolchain_lock:
+            if compiler not in self._toolchain_versions:
+                version_flag = "-version" if compiler == "javac" else "--version"
+                try:
+                    result = subprocess.run(
+                        [compiler, version_flag],
+                        capture_output=True,
+                        text=True,
+                        timeout=10,
+                    )
+                    version = (result.stdout or result.stderr).strip()
+                except Exception:
+                    version = ""
+                self._toolchain_versions[compiler] = version
+            return self._toolchain_versions[compiler]
+    
+    def _get_cache_key(self, prepared: PreparedSubmission, compile_cmd: list) -> Optional[str]:
+        """Get the compile cache key of a submission, or None when caching is off"""
+        if self.compile_cache is None:
+            return None
+        return self.compile_cache.key(
+            prepared.language,
+            prepared.code_hash,
+            compile_cmd,
+            self._get_toolchain_version(compile_cmd[0]),
+        )
+    
+    def _load_compiled(self, prepared: PreparedSubmission, cache_key: Optional[str]) -> bool:
+        """Fill prepared from the compile cache; False on a miss"""
+        if cache_key is None:
+            return False
+        cached = self.compile_cache.lookup(cache_key, prepared.workdir)
+        if cached is None:
+            return False
+        prepared.compile_error = cached.get("compile_error")
+        prepared.compile_time = 0.0
+        return True
+    
+    def _store_compiled(self, prepared: PreparedSubmission, cache_key: Optional[str]):
+        """Add a fresh compile output (or compile error) to the compile cache"""
+        if cache_key is None:
+            return
+        code_filename = self._get_code_filename(prepared.language)
+        files = [name for name in os.listdir(prepared.workdir) if name != code_filename]
+        self.compile_cache.store(cache_key, prepared.workdir, files, prepared.compile_error)
+    
+    def _get_preexec_fn(self, cases: int = 1):
+        """Get the function that applies resource limits in the child process"""
+        if os.name != 'posix':
+            return None
+        # Use prlimit if available (Linux) for better control
+        try:
+            import prlimit
+            def set_limits():
+                if self.memory_limit_mb:
+                    memory_bytes = self.memory_limit_mb * 1024 * 1024
+                    prlimit.setrlimit(0, prlimit.RLIMIT_AS, (memory_bytes, memory_bytes))
+            return set_limits
+        except ImportError:
+            # Fall back to resource module
+            return lambda: self._set_resource_limits(cases)
+    
     def _run_with_limits(
         self,
         cmd: list,
@@ -92,33 +177,19 @@ class DirectExecutor:
         start_time = time.time()
         
         try:
-            # Use prlimit if available (Linux) for better control
-            preexec_fn = None
-            if os.name == 'posix':
-                try:
-                    import prlimit
-                    def set_limits():
-                        if self.memory_limit_mb:
-                            memory_bytes = self.memory_limit_mb * 1024 * 1024
-                            prlimit.setrlimit(0, prlimit.RLIMIT_AS, (memory_bytes, memory_bytes))
-                    preexec_fn = set_limits
-                except ImportError:
-                    # Fall back to resource module
-                    preexec_fn = self._set_resource_limits
-            
             result = subprocess.run(
                 cmd,
-                input=input_data.encode('utf-8') if input_data else None,
+                input=input_data,
                 capture_output=True,
                 text=True,
                 timeout=self.timeout,
                 cwd=str(cwd) if cwd else None,
-                preexec_fn=preexec_fn,
+                preexec_fn=self._get_preexec_fn(),
             )
             
             execution_time = time.time() - start_time
             return result.stdout, result.stderr, execution_time
-            
+        
         except subprocess.TimeoutExpired:
             execution_time = time.time() - start_time
             return "", f"Execution timeout after {self.timeout} seconds", execution_time
@@ -126,102 +197,240 @@ class DirectExecutor:
             execution_time = time.time() - start_time
             return "", str(e), execution_time
     
-    def execute(
+    async def _run_with_limits_async(
         self,
-        code: str,
-        language: Language,
+        cmd: list,
         input_data: Optional[str] = None,
-    ) -> ExecutionResult:
+        cwd: Optional[Path] = None,
+    ) -> Tuple[str, str, float]:
+        """Run command with resource limits without blocking the event loop"""
+        start_time = time.time()
+        process = None
+        
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=str(cwd) if cwd else None,
+                preexec_fn=self._get_preexec_fn(),
+            )
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate(input_data.encode('utf-8') if input_data is not None else None),
+                timeout=self.timeout,
+            )
+            
+            execution_time = time.time() - start_time
+            return (
+                stdout.decode('utf-8', errors='replace'),
+                stderr.decode('utf-8', errors='replace'),
+                execution_time,
+            )
+        
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            execution_time = time.time() - start_time
+            return "", f"Execution timeout after {self.timeout} seconds", execution_time
+        except Exception as e:
+            execution_time = time.time() - start_time
+            return "", str(e), execution_time
+    
+    def _write_code(self, code: str, language: Language) -> Tuple[PreparedSubmission, object]:
         """
-        Execute code directly using subprocess
+        Write the code to a fresh working directory
+        Returns: (prepared, cmd_info)
         """
         temp_dir = tempfile.mkdtemp(prefix="direct_exec_")
+        prepared = PreparedSubmission(code=code, language=language, workdir=temp_dir)
+        code_file = Path(temp_dir) / self._get_code_filename(language)
+        code_file.write_text(code, encoding='utf-8')
+        return prepared, self._get_execution_command(language, code_file)
+    
+    def _compile_failed(self, prepared: PreparedSubmission, e: Exception):
+        """Record an unexpected error while preparing a submission"""
+        import traceback
+        prepared.compile_error = f"Execution error: {str(e)}\n{traceback.format_exc()}"
+    
+    def prepare(self, code: str, language: Language) -> PreparedSubmission:
+        """
+        Write the code to a working directory and compile it once.
+        The returned submission can be run any number of times and must be
+        released with release() when done.
+        """
+        prepared = PreparedSubmission(code=code, language=language)
         try:
-            # Write code to a file
-            ext = self._get_code_file_extension(language)
-            code_file = Path(temp_dir) / f"solution{ext}"
-            code_file.write_text(code, encoding='utf-8')
-            
-            # Get execution command
-            cmd_info = self._get_execution_command(language, code_file)
+            prepared, cmd_info = self._write_code(code, language)
             
             # Handle languages that need compilation
             if isinstance(cmd_info, dict):
-                # Compile first
+                prepared.run_cmd = cmd_info["run"]
+                cache_key = self._get_cache_key(prepared, cmd_info["compile"])
+                if self._load_compiled(prepared, cache_key):
+                    return prepared
+                
                 compile_stdout, compile_stderr, compile_time = self._run_with_limits(
                     cmd_info["compile"],
-                    cwd=temp_dir,
+                    cwd=prepared.workdir,
                 )
-                
+                prepared.compile_time = compile_time
                 if compile_stderr:
-                    # Compilation error
-                    return ExecutionResult(
-                        success=False,
-                        output="",
-                        error=compile_stderr,
-                        execution_time=compile_time,
-                    )
+                    prepared.compile_error = compile_stderr
+                if not compile_stderr.startswith("Execution timeout"):
+                    self._store_compiled(prepared, cache_key)
+            else:
+                prepared.run_cmd = cmd_info
+        except Exception as e:
+            self._compile_failed(prepared, e)
+        return prepared
+    
+    async def prepare_async(self, code: str, language: Language) -> PreparedSubmission:
+        """
+        Async version of prepare()
+        File IO and the toolchain version lookup run in worker threads.
+        """
+        prepared = PreparedSubmission(code=code, language=language)
+        try:
+            prepared, cmd_info = await asyncio.to_thread(self._write_code, code, language)
+            
+            # Handle languages that need compilation
+            if isinstance(cmd_info, dict):
+                prepared.run_cmd = cmd_info["run"]
+                cache_key = await asyncio.to_thread(self._get_cache_key, prepared, cmd_info["compile"])
+                if await asyncio.to_thread(self._load_compiled, prepared, cache_key):
+                    return prepared
                 
-                # Run the compiled code
-                stdout, stderr, exec_time = self._run_with_limits(
-                    cmd_info["run"],
-                    input_data=input_data,
-                    cwd=temp_dir,
+                compile_stdout, compile_stderr, compile_time = await self._run_with_limits_async(
+                    cmd_info["compile"],
+                    cwd=prepared.workdir,
                 )
-                total_time = compile_time + exec_time
+                prepared.compile_time = compile_time
+                if compile_stderr:
+                    prepared.compile_error = compile_stderr
+                if not compile_stderr.startswith("Execution timeout"):
+                    await asyncio.to_thread(self._store_compiled, prepared, cache_key)
             else:
-                # Direct execution (Python, JavaScript)
-                stdout, stderr, exec_time = self._run_with_limits(
-                    cmd_info,
-                    input_data=input_data,
-                    cwd=temp_dir,
-                )
-                total_time = exec_time
-            
-            # Determine success
-            error = stderr if stderr and stderr.strip() else None
-            success = error is None or (not error.strip())
-            
-            if stderr and stderr.strip() and not stdout:
-                error = stderr
-                success = False
-            
-            return ExecutionResult(
-                success=success,
-                output=stdout.strip() if stdout else "",
-                error=error,
-                execution_time=total_time,
-                memory_used=None,  # Memory monitoring not available
-            )
-        
+                prepared.run_cmd = cmd_info
         except Exception as e:
-            import traceback
-            return ExecutionResult(
-                success=False,
-                output="",
-                error=f"Execution error: {str(e)}\n{traceback.format_exc()}",
-                execution_time=None,
-            )
+            self._compile_failed(prepared, e)
+        return prepared
+    
+    def _build_result(self, stdout: str, stderr: str, exec_time: Optional[float]) -> ExecutionResult:
+        """Turn raw process output into an ExecutionResult"""
+        # Determine success
+        error = stderr if stderr and stderr.strip() else None
+        success = error is None or (not error.strip())
+        
+        if stderr and stderr.strip() and not stdout:
+            error = stderr
+            success = False
+        
+        return ExecutionResult(
+            success=success,
+            output=stdout.strip() if stdout else "",
+            error=error,
+            execution_time=exec_time,
+            memory_used=None,  # Memory monitoring not available
+        )
+    
+    def _compile_error_result(self, prepared: PreparedSubmission) -> ExecutionResult:
+        """Result returned for every run of a submission that did not compile"""
+        return ExecutionResult(
+            success=False,
+            output="",
+            error=prepared.compile_error,
+            execution_time=prepared.compile_time,
+        )
+    
+    def run_prepared(
+        self,
+        prepared: PreparedSubmission,
+        input_data: Optional[str] = None,
+    ) -> ExecutionResult:
+        """Run a prepared submission against one input"""
+        if not prepared.compiled:
+            return self._compile_error_result(prepared)
+        
+        stdout, stderr, exec_time = self._run_with_limits(
+            prepared.run_cmd,
+            input_data=input_data,
+            cwd=prepared.workdir,
+        )
+        return self._build_result(stdout, stderr, exec_time)
+    
+    async def run_prepared_async(
+        self,
+        prepared: PreparedSubmission,
+        input_data: Optional[str] = None,
+    ) -> ExecutionResult:
+        """Async version of run_prepared()"""
+        if not prepared.compiled:
+            return self._compile_error_result(prepared)
+        
+        stdout, stderr, exec_time = await self._run_with_limits_async(
+            prepared.run_cmd,
+            input_data=input_data,
+            cwd=prepared.workdir,
+        )
+        return self._build_result(stdout, stderr, exec_time)
+    
+    def release(self, prepared: PreparedSubmission):
+        """Remove the working directory of a prepared submission"""
+        if not prepared.workdir:
+            return
+        try:
+            shutil.rmtree(prepared.workdir)
+        except:
+            pass
+    
+    async def release_async(self, prepared: PreparedSubmission):
+        """Async version of release()"""
+        await asyncio.to_thread(self.release, prepared)
+    
+    def execute(
+        self,
+        code: str,
+        language: Language,
+        input_data: Optional[str] = None,
+    ) -> ExecutionResult:
+        """
+        Execute code directly using subprocess
+        """
+        prepared = self.prepare(code, language)
+        try:
+            result = self.run_prepared(prepared, input_data)
+            if prepared.compiled and result.execution_time is not None:
+                result.execution_time += prepared.compile_time or 0
+            return result
         finally:
-            # Cleanup temp directory
-            try:
-                shutil.rmtree(temp_dir)
-            except:
-                pass
+            self.release(prepared)
     
-    def execute_with_test_case(
+    async def execute_async(
         self,
         code: str,
         language: Language,
-        input_data: str,
+        input_data: Optional[str] = None,
+    ) -> ExecutionResult:
+        """Async version of execute()"""
+        prepared = await self.prepare_async(code, language)
+        try:
+            result = await self.run_prepared_async(prepared, input_data)
+            if prepared.compiled and result.execution_time is not None:
+                result.execution_time += prepared.compile_time or 0
+            return result
+        finally:
+            await self.release_async(prepared)
+    
+    def _compare(
+        self,
+        result: ExecutionResult,
         expected_output: str,
     ) -> Tuple[bool, str, Optional[str], Optional[float]]:
         """
-        Execute code with test case and compare output
+        Compare an execution result with the expected output
         Returns: (passed, actual_output, error, execution_time)
         """
-        result = self.execute(code, language, input_data)
-        
         if not result.success:
             return False, "", result.error, result.execution_time
         
@@ -231,8 +440,158 @@ class DirectExecutor:
         
         passed = actual == expected
         return passed, actual, result.error, result.execution_time
+    
+    def run_test_case(
+        self,
+        prepared: PreparedSubmission,
+        input_data: str,
+        expected_output: str,
+    ) -> Tuple[bool, str, Optional[str], Optional[float]]:
+        """
+        Run a prepared submission against a test case and compare output
+        Returns: (passed, actual_output, error, execution_time)
+        """
+        return self._compare(self.run_prepared(prepared, input_data), expected_output)
+    
+    async def run_test_case_async(
+        self,
+        prepared: PreparedSubmission,
+        input_data: str,
+        expected_output: str,
+    ) -> Tuple[bool, str, Optional[str], Optional[float]]:
+        """Async version of run_test_case()"""
+        result = await self.run_prepared_async(prepared, input_data)
+        return self._compare(result, expected_output)
+    
+    def parallel_test_cases(self) -> int:
+        """Test cases of one submission that may run at once"""
+        return settings.max_parallel_test_cases
+    
+    def supports_batch(self, language: Language) -> bool:
+        """Whether test cases in this language can run in one batch process"""
+        return batch_harness.supports(language)
+    
+    def _get_java_runner_dir(self) -> Path:
+        """Compile the Java batch runner once per runner version and return its class directory"""
+        with self._java_runner_lock:
+            if self._java_runner_dir is None:
+                source = batch_harness.runner_source(Language.JAVA)
+                digest = hashlib.sha256(source.encode('utf-8')).hexdigest()[:12]
+                runner_dir = Path(tempfile.gettempdir()) / f"batch_runner_{digest}"
+                if not (runner_dir / "BatchRunner.class").exists():
+                    build_dir = Path(tempfile.mkdtemp(prefix="batch_runner_build_"))
+                    try:
+                        shutil.copy(batch_harness.runner_path(Language.JAVA), build_dir)
+                        subprocess.run(
+                            ["javac", "BatchRunner.java"],
+                            cwd=build_dir,
+                            capture_output=True,
+                            check=True,
+                            timeout=120,
+                        )
+                        # Atomic publish; another worker may have beaten us to it
+                        os.rename(build_dir, runner_dir)
+                    except (OSError, subprocess.SubprocessError):
+                        shutil.rmtree(build_dir, ignore_errors=True)
+                    if not (runner_dir / "BatchRunner.class").exists():
+                        raise RuntimeError("Could not compile the Java batch runner")
+                self._java_runner_dir = runner_dir
+            return self._java_runner_dir
+    
+    def _get_batch_command(self, prepared: PreparedSubmission) -> list:
+        """Get the command that runs a prepared submission under its batch runner"""
+        if prepared.language == Language.PYTHON:
+            return [
+                "python3",
+                str(batch_harness.runner_path(Language.PYTHON)),
+                str(Path(prepared.workdir) / self._get_code_filename(Language.PYTHON)),
+            ]
+        if prepared.language == Language.JAVA:
+            return ["java", "-cp", str(self._get_java_runner_dir()), "BatchRunner", prepared.workdir]
+        raise ValueError(f"Batch mode not supported for {prepared.language.value}")
+    
+    def _run_batch_process(self, cmd: list, data: bytes, cwd: str, cases: int) -> str:
+        """
+        Run a batch runner, returning whatever result frames it wrote
+        Output written before a crash or timeout is kept so only the
+        unreported cases need to be rerun.
+        """
+        try:
+            result = subprocess.run(
+                cmd,
+                input=data,
+                capture_output=True,
+                timeout=self.timeout * cases,
+                cwd=cwd,
+                preexec_fn=self._get_preexec_fn(cases),
+            )
+            stdout = result.stdout
+        except subprocess.TimeoutExpired as e:
+            stdout = e.stdout or b""
+        except Exception:
+            stdout = b""
+        return stdout.decode('utf-8', errors='replace')
+    
+    def run_test_case_batch(
+        self,
+        prepared: PreparedSubmission,
+        cases: List[Tuple[str, str]],
+    ) -> List[Optional[Tuple[bool, str, Optional[str], Optional[float]]]]:
+        """
+        Run a prepared submission against many (input, expected_output) test
+        cases in a single runner process and compare outputs
+        Returns: one (passed, actual_output, error, execution_time) per case,
+        or None for cases the runner did not report
+        """
+        if not prepared.compiled:
+            result = self._compile_error_result(prepared)
+            return [self._compare(result, expected_output) for _, expected_output in cases]
+        
+        try:
+            cmd = self._get_batch_command(prepared)
+        except Exception:
+            return [None] * len(cases)
+        
+        stdout = self._run_batch_process(
+            cmd,
+            batch_harness.encode_inputs([input_data for input_data, _ in cases], self.timeout),
+            cwd=prepared.workdir,
+            cases=len(cases),
+        )
+        outcomes = []
+        for frame, (_, expected_output) in zip(batch_harness.decode_results(stdout, len(cases)), cases):
+            if frame is None:
+                outcomes.append(None)
+                continue
+            result = self._build_result(*batch_harness.frame_output(frame, self.timeout))
+            outcomes.append(self._compare(result, expected_output))
+        return outcomes
+    
+    async def run_test_case_batch_async(
+        self,
+        prepared: PreparedSubmission,
+        cases: List[Tuple[str, str]],
+    ) -> List[Optional[Tuple[bool, str, Optional[str], Optional[float]]]]:
+        """Async version of run_test_case_batch()"""
+        return await asyncio.to_thread(self.run_test_case_batch, prepared, cases)
+    
+    def execute_with_test_case(
+        self,
+        code: str,
+        language: Language,
+        input_data: str,
+        expected_output: str,
+    ) -> Tuple[bool, str, Optional[str], Optional[float]]:
+        """
+        Execute code with test case and compare output
+        Returns: (passed, actual_output, error, execution_time)
+        """
+        prepared = self.prepare(code, language)
+        try:
+            return self.run_test_case(prepared, input_data, expected_output)
+        finally:
+            self.release(prepared)
 
 
 # Global executor instance
 direct_executor = DirectExecutor()
-
@@ -0,0 +1,119 @@
+import asyncio
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple
+from app.models.assessment import Question, Submission
+from app.schemas.assessment import TestExecutionRequest
+from app.services.code_executor import FINISHED, code_executor_service
+from app.db.json_storage import storage
+
+
+# Last event of grading_events(), after the executor's COMPILED and RESULT events
+SUBMITTED = "submitted"
+
+
+class NotFoundError(LookupError):
+    """The assessment or question of a submission does not exist"""
+
+
+def find_submission(request: TestExecutionRequest, submission_id: str) -> Optional[Submission]:
+    """Get the stored submission with the given ID for a request, if any"""
+    submissions = storage.get_submissions(
+        assessment_id=request.assessment_id,
+        question_id=request.question_id,
+        candidate_id=request.candidate_id,
+    )
+    return next((submission for submission in submissions if submission.id == submission_id), None)
+
+
+def _find_question(request: TestExecutionRequest) -> Question:
+    """Look up the question a submission answers; raises NotFoundError"""
+    # Get assessment first (this will auto-create default-assessment if needed)
+    assessment = storage.get_assessment(request.assessment_id)
+    if not assessment:
+        # Try to auto-create default assessment
+        if request.assessment_id == 'default-assessment':
+            from app.db.seed_data import create_default_assessment
+            assessment = create_default_assessment()
+        else:
+            raise NotFoundError("Assessment not found")
+    
+    found = storage.get_question(request.question_id)
+    if not found or found[0].id != assessment.id:
+        raise NotFoundError("Question not found")
+    return found[1]
+
+
+async def grading_events(request: TestExecutionRequest, submission_id: Optional[str] = None) -> AsyncIterator[Tuple]:
+    """
+    Run a submission's test cases and store the graded submission
+    Yields the COMPILED and RESULT events of
+    CodeExecutorService.iter_test_cases_async() as the test cases run, then
+    (SUBMITTED, submission) once the graded submission is stored.
+    Raises NotFoundError for an unknown assessment or question and
+    ValueError for an invalid submission (e.g. a language not allowed)
+    """
+    # Storage calls may read, lock and fsync files, so they run off the event loop
+    question = await asyncio.to_thread(_find_question, request)
+    
+    # Run test cases
+    events = code_executor_service.iter_test_cases_async(
+        code=request.code,
+        language=request.language,
+        question_id=request.question_id,
+        include_hidden=request.include_hidden,
+        grading_policy=request.grading_policy,
+    )
+    async for event in events:
+        if event[0] == FINISHED:
+            _, test_results, compilation_logs = event
+        else:
+            yield event
+    
+    # Create sets of test case IDs for quick lookup
+    sample_test_case_ids = {tc.id for tc in question.sample_test_cases}
+    hidden_test_case_ids = {tc.id for tc in question.hidden_test_cases}
+    
+    # Count passed test cases
+    sample_passed = sum(
+        1 for tr in test_results
+        if tr.passed and tr.test_case_id in sample_test_case_ids
+    )
+    sample_total = len(question.sample_test_cases)
+    
+    hidden_passed = sum(
+        1 for tr in test_results
+        if tr.passed and tr.test_case_id in hidden_test_case_ids
+    )
+    hidden_total = len(question.hidden_test_cases) if request.include_hidden else 0
+    
+    # Create submission
+    submission = Submission(
+        id=submission_id or str(uuid.uuid4()),
+        assessment_id=request.assessment_id,
+        question_id=request.question_id,
+        candidate_id=request.candidate_id,
+        code=request.code,
+        language=request.language,
+        test_results=test_results,
+        sample_passed=sample_passed,
+        sample_total=sample_total,
+        hidden_passed=hidden_passed,
+        hidden_total=hidden_total,
+        compilation_logs=compilation_logs,
+        submitted_at=datetime.utcnow(),
+    )
+    
+    # Save submission
+    yield SUBMITTED, await asyncio.to_thread(storage.create_submission, submission)
+
+
+async def grade_submission(request: TestExecutionRequest, submission_id: Optional[str] = None) -> Submission:
+    """
+    Run a submission's test cases and store the graded submission
+    Raises like grading_events()
+    """
+    async for event in grading_events(request, submission_id):
+        if event[0] == SUBMITTED:
+            submission = event[1]
+    return submission
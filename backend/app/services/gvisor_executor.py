@@ -1,13 +1,37 @@
+import asyncio
 import subprocess
-import tempfile
 import os
 import time
 import shutil
+import hashlib
+import threading
 from pathlib import Path
-from typing import Optional, Tuple
-from app.models.assessment import Language, ExecutionResult
+from typing import Dict, List, Optional, Tuple
+from app.models.assessment import Language, ExecutionResult, PreparedSubmission
+from app.services import batch_harness
+from app.services.sandbox_pool import Sandbox, SandboxPool
 from app.core.config import settings
 
+# Where the submission's code lives inside the sandbox
+SANDBOX_DIR = "/sandbox"
+# Exit status of a process killed by timeout(1) with SIGKILL
+TIMEOUT_KILLED = 137
+# Extra time the host waits for docker exec before giving up on a sandbox
+EXEC_GRACE_SECONDS = 5
+# Where the batch runner is copied inside the sandbox
+BATCH_RUNNER_PATH = "/tmp/batch_runner.py"
+# Submissions are written and compiled as root and run as nobody, who can
+# read the build but not change it
+RUN_USER = "65534:65534"
+# Run before each test case: drop processes and /tmp files an earlier test
+# case of the same submission left behind (nobody can only touch its own)
+RUN_PREFIX = 'kill -9 -1 2>/dev/null; rm -rf /tmp/* /tmp/.[!.]* 2>/dev/null; exec "$@"'
+# Kill leftover processes and wipe writable paths before a sandbox is reused
+SANDBOX_RESET_COMMAND = [
+    "sh", "-c",
+    f"kill -9 -1 2>/dev/null; rm -rf {SANDBOX_DIR}/* {SANDBOX_DIR}/.[!.]* /tmp/* /tmp/.[!.]* 2>/dev/null; true",
+]
+
 
 class GVisorExecutor:
     """Execute code in gVisor sandbox using Docker with runsc runtime"""
@@ -18,6 +42,18 @@ class GVisorExecutor:
         self.memory_limit = settings.gvisor_memory_limit
         self.cpu_limit = settings.gvisor_cpu_limit
         self._gvisor_available = None  # Cache for availability check
+        # Use longer timeout for compilation (especially C++) and image builds
+        self.compile_timeout = self.timeout * 2
+        self.image_build_timeout = max(self.timeout * 10, 600)
+        self._ready_images = set()  # Runtime images known to exist
+        self._image_lock = threading.Lock()
+        self.pool = SandboxPool(
+            start_command=self._get_sandbox_start_command,
+            reset_command=SANDBOX_RESET_COMMAND,
+            sizes=settings.sandbox_pool_sizes,
+            max_reuse=settings.gvisor_pool_max_reuse,
+            idle_ttl=settings.gvisor_pool_idle_ttl,
+        )
     
     def _check_gvisor_available(self) -> bool:
         """Check if gVisor runtime is available in Docker"""
@@ -54,41 +90,42 @@ class GVisorExecutor:
             self._gvisor_available = False
             return False
     
-    def _get_dockerfile(self, language: Language, code_file: str) -> str:
-        """Generate Dockerfile based on language"""
+    def _get_dockerfile(self, language: Language) -> str:
+        """
+        Generate the runtime image Dockerfile for a language
+        Runtime images only carry the toolchain; code is mounted at run time.
+        """
         if language == Language.PYTHON:
-            return f"""
+            return """
 FROM python:3.11-slim
-WORKDIR /app
-COPY {code_file} solution.py
-CMD ["python", "solution.py"]
+WORKDIR /sandbox
 """
         elif language == Language.JAVA:
-            return f"""
+            return """
 FROM eclipse-temurin:17-jdk-jammy
-WORKDIR /app
-COPY {code_file} Solution.java
-RUN javac Solution.java
-CMD ["java", "Solution"]
+WORKDIR /sandbox
 """
         elif language == Language.CPP:
-            return f"""
+            return """
 FROM gcc:12
-WORKDIR /app
-COPY {code_file} solution.cpp
-RUN g++ -std=c++17 -O2 -o solution solution.cpp
-CMD ["./solution"]
+WORKDIR /sandbox
 """
         elif language == Language.JAVASCRIPT:
-            return f"""
+            return """
 FROM node:18-slim
-WORKDIR /app
-COPY {code_file} solution.js
-CMD ["node", "solution.js"]
+WORKDIR /sandbox
 """
         else:
             raise ValueError(f"Unsupported language: {language}")
     
+    def _get_image_name(self, language: Language) -> str:
+        """
+        Get the runtime image tag for a language
+        The tag is derived from the Dockerfile, so changing it yields a new version.
+        """
+        version = hashlib.sha256(self._get_dockerfile(language).encode('utf-8')).hexdigest()[:12]
+        return f"{settings.gvisor_image_prefix}-{language.value}:{version}"
+    
     def _get_code_filename(self, language: Language) -> str:
         """Get the code filename for the given language"""
         extensions = {
@@ -99,154 +136,395 @@ CMD ["node", "solution.js"]
         }
         return extensions[language]
     
-    def _run_in_gvisor(
-        self,
-        code: str,
-        language: Language,
-        input_data: Optional[str] = None,
-    ) -> Tuple[str, str, Optional[float], Optional[int]]:
+    def _get_compile_command(self, language: Language) -> Optional[list]:
+        """Get the in-container compile command, or None for interpreted languages"""
+        if language == Language.JAVA:
+            return ["javac", "Solution.java"]
+        elif language == Language.CPP:
+            return ["g++", "-std=c++17", "-O2", "-o", "solution", "solution.cpp"]
+        return None
+    
+    def _get_execution_command(self, language: Language) -> list:
+        """Get the in-container command that runs the code"""
+        if language == Language.PYTHON:
+            return ["python", "solution.py"]
+        elif language == Language.JAVA:
+            return ["java", "-cp", SANDBOX_DIR, "Solution"]
+        elif language == Language.CPP:
+            return ["./solution"]
+        elif language == Language.JAVASCRIPT:
+            return ["node", "solution.js"]
+        else:
+            raise ValueError(f"Unsupported language: {language}")
+    
+    def ensure_image(self, language: Language) -> Optional[str]:
         """
-        Execute code in gVisor sandbox
-        Returns: (stdout, stderr, execution_time, memory_used)
+        Make sure the runtime image for a language exists, building it if needed
+        Returns: error message, or None when the image is ready
+        """
+        image_name = self._get_image_name(language)
+        if image_name in self._ready_images:
+            return None
+        
+        with self._image_lock:
+            if image_name in self._ready_images:
+                return None
+            try:
+                inspect_result = subprocess.run(
+                    ["docker", "image", "inspect", image_name],
+                    capture_output=True,
+                    timeout=10,
+                )
+                if inspect_result.returncode != 0:
+                    # Build from a Dockerfile on stdin; no build context is needed
+                    build_result = subprocess.run(
+                        ["docker", "build", "-t", image_name, "-"],
+                        input=self._get_dockerfile(language),
+                        capture_output=True,
+                        text=True,
+                        timeout=self.image_build_timeout,
+                    )
+                    if build_result.returncode != 0:
+                        return f"Failed to build runtime image {image_name}:\n{build_result.stderr}"
+            except subprocess.TimeoutExpired:
+                return f"Timed out building runtime image {image_name}"
+            except Exception as e:
+                return self._format_exception(e)
+            
+            self._ready_images.add(image_name)
+            return None
+    
+    def ensure_images(self) -> Dict[Language, Optional[str]]:
+        """
+        Build or verify the runtime images for every language
+        Returns: error message per language (None when ready)
         """
-        # Normalize input_data to string if it's not None
+        return {language: self.ensure_image(language) for language in Language}
+    
+    def _use_gvisor(self) -> Tuple[bool, Optional[str]]:
+        """
+        Decide whether to run under runsc or plain Docker
+        Returns: (use_gvisor, error_message)
+        """
+        if self._check_gvisor_available():
+            return True, None
+        if settings.gvisor_fallback_to_docker:
+            # Fallback to regular Docker (less secure, for development only)
+            return False, None
+        error_msg = (
+            "gVisor runtime (runsc) is not available. "
+            "Please install and configure gVisor:\n"
+            "1. Install gVisor: curl -fsSL https://gvisor.dev/install | bash\n"
+            "2. Configure Docker: Add 'runsc' runtime to /etc/docker/daemon.json\n"
+            "   Example: {\"runtimes\": {\"runsc\": {\"path\": \"/usr/local/bin/runsc\"}}}\n"
+            "3. Restart Docker: sudo systemctl restart docker\n"
+            "4. Verify: docker run --runtime=runsc hello-world\n\n"
+            "Alternatively, set GVISOR_FALLBACK_TO_DOCKER=true for development (less secure)"
+        )
+        return False, error_msg
+    
+    def _get_sandbox_start_command(self, language: Language, name: str) -> list:
+        """Get the docker run command that starts an idle sandbox for a language"""
+        use_gvisor, _ = self._use_gvisor()
+        run_cmd = [
+            "docker", "run",
+            "-d",
+            "--rm",
+            "--name", name,
+            "--memory", self.memory_limit,
+            "--cpus", self.cpu_limit,
+            "--network", "none",  # Disable network for security
+            "--read-only",  # Read-only filesystem
+            # Only the code directory (by root) and /tmp are writable
+            "--tmpfs", f"{SANDBOX_DIR}:rw,exec,mode=0755",
+            "--tmpfs", "/tmp:rw,exec,mode=1777",
+            "-w", SANDBOX_DIR,
+        ]
+        
+        if use_gvisor:
+            run_cmd.extend(["--runtime", "runsc"])  # Use gVisor runtime
+        
+        run_cmd.extend([self._get_image_name(language), "sleep", "infinity"])
+        return run_cmd
+    
+    def _get_exec_command(self, sandbox: Sandbox, command: list, timeout: Optional[float] = None) -> list:
+        """Get the docker exec command that runs a command in a sandbox"""
+        # timeout(1) kills the process inside the sandbox; killing the docker
+        # client on the host alone would leave it running
+        return [
+            "docker", "exec", "-i", sandbox.name,
+            "timeout", "-s", "KILL", str(timeout or self.timeout),
+        ] + command
+    
+    def _get_run_command(self, sandbox: Sandbox, command: list, timeout: Optional[float] = None) -> list:
+        """Get the docker exec command that runs the submission against one input, as nobody"""
+        return [
+            "docker", "exec", "-i", "-u", RUN_USER, sandbox.name,
+            "sh", "-c", RUN_PREFIX, "sh",
+            "timeout", "-s", "KILL", str(timeout or self.timeout),
+        ] + command
+    
+    def _get_write_command(self, sandbox: Sandbox, language: Language) -> list:
+        """Get the docker exec command that writes the code (from stdin) into a sandbox"""
+        return self._get_write_file_command(sandbox, f"{SANDBOX_DIR}/{self._get_code_filename(language)}")
+    
+    def _get_write_file_command(self, sandbox: Sandbox, path: str) -> list:
+        """Get the docker exec command that writes stdin to a file in a sandbox"""
+        return ["docker", "exec", "-i", sandbox.name, "sh", "-c", f"cat > {path}"]
+    
+    def _exec_error(self, returncode: int, stderr: str, elapsed: float) -> str:
+        """Turn a failed docker exec into an error message"""
+        if returncode == TIMEOUT_KILLED and elapsed >= self.timeout:
+            return f"Execution timeout after {self.timeout} seconds"
+        return stderr
+    
+    def _normalize_input(self, input_data) -> Optional[str]:
+        """Normalize input_data to string if it's not None"""
         if input_data is not None and not isinstance(input_data, str):
             if isinstance(input_data, bytes):
-                input_data = input_data.decode('utf-8')
-            else:
-                input_data = str(input_data)
+                return input_data.decode('utf-8')
+            return str(input_data)
+        return input_data
+    
+    def _format_exception(self, e: Exception) -> str:
+        """Format an unexpected error, including traceback for debugging"""
+        import traceback
+        error_msg = f"{type(e).__name__}: {str(e)}"
+        return f"{error_msg}\n{traceback.format_exc()}"
+    
+    async def _run_process_async(
+        self,
+        cmd: list,
+        input_data: Optional[str],
+        timeout: float,
+    ) -> Tuple[int, str, str]:
+        """
+        Run a command as an asyncio subprocess, killing it on timeout
+        Returns: (returncode, stdout, stderr)
+        """
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate(input_data.encode('utf-8') if input_data is not None else None),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
+        return (
+            process.returncode,
+            stdout.decode('utf-8', errors='replace'),
+            stderr.decode('utf-8', errors='replace'),
+        )
+    
+    def prepare(self, code: str, language: Language) -> PreparedSubmission:
+        """
+        Check out a warm sandbox, copy the submission into it and, for
+        Java/C++, compile it once so it can be run against any number of
+        inputs. The sandbox must be returned with release().
+        """
+        prepared = PreparedSubmission(code=code, language=language)
         
-        # Check if gVisor is available
-        use_gvisor = self._check_gvisor_available()
-        if not use_gvisor:
-            if settings.gvisor_fallback_to_docker:
-                # Fallback to regular Docker (less secure, for development only)
-                use_gvisor = False
-            else:
-                error_msg = (
-                    "gVisor runtime (runsc) is not available. "
-                    "Please install and configure gVisor:\n"
-                    "1. Install gVisor: curl -fsSL https://gvisor.dev/install | bash\n"
-                    "2. Configure Docker: Add 'runsc' runtime to /etc/docker/daemon.json\n"
-                    "   Example: {\"runtimes\": {\"runsc\": {\"path\": \"/usr/local/bin/runsc\"}}}\n"
-                    "3. Restart Docker: sudo systemctl restart docker\n"
-                    "4. Verify: docker run --runtime=runsc hello-world\n\n"
-                    "Alternatively, set GVISOR_FALLBACK_TO_DOCKER=true for development (less secure)"
-                )
-                return "", error_msg, None, None
+        _, error_msg = self._use_gvisor()
+        error_msg = error_msg or self.ensure_image(language)
+        if error_msg:
+            prepared.compile_error = error_msg
+            return prepared
         
-        temp_dir = tempfile.mkdtemp(prefix="gvisor_exec_")
         try:
-            # Write code to a file
-            code_filename = self._get_code_filename(language)
-            code_file_path = Path(temp_dir) / code_filename
-            code_file_path.write_text(code, encoding='utf-8')
-            
-            # Create Dockerfile
-            dockerfile_content = self._get_dockerfile(language, code_filename)
-            dockerfile_path = Path(temp_dir) / "Dockerfile"
-            dockerfile_path.write_text(dockerfile_content)
-            
-            # Build Docker image
-            image_name = f"gvisor-exec-{int(time.time())}"
-            build_cmd = [
-                "docker", "build",
-                "-t", image_name,
-                "-f", str(dockerfile_path),
-                temp_dir,
-            ]
+            prepared.sandbox = self.pool.checkout(language)
+            prepared.image = self._get_image_name(language)
+            prepared.run_cmd = self._get_run_command(
+                prepared.sandbox, self._get_execution_command(language)
+            )
             
-            # Use longer timeout for build (especially C++ compilation)
-            build_timeout = self.timeout * 2  # Double timeout for builds
-            build_result = subprocess.run(
-                build_cmd,
+            write_result = subprocess.run(
+                self._get_write_command(prepared.sandbox, language),
+                input=code,
                 capture_output=True,
                 text=True,
-                timeout=build_timeout,
+                timeout=self.timeout,
             )
+            if write_result.returncode != 0:
+                prepared.sandbox.healthy = False
+                prepared.compile_error = write_result.stderr
+                return prepared
             
-            if build_result.returncode != 0:
-                return "", build_result.stderr, None, None
-            
-            # Run container with gVisor runtime (or fallback to regular Docker)
-            run_cmd = [
-                "docker", "run",
-                "--rm",
-                "--memory", self.memory_limit,
-                "--cpus", self.cpu_limit,
-                "--network", "none",  # Disable network for security
-                "--read-only",  # Read-only filesystem
-            ]
-            
-            if use_gvisor:
-                run_cmd.extend(["--runtime", "runsc"])  # Use gVisor runtime
+            compile_cmd = self._get_compile_command(language)
+            if compile_cmd:
+                start_time = time.time()
+                compile_result = subprocess.run(
+                    self._get_exec_command(prepared.sandbox, compile_cmd),
+                    capture_output=True,
+                    text=True,
+                    timeout=self.compile_timeout,
+                )
+                prepared.compile_time = time.time() - start_time
+                
+                if compile_result.returncode != 0:
+                    prepared.compile_error = self._exec_error(
+                        compile_result.returncode,
+                        compile_result.stderr or compile_result.stdout,
+                        prepared.compile_time,
+                    )
+        
+        except subprocess.TimeoutExpired:
+            prepared.sandbox.healthy = False
+            prepared.compile_error = f"Compilation timeout after {self.compile_timeout} seconds"
+        except RuntimeError as e:
+            # No sandbox could be started
+            prepared.compile_error = str(e)
+        except Exception as e:
+            prepared.compile_error = self._format_exception(e)
+        
+        return prepared
+    
+    async def prepare_async(self, code: str, language: Language) -> PreparedSubmission:
+        """Async version of prepare()"""
+        prepared = PreparedSubmission(code=code, language=language)
+        
+        _, error_msg = await asyncio.to_thread(self._use_gvisor)
+        error_msg = error_msg or await asyncio.to_thread(self.ensure_image, language)
+        if error_msg:
+            prepared.compile_error = error_msg
+            return prepared
+        
+        try:
+            prepared.sandbox = await asyncio.to_thread(self.pool.checkout, language)
+            prepared.image = self._get_image_name(language)
+            prepared.run_cmd = self._get_run_command(
+                prepared.sandbox, self._get_execution_command(language)
+            )
             
-            run_cmd.append(image_name)
+            returncode, _, stderr = await self._run_process_async(
+                self._get_write_command(prepared.sandbox, language), code, self.timeout
+            )
+            if returncode != 0:
+                prepared.sandbox.healthy = False
+                prepared.compile_error = stderr
+                return prepared
             
+            compile_cmd = self._get_compile_command(language)
+            if compile_cmd:
+                start_time = time.time()
+                returncode, stdout, stderr = await self._run_process_async(
+                    self._get_exec_command(prepared.sandbox, compile_cmd),
+                    None,
+                    self.compile_timeout,
+                )
+                prepared.compile_time = time.time() - start_time
+                
+                if returncode != 0:
+                    prepared.compile_error = self._exec_error(
+                        returncode, stderr or stdout, prepared.compile_time
+                    )
+        
+        except asyncio.TimeoutError:
+            prepared.sandbox.healthy = False
+            prepared.compile_error = f"Compilation timeout after {self.compile_timeout} seconds"
+        except RuntimeError as e:
+            # No sandbox could be started
+            prepared.compile_error = str(e)
+        except Exception as e:
+            prepared.compile_error = self._format_exception(e)
+        
+        return prepared
+    
+    def _run_in_gvisor(
+        self,
+        prepared: PreparedSubmission,
+        input_data: Optional[str] = None,
+    ) -> Tuple[str, str, Optional[float], Optional[int]]:
+        """
+        Run a prepared submission in its gVisor sandbox
+        Returns: (stdout, stderr, execution_time, memory_used)
+        """
+        if not prepared.compiled:
+            return "", prepared.compile_error, prepared.compile_time, None
+        
+        input_data = self._normalize_input(input_data)
+        try:
             start_time = time.time()
-            # Prepare input data - when text=True, subprocess expects a string, not bytes
-            # Normalize input_data to string if provided
-            input_str = None
-            if input_data is not None:
-                if isinstance(input_data, bytes):
-                    input_str = input_data.decode('utf-8')
-                elif isinstance(input_data, str):
-                    input_str = input_data
-                else:
-                    input_str = str(input_data)
-            
             run_result = subprocess.run(
-                run_cmd,
-                input=input_str,  # Pass string when text=True
+                prepared.run_cmd,
+                input=input_data,  # Pass string when text=True
                 capture_output=True,
                 text=True,
-                timeout=self.timeout,
+                # timeout(1) in the sandbox fires first; this is a backstop
+                timeout=self.timeout + EXEC_GRACE_SECONDS,
             )
             execution_time = time.time() - start_time
             
-            # Cleanup image
-            try:
-                subprocess.run(
-                    ["docker", "rmi", image_name],
-                    capture_output=True,
-                    timeout=5,
-                )
-            except:
-                pass
+            stderr = run_result.stderr
+            if run_result.returncode != 0:
+                stderr = self._exec_error(run_result.returncode, stderr, execution_time)
             
             return (
                 run_result.stdout,
-                run_result.stderr,
+                stderr,
                 execution_time,
                 None,  # Memory usage would require additional monitoring
             )
         
         except subprocess.TimeoutExpired:
+            prepared.sandbox.healthy = False
             return "", f"Execution timeout after {self.timeout} seconds", None, None
         except Exception as e:
-            import traceback
-            error_msg = f"{type(e).__name__}: {str(e)}"
-            # Include traceback in error for debugging
-            traceback_str = traceback.format_exc()
-            return "", f"{error_msg}\n{traceback_str}", None, None
-        finally:
-            # Cleanup temp directory
-            try:
-                shutil.rmtree(temp_dir)
-            except:
-                pass
+            return "", self._format_exception(e), None, None
     
-    def execute(
+    async def _run_in_gvisor_async(
         self,
-        code: str,
-        language: Language,
+        prepared: PreparedSubmission,
         input_data: Optional[str] = None,
-    ) -> ExecutionResult:
-        """
-        Execute code and return result
-        """
-        stdout, stderr, exec_time, memory = self._run_in_gvisor(code, language, input_data)
+    ) -> Tuple[str, str, Optional[float], Optional[int]]:
+        """Async version of _run_in_gvisor()"""
+        if not prepared.compiled:
+            return "", prepared.compile_error, prepared.compile_time, None
         
+        input_data = self._normalize_input(input_data)
+        try:
+            start_time = time.time()
+            returncode, stdout, stderr = await self._run_process_async(
+                prepared.run_cmd, input_data, self.timeout + EXEC_GRACE_SECONDS
+            )
+            execution_time = time.time() - start_time
+            
+            if returncode != 0:
+                stderr = self._exec_error(returncode, stderr, execution_time)
+            
+            return stdout, stderr, execution_time, None
+        
+        except asyncio.TimeoutError:
+            prepared.sandbox.healthy = False
+            return "", f"Execution timeout after {self.timeout} seconds", None, None
+        except Exception as e:
+            return "", self._format_exception(e), None, None
+    
+    def release(self, prepared: PreparedSubmission):
+        """Return the sandbox of a prepared submission to the pool"""
+        if prepared.sandbox is None:
+            return
+        self.pool.checkin(prepared.sandbox)
+        prepared.sandbox = None
+    
+    async def release_async(self, prepared: PreparedSubmission):
+        """Async version of release()"""
+        await asyncio.to_thread(self.release, prepared)
+    
+    def _build_result(
+        self,
+        stdout: str,
+        stderr: str,
+        exec_time: Optional[float],
+        memory: Optional[int],
+    ) -> ExecutionResult:
+        """Turn raw container output into an ExecutionResult"""
         # Combine stdout and stderr for error detection
         error = stderr if stderr and stderr.strip() else None
         success = error is None or (not error.strip())
@@ -264,19 +542,59 @@ CMD ["node", "solution.js"]
             memory_used=memory,
         )
     
-    def execute_with_test_case(
+    def run_prepared(
+        self,
+        prepared: PreparedSubmission,
+        input_data: Optional[str] = None,
+    ) -> ExecutionResult:
+        """Run a prepared submission against one input"""
+        return self._build_result(*self._run_in_gvisor(prepared, input_data))
+    
+    async def run_prepared_async(
+        self,
+        prepared: PreparedSubmission,
+        input_data: Optional[str] = None,
+    ) -> ExecutionResult:
+        """Async version of run_prepared()"""
+        return self._build_result(*await self._run_in_gvisor_async(prepared, input_data))
+    
+    def execute(
         self,
         code: str,
         language: Language,
-        input_data: str,
+        input_data: Optional[str] = None,
+    ) -> ExecutionResult:
+        """
+        Execute code and return result
+        """
+        prepared = self.prepare(code, language)
+        try:
+            return self.run_prepared(prepared, input_data)
+        finally:
+            self.release(prepared)
+    
+    async def execute_async(
+        self,
+        code: str,
+        language: Language,
+        input_data: Optional[str] = None,
+    ) -> ExecutionResult:
+        """Async version of execute()"""
+        prepared = await self.prepare_async(code, language)
+        try:
+            return await self.run_prepared_async(prepared, input_data)
+        finally:
+            await self.release_async(prepared)
+    
+    def _compare(
+        self,
+        result: ExecutionResult,
         expected_output: str,
     ) -> Tuple[bool, str, Optional[str], Optional[float]]:
         """
-        Execute code with test case and compare output
+        Compare an execution result with the expected output
         Returns: (passed, actual_output, error, execution_time)
         """
-        result = self.execute(code, language, input_data)
-        
         if not result.success:
             return False, "", result.error, result.execution_time
         
@@ -286,8 +604,135 @@ CMD ["node", "solution.js"]
         
         passed = actual == expected
         return passed, actual, result.error, result.execution_time
+    
+    def run_test_case(
+        self,
+        prepared: PreparedSubmission,
+        input_data: str,
+        expected_output: str,
+    ) -> Tuple[bool, str, Optional[str], Optional[float]]:
+        """
+        Run a prepared submission against a test case and compare output
+        Returns: (passed, actual_output, error, execution_time)
+        """
+        return self._compare(self.run_prepared(prepared, input_data), expected_output)
+    
+    async def run_test_case_async(
+        self,
+        prepared: PreparedSubmission,
+        input_data: str,
+        expected_output: str,
+    ) -> Tuple[bool, str, Optional[str], Optional[float]]:
+        """Async version of run_test_case()"""
+        result = await self.run_prepared_async(prepared, input_data)
+        return self._compare(result, expected_output)
+    
+    def parallel_test_cases(self) -> int:
+        """
+        Test cases of one submission that may run at once
+        One: they share the submission's sandbox, and each should get its
+        whole CPU and memory budget for its timing and time limit to hold.
+        """
+        return 1
+    
+    def supports_batch(self, language: Language) -> bool:
+        """
+        Whether test cases in this language can run in one batch process
+        Only Python: the Java runner would have to be compiled in every sandbox.
+        """
+        return language == Language.PYTHON
+    
+    def _run_batch_in_gvisor(self, prepared: PreparedSubmission, data: bytes, cases: int) -> str:
+        """
+        Copy the batch runner into the sandbox and run it over all inputs
+        Returns the result frames written before the runner exited
+        """
+        try:
+            write_result = subprocess.run(
+                self._get_write_file_command(prepared.sandbox, BATCH_RUNNER_PATH),
+                input=batch_harness.runner_source(Language.PYTHON),
+                capture_output=True,
+                text=True,
+                timeout=self.timeout,
+            )
+            if write_result.returncode != 0:
+                return ""
+            
+            batch_timeout = self.timeout * cases
+            run_cmd = self._get_run_command(
+                prepared.sandbox,
+                ["python", BATCH_RUNNER_PATH, f"{SANDBOX_DIR}/{self._get_code_filename(Language.PYTHON)}"],
+                timeout=batch_timeout,
+            )
+            stdout = subprocess.run(
+                run_cmd,
+                input=data,
+                capture_output=True,
+                timeout=batch_timeout + EXEC_GRACE_SECONDS,
+            ).stdout
+        except subprocess.TimeoutExpired as e:
+            prepared.sandbox.healthy = False
+            stdout = e.stdout or b""
+        except Exception:
+            stdout = b""
+        return stdout.decode('utf-8', errors='replace')
+    
+    def run_test_case_batch(
+        self,
+        prepared: PreparedSubmission,
+        cases: List[Tuple[str, str]],
+    ) -> List[Optional[Tuple[bool, str, Optional[str], Optional[float]]]]:
+        """
+        Run a prepared submission against many (input, expected_output) test
+        cases in a single runner process and compare outputs
+        Returns: one (passed, actual_output, error, execution_time) per case,
+        or None for cases the runner did not report
+        """
+        if not prepared.compiled:
+            result = self.run_prepared(prepared)
+            return [self._compare(result, expected_output) for _, expected_output in cases]
+        if not self.supports_batch(prepared.language):
+            return [None] * len(cases)
+        
+        stdout = self._run_batch_in_gvisor(
+            prepared,
+            batch_harness.encode_inputs([input_data for input_data, _ in cases], self.timeout),
+            len(cases),
+        )
+        outcomes = []
+        for frame, (_, expected_output) in zip(batch_harness.decode_results(stdout, len(cases)), cases):
+            if frame is None:
+                outcomes.append(None)
+                continue
+            result = self._build_result(*batch_harness.frame_output(frame, self.timeout), None)
+            outcomes.append(self._compare(result, expected_output))
+        return outcomes
+    
+    async def run_test_case_batch_async(
+        self,
+        prepared: PreparedSubmission,
+        cases: List[Tuple[str, str]],
+    ) -> List[Optional[Tuple[bool, str, Optional[str], Optional[float]]]]:
+        """Async version of run_test_case_batch()"""
+        return await asyncio.to_thread(self.run_test_case_batch, prepared, cases)
+    
+    def execute_with_test_case(
+        self,
+        code: str,
+        language: Language,
+        input_data: str,
+        expected_output: str,
+    ) -> Tuple[bool, str, Optional[str], Optional[float]]:
+        """
+        Execute code with test case and compare output
+        Returns: (passed, actual_output, error, execution_time)
+        """
+        prepared = self.prepare(code, language)
+        try:
+            return self.run_test_case(prepared, input_data, expected_output)
+        finally:
+            self.release(prepared)
 
 
 # Global executor instance
 executor = GVisorExecutor()
-
@@ -4,23 +4,76 @@ Uses Piston API for secure code execution
 """
 import asyncio
 import concurrent.futures
-from typing import Optional, Tuple
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
 from pyston import PystonClient, File
-from app.models.assessment import Language, ExecutionResult
+from pyston.exceptions import TooManyRequests
+from app.models.assessment import Language, ExecutionResult, PreparedSubmission
 from app.core.config import settings
 
 
+class PistonClientPool:
+    """
+    Long-lived PystonClients, one per event loop.
+    A client owns an aiohttp session, so reusing it keeps connections to the
+    Piston API alive between executions. Sessions are bound to the loop they
+    were created on, hence one client per loop rather than one global client.
+    """
+    
+    def __init__(self, base_url: str, api_key: Optional[str], max_connections: int):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_connections = max(1, max_connections)
+        self._clients: Dict[asyncio.AbstractEventLoop, Tuple[PystonClient, asyncio.Semaphore]] = {}
+    
+    def _prune(self):
+        """Forget clients whose event loop has gone away"""
+        for loop in [loop for loop in self._clients if loop.is_closed()]:
+            del self._clients[loop]
+    
+    @asynccontextmanager
+    async def client(self):
+        """Check out the running loop's client, capped at max_connections in flight"""
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None:
+            self._prune()
+            entry = (
+                PystonClient(api_key=self.api_key, base_url=self.base_url),
+                asyncio.Semaphore(self.max_connections),
+            )
+            self._clients[loop] = entry
+        client, connections = entry
+        async with connections:
+            yield client
+    
+    async def close(self):
+        """Close the running loop's client and its connections"""
+        entry = self._clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            try:
+                await entry[0].close_session()
+            except Exception:
+                # Ignore errors during cleanup
+                pass
+
+
 class PystonExecutor:
     """Execute code using Pyston API (Piston API wrapper)"""
     
     def __init__(self):
         self.timeout = settings.gvisor_timeout
+        self.client_pool = PistonClientPool(
+            base_url=settings.piston_api_url,
+            api_key=settings.piston_api_key,
+            max_connections=settings.piston_max_connections,
+        )
     
-    async def _get_client(self):
-        """Create a new PystonClient for each execution (required for concurrent executions)"""
-        # Create a new client for each execution since each execution may run in a different event loop
-        # This is necessary when running multiple test cases concurrently
-        return PystonClient()
+    async def close(self):
+        """Close pooled Piston connections for the running event loop"""
+        await self.client_pool.close()
     
     def _map_language(self, language: Language) -> str:
         """Map our Language enum to Pyston API language identifiers"""
@@ -37,103 +90,123 @@ class PystonExecutor:
         code: str,
         language: Language,
         input_data: Optional[str] = None,
-    ) -> Tuple[str, str, Optional[float]]:
+    ) -> Tuple[str, str, Optional[float], Optional[str]]:
         """
         Execute code asynchronously using Pyston API
-        Returns: (stdout, stderr, execution_time)
+        Returns: (stdout, stderr, execution_time, compile_error)
         """
-        client = None
         try:
             lang = self._map_language(language)
             
-            # Create a new client for this execution (each execution may be in a different event loop)
-            client = await self._get_client()
-            
             # Create file with code
             code_file = File(code)
             
-            # Execute with timeout
-            import time
-            start_time = time.time()
-            
-            # Use asyncio.wait_for for timeout handling
             # Piston API v2 execute signature: execute(language, files, stdin=None)
             execute_kwargs = {"stdin": input_data} if input_data else {}
-            output = await asyncio.wait_for(
-                client.execute(lang, [code_file], **execute_kwargs),
-                timeout=self.timeout
-            )
-            
-            execution_time = time.time() - start_time
-            
-            # Extract output and error from Pyston response
-            stdout = ""
-            stderr = ""
-            
-            if output:
-                # Pyston Output object structure (based on Piston API v2)
-                # Output has 'run' and 'compile' stages
-                if hasattr(output, 'run') and output.run:
-                    # Run stage contains stdout and stderr
-                    if hasattr(output.run, 'stdout'):
-                        stdout = output.run.stdout or ""
-                    if hasattr(output.run, 'stderr'):
-                        stderr = output.run.stderr or ""
-                
-                # Check compile stage for errors
-                if hasattr(output, 'compile') and output.compile:
-                    if hasattr(output.compile, 'stderr') and output.compile.stderr:
-                        # Prepend compilation errors
-                        stderr = (output.compile.stderr + "\n" + stderr).strip()
-                
-                # Fallback: check for direct stdout/stderr attributes
-                if not stdout and hasattr(output, 'stdout'):
-                    stdout = output.stdout or ""
-                if not stderr and hasattr(output, 'stderr'):
-                    stderr = output.stderr or ""
-                
-                # Last resort: if output is a string
-                if not stdout and not stderr:
-                    stdout = str(output) if output else ""
-            
-            return stdout, stderr, execution_time
+            retries = max(0, settings.piston_rate_limit_retries)
+            for attempt in range(retries + 1):
+                try:
+                    async with self.client_pool.client() as client:
+                        # Execute with timeout
+                        start_time = time.time()
+                        
+                        # Use asyncio.wait_for for timeout handling
+                        output = await asyncio.wait_for(
+                            client.execute(lang, [code_file], **execute_kwargs),
+                            timeout=self.timeout
+                        )
+                        
+                        execution_time = time.time() - start_time
+                    break
+                except TooManyRequests:
+                    if attempt == retries:
+                        raise
+                    # Back off outside the connection slot, with jitter so
+                    # rate limited requests do not all come back at once
+                    delay = settings.piston_rate_limit_backoff * 2 ** attempt
+                    await asyncio.sleep(delay * random.uniform(1, 1.5))
             
+            stdout, stderr, compile_error = self._parse_output(output)
+            return stdout, stderr, execution_time, compile_error
+        
         except asyncio.TimeoutError:
-            return "", f"Execution timeout after {self.timeout} seconds", None
+            return "", f"Execution timeout after {self.timeout} seconds", None, None
         except Exception as e:
             import traceback
             error_msg = f"{type(e).__name__}: {str(e)}"
             traceback_str = traceback.format_exc()
-            return "", f"{error_msg}\n{traceback_str}", None
-        finally:
-            # Clean up client session if it exists
-            if client is not None:
-                try:
-                    await client.close_session()
-                except Exception:
-                    # Ignore errors during cleanup
-                    pass
+            return "", f"{error_msg}\n{traceback_str}", None, None
     
-    def execute(
-        self,
-        code: str,
-        language: Language,
-        input_data: Optional[str] = None,
-    ) -> ExecutionResult:
+    def _parse_output(self, output) -> Tuple[str, str, Optional[str]]:
         """
-        Execute code and return result (synchronous wrapper)
-        Works both in sync and async contexts
+        Extract output and error from a Pyston response
+        Returns: (stdout, stderr, compile_error)
         """
-        # Check if we're in an async context with a running event loop
-        try:
-            loop = asyncio.get_running_loop()
-            # We're in an async context - run in a thread pool to avoid nested event loop
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(self._run_in_new_loop, code, language, input_data)
-                stdout, stderr, exec_time = future.result()
-        except RuntimeError:
-            # No running loop - we can use asyncio.run()
-            stdout, stderr, exec_time = self._run_in_new_loop(code, language, input_data)
+        stdout = ""
+        stderr = ""
+        compile_error = None
+        
+        if not output:
+            return stdout, stderr, compile_error
+        
+        # Piston API v2 responses have 'run' and 'compile' stages. The raw JSON
+        # is used when available because the Output model drops stderr.
+        raw = getattr(output, "raw_json", None)
+        if isinstance(raw, dict):
+            compile_stage = raw.get("compile") or {}
+            run_stage = raw.get("run") or {}
+            if compile_stage.get("code"):
+                # A failed compile stage means the run stage never happened
+                compile_error = (
+                    compile_stage.get("stderr")
+                    or compile_stage.get("output")
+                    or "Compilation failed"
+                )
+                return "", compile_error, compile_error
+            stdout = run_stage.get("stdout") or ""
+            stderr = run_stage.get("stderr") or ""
+            if compile_stage.get("stderr"):
+                # Prepend compiler warnings
+                stderr = (compile_stage["stderr"] + "\n" + stderr).strip()
+            return stdout, stderr, compile_error
+        
+        # Fallback: check for direct stdout/stderr attributes
+        if hasattr(output, 'stdout'):
+            stdout = output.stdout or ""
+        if hasattr(output, 'stderr'):
+            stderr = output.stderr or ""
+        
+        # Last resort: if output is a string
+        if not stdout and not stderr:
+            stdout = str(output) if output else ""
+        
+        return stdout, stderr, compile_error
+    
+    def prepare(self, code: str, language: Language) -> PreparedSubmission:
+        """
+        Prepare a submission for repeated runs.
+        Piston compiles on its side for every request, so nothing is built
+        here; instead the first compile failure is recorded on the prepared
+        submission and every later run returns it without another API call.
+        """
+        return PreparedSubmission(code=code, language=language)
+    
+    async def prepare_async(self, code: str, language: Language) -> PreparedSubmission:
+        """Async version of prepare()"""
+        return self.prepare(code, language)
+    
+    def _build_result(
+        self,
+        prepared: PreparedSubmission,
+        stdout: str,
+        stderr: str,
+        exec_time: Optional[float],
+        compile_error: Optional[str],
+    ) -> ExecutionResult:
+        """Turn a Piston response into an ExecutionResult"""
+        if compile_error:
+            prepared.compile_error = compile_error
+            prepared.compile_time = exec_time
         
         # Determine success
         error = stderr if stderr and stderr.strip() else None
@@ -152,28 +225,109 @@ class PystonExecutor:
             memory_used=None,  # Pyston API doesn't provide memory usage
         )
     
-    def _run_in_new_loop(
+    def _compile_error_result(self, prepared: PreparedSubmission) -> ExecutionResult:
+        """Result returned for every run of a submission that did not compile"""
+        return ExecutionResult(
+            success=False,
+            output="",
+            error=prepared.compile_error,
+            execution_time=prepared.compile_time,
+        )
+    
+    def run_prepared(
+        self,
+        prepared: PreparedSubmission,
+        input_data: Optional[str] = None,
+    ) -> ExecutionResult:
+        """
+        Run a prepared submission against one input (synchronous wrapper)
+        Works both in sync and async contexts; async callers should use
+        run_prepared_async() instead.
+        """
+        if not prepared.compiled:
+            return self._compile_error_result(prepared)
+        
+        # Check if we're in an async context with a running event loop
+        try:
+            loop = asyncio.get_running_loop()
+            # We're in an async context - run in a thread pool to avoid nested event loop
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                future = executor.submit(
+                    self._run_in_new_loop, prepared.code, prepared.language, input_data
+                )
+                response = future.result()
+        except RuntimeError:
+            # No running loop - we can use asyncio.run()
+            response = self._run_in_new_loop(prepared.code, prepared.language, input_data)
+        
+        return self._build_result(prepared, *response)
+    
+    async def run_prepared_async(
+        self,
+        prepared: PreparedSubmission,
+        input_data: Optional[str] = None,
+    ) -> ExecutionResult:
+        """Run a prepared submission against one input on the running event loop"""
+        if not prepared.compiled:
+            return self._compile_error_result(prepared)
+        
+        response = await self._execute_async(prepared.code, prepared.language, input_data)
+        return self._build_result(prepared, *response)
+    
+    def release(self, prepared: PreparedSubmission):
+        """Nothing is held for a Piston submission"""
+        pass
+    
+    async def release_async(self, prepared: PreparedSubmission):
+        """Async version of release()"""
+        pass
+    
+    def execute(
         self,
         code: str,
         language: Language,
         input_data: Optional[str] = None,
-    ) -> Tuple[str, str, Optional[float]]:
-        """Run async execution in a new event loop"""
-        return asyncio.run(self._execute_async(code, language, input_data))
+    ) -> ExecutionResult:
+        """
+        Execute code and return result (synchronous wrapper)
+        Works both in sync and async contexts
+        """
+        return self.run_prepared(self.prepare(code, language), input_data)
     
-    def execute_with_test_case(
+    async def execute_async(
         self,
         code: str,
         language: Language,
-        input_data: str,
+        input_data: Optional[str] = None,
+    ) -> ExecutionResult:
+        """Execute code and return result on the running event loop"""
+        return await self.run_prepared_async(self.prepare(code, language), input_data)
+    
+    def _run_in_new_loop(
+        self,
+        code: str,
+        language: Language,
+        input_data: Optional[str] = None,
+    ) -> Tuple[str, str, Optional[float], Optional[str]]:
+        """Run async execution in a new event loop"""
+        async def run():
+            try:
+                return await self._execute_async(code, language, input_data)
+            finally:
+                # The loop is discarded afterwards, so its client must go too
+                await self.close()
+        
+        return asyncio.run(run())
+    
+    def _compare(
+        self,
+        result: ExecutionResult,
         expected_output: str,
     ) -> Tuple[bool, str, Optional[str], Optional[float]]:
         """
-        Execute code with test case and compare output
+        Compare an execution result with the expected output
         Returns: (passed, actual_output, error, execution_time)
         """
-        result = self.execute(code, language, input_data)
-        
         if not result.success:
             return False, "", result.error, result.execution_time
         
@@ -183,8 +337,56 @@ class PystonExecutor:
         
         passed = actual == expected
         return passed, actual, result.error, result.execution_time
+    
+    def run_test_case(
+        self,
+        prepared: PreparedSubmission,
+        input_data: str,
+        expected_output: str,
+    ) -> Tuple[bool, str, Optional[str], Optional[float]]:
+        """
+        Run a prepared submission against a test case and compare output
+        Returns: (passed, actual_output, error, execution_time)
+        """
+        return self._compare(self.run_prepared(prepared, input_data), expected_output)
+    
+    async def run_test_case_async(
+        self,
+        prepared: PreparedSubmission,
+        input_data: str,
+        expected_output: str,
+    ) -> Tuple[bool, str, Optional[str], Optional[float]]:
+        """Async version of run_test_case()"""
+        result = await self.run_prepared_async(prepared, input_data)
+        return self._compare(result, expected_output)
+    
+    def parallel_test_cases(self) -> int:
+        """
+        Test cases of one submission that may run at once
+        Kept low by default: the public Piston API rate limits by client.
+        """
+        return settings.piston_max_parallel_test_cases
+    
+    def supports_batch(self, language: Language) -> bool:
+        """
+        Piston applies its run timeout to each request as a whole, so a batch
+        would share one test case's time limit; always run per test case.
+        """
+        return False
+    
+    def execute_with_test_case(
+        self,
+        code: str,
+        language: Language,
+        input_data: str,
+        expected_output: str,
+    ) -> Tuple[bool, str, Optional[str], Optional[float]]:
+        """
+        Execute code with test case and compare output
+        Returns: (passed, actual_output, error, execution_time)
+        """
+        return self.run_test_case(self.prepare(code, language), input_data, expected_output)
 
 
 # Global executor instance
 executor = PystonExecutor()
-
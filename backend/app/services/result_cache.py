@@ -0,0 +1,74 @@
+"""
+In-memory cache of test case outcomes for deterministic reruns
+Keys cover the code's content hash, the language, the test case (including
+its version, a hash of its input and expected output) and the executor, so
+editing a question's test cases or switching executors never serves a
+stale outcome.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.models.assessment import Language, TestCase
+
+# (passed, actual_output, error, execution_time)
+Outcome = Tuple[bool, str, Optional[str], Optional[float]]
+
+
+class ResultCache:
+    """LRU cache of test case outcomes with a time-to-live"""
+    
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Outcome]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+    
+    def key(self, code_hash: str, language: Language, test_case: TestCase, executor_id: str) -> str:
+        """Build the cache key for one test case run"""
+        return f"{executor_id}:{language.value}:{code_hash}:{test_case.id}:{test_case.version}"
+    
+    def get(self, key: str) -> Optional[Outcome]:
+        """Get a cached outcome, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            stored_at, outcome = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return outcome
+    
+    def put(self, key: str, outcome: Outcome):
+        """Store an outcome, evicting the least recently used entries when full"""
+        with self._lock:
+            self._entries[key] = (time.time(), outcome)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_rate": self._stats["hits"] / lookups if lookups else None,
+            }
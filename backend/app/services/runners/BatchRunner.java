@@ -0,0 +1,111 @@
+/*
+ * Runs a compiled Java solution against many test inputs in one JVM
+ *
+ * Usage: java -cp <runner dir> BatchRunner <solution classes dir> < frames
+ *
+ * Uses the same frames as batch_runner.py. Solution is loaded through a
+ * fresh class loader for every case, so its static state starts over each
+ * time. A case that exceeds the timeout cannot be stopped safely, so it is
+ * reported and the runner exits; the caller reruns the remaining cases.
+ */
+import java.io.*;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.util.concurrent.*;
+
+public class BatchRunner {
+    private static String readLine(InputStream in) throws IOException {
+        StringBuilder line = new StringBuilder();
+        int c;
+        while ((c = in.read()) != -1 && c != '\n') {
+            line.append((char) c);
+        }
+        return line.toString().trim();
+    }
+
+    private static String quote(String s) {
+        StringBuilder out = new StringBuilder("\"");
+        for (char c : s.toCharArray()) {
+            switch (c) {
+                case '"': out.append("\\\""); break;
+                case '\\': out.append("\\\\"); break;
+                case '\n': out.append("\\n"); break;
+                case '\r': out.append("\\r"); break;
+                case '\t': out.append("\\t"); break;
+                default:
+                    if (c < 0x20) {
+                        out.append(String.format("\\u%04x", (int) c));
+                    } else {
+                        out.append(c);
+                    }
+            }
+        }
+        return out.append('"').toString();
+    }
+
+    public static void main(String[] args) throws Exception {
+        URL[] classpath = { new File(args[0]).toURI().toURL() };
+        InputStream in = new BufferedInputStream(new FileInputStream(FileDescriptor.in));
+        String[] header = readLine(in).split(" ");
+        long timeoutMillis = (long) (Double.parseDouble(header[0]) * 1000);
+        int count = Integer.parseInt(header[1]);
+        byte[][] inputs = new byte[count][];
+        for (int i = 0; i < count; i++) {
+            inputs[i] = new byte[Integer.parseInt(readLine(in))];
+            new DataInputStream(in).readFully(inputs[i]);
+        }
+
+        PrintStream frames = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        for (int i = 0; i < count; i++) {
+            ByteArrayOutputStream stdout = new ByteArrayOutputStream();
+            ByteArrayOutputStream stderr = new ByteArrayOutputStream();
+            System.setIn(new ByteArrayInputStream(inputs[i]));
+            System.setOut(new PrintStream(stdout, true, "UTF-8"));
+            System.setErr(new PrintStream(stderr, true, "UTF-8"));
+
+            String status = "ok";
+            long start = System.nanoTime();
+            URLClassLoader loader = new URLClassLoader(classpath, ClassLoader.getPlatformClassLoader());
+            FutureTask<Void> task = new FutureTask<>(() -> {
+                Method main = loader.loadClass("Solution").getMethod("main", String[].class);
+                main.invoke(null, (Object) new String[0]);
+                return null;
+            });
+            Thread thread = new Thread(task, "main");
+            thread.setDaemon(true);
+            thread.start();
+            try {
+                task.get(timeoutMillis, TimeUnit.MILLISECONDS);
+            } catch (TimeoutException e) {
+                status = "timeout";
+            } catch (ExecutionException e) {
+                status = "error";
+                Throwable cause = e.getCause();
+                if (cause instanceof InvocationTargetException) {
+                    cause = cause.getCause();
+                }
+                System.err.print("Exception in thread \"main\" ");
+                cause.printStackTrace();
+            }
+            double elapsed = (System.nanoTime() - start) / 1e9;
+            System.out.flush();
+            System.err.flush();
+
+            frames.println("{\"case\": " + i
+                + ", \"status\": " + quote(status)
+                + ", \"stdout\": " + quote(stdout.toString("UTF-8"))
+                + ", \"stderr\": " + quote(stderr.toString("UTF-8"))
+                + ", \"time\": " + elapsed + "}");
+            if (status.equals("timeout")) {
+                // The solution thread cannot be stopped safely
+                frames.flush();
+                Runtime.getRuntime().halt(0);
+            }
+            loader.close();
+        }
+        frames.flush();
+    }
+}
@@ -0,0 +1,106 @@
+"""
+Runs a Python solution against many test inputs in one interpreter
+
+Usage: python3 batch_runner.py <solution.py> < frames
+
+Input frames (stdin): a header line "<timeout> <count>", then for every case
+a line with the input's length in bytes followed by the input itself.
+Output frames (stdout): one JSON object per case with its status ("ok",
+"error" or "timeout"), stdout, stderr and run time in seconds.
+
+The solution is re-executed as __main__ for every case, so its module-level
+state starts over each time. A case that exceeds the timeout is interrupted
+and reported; the remaining cases still run.
+"""
+import io
+import json
+import os
+import runpy
+import signal
+import sys
+import time
+import traceback
+
+
+class CaseTimeout(BaseException):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise CaseTimeout()
+
+
+def _read_frames(stream):
+    timeout, count = stream.readline().split()
+    inputs = []
+    for _ in range(int(count)):
+        size = int(stream.readline())
+        inputs.append(stream.read(size))
+    return float(timeout), inputs
+
+
+def _run_case(solution, data, timeout):
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    sys.stdin = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8")
+    sys.stdout = stdout
+    sys.stderr = stderr
+    sys.argv = [solution]
+    status = "ok"
+    start = time.perf_counter()
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        runpy.run_path(solution, run_name="__main__")
+    except CaseTimeout:
+        status = "timeout"
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            status = "error"
+            if isinstance(e.code, str):
+                stderr.write(e.code + "\n")
+    except BaseException as e:
+        status = "error"
+        # Drop the runner's own frames from the traceback
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != solution:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb, file=stderr)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    elapsed = time.perf_counter() - start
+    try:
+        sys.stdout.flush()
+    except Exception:
+        pass
+    return {
+        "status": status,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "time": elapsed,
+    }
+
+
+def main():
+    solution = os.path.abspath(sys.argv[1])
+    timeout, inputs = _read_frames(sys.stdin.buffer)
+    
+    # Keep the real stdout for result frames and point fds 0/1 elsewhere so
+    # the solution can neither read other cases' input nor corrupt frames
+    frames = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    
+    signal.signal(signal.SIGALRM, _on_alarm)
+    recursion_limit = sys.getrecursionlimit()
+    for index, data in enumerate(inputs):
+        result = _run_case(solution, data, timeout)
+        sys.stdin, sys.stdout, sys.stderr = sys.__stdin__, sys.__stdout__, sys.__stderr__
+        sys.setrecursionlimit(recursion_limit)
+        result["case"] = index
+        frames.write(json.dumps(result) + "\n")
+        frames.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Warm pool of pre-started gVisor sandboxes
+Each sandbox is an idle container (`sleep infinity`) per language that
+submissions are copied into and run with `docker exec`, so the common case
+skips container creation and runsc sandbox startup entirely.
+"""
+import subprocess
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+from app.models.assessment import Language
+
+
+class Sandbox:
+    """A running sandbox container for one language"""
+    
+    def __init__(self, name: str, language: Language):
+        self.name = name
+        self.language = language
+        self.uses = 0
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        # Cleared when a run leaves the sandbox in an unknown state (e.g. timeout)
+        self.healthy = True
+
+
+class SandboxPool:
+    """Per-language pool of idle sandboxes that are checked out for a run and then recycled or destroyed"""
+    
+    def __init__(
+        self,
+        start_command: Callable[[Language, str], List[str]],
+        reset_command: List[str],
+        sizes: Dict[Language, int],
+        max_reuse: int,
+        idle_ttl: int,
+    ):
+        self.start_command = start_command
+        self.reset_command = reset_command
+        self.sizes = sizes
+        self.max_reuse = max(1, max_reuse)
+        self.idle_ttl = idle_ttl
+        self._idle: Dict[Language, List[Sandbox]] = {language: [] for language in Language}
+        self._starting: Dict[Language, int] = {language: 0 for language in Language}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "started": 0, "recycled": 0, "destroyed": 0, "start_failures": 0}
+    
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+    
+    def _start(self, language: Language) -> Sandbox:
+        """Start a new sandbox container; raises RuntimeError if Docker fails"""
+        name = f"sandbox-{language.value}-{uuid.uuid4().hex[:12]}"
+        try:
+            result = subprocess.run(
+                self.start_command(language, name),
+                capture_output=True,
+                text=True,
+                timeout=60,
+            )
+        except subprocess.TimeoutExpired:
+            self._count("start_failures")
+            self._destroy_container(name)
+            raise RuntimeError(f"Timed out starting sandbox for {language.value}")
+        if result.returncode != 0:
+            self._count("start_failures")
+            raise RuntimeError(f"Failed to start sandbox for {language.value}:\n{result.stderr}")
+        self._count("started")
+        return Sandbox(name, language)
+    
+    def _destroy_container(self, name: str):
+        try:
+            subprocess.run(["docker", "rm", "-f", name], capture_output=True, timeout=30)
+        except Exception:
+            pass
+    
+    def _destroy(self, sandbox: Sandbox):
+        self._destroy_container(sandbox.name)
+        self._count("destroyed")
+    
+    def _in_background(self, target, *args):
+        threading.Thread(target=target, args=args, daemon=True).start()
+    
+    def _expired(self, sandbox: Sandbox, now: float) -> bool:
+        return self.idle_ttl > 0 and now - sandbox.last_used > self.idle_ttl
+    
+    def _take_expired(self) -> List[Sandbox]:
+        """Remove idle sandboxes past their TTL; caller must hold the lock"""
+        now = time.time()
+        expired = []
+        for language, idle in self._idle.items():
+            keep = [sandbox for sandbox in idle if not self._expired(sandbox, now)]
+            expired.extend(sandbox for sandbox in idle if self._expired(sandbox, now))
+            self._idle[language] = keep
+        return expired
+    
+    def _refill(self, language: Language):
+        """Start sandboxes until the language's idle target is met"""
+        while True:
+            with self._lock:
+                if len(self._idle[language]) + self._starting[language] >= self.sizes.get(language, 0):
+                    return
+                self._starting[language] += 1
+            try:
+                sandbox = self._start(language)
+            except RuntimeError:
+                return
+            finally:
+                with self._lock:
+                    self._starting[language] -= 1
+            with self._lock:
+                self._idle[language].append(sandbox)
+    
+    def reap(self):
+        """Destroy idle sandboxes that have been unused for longer than the idle TTL"""
+        with self._lock:
+            expired = self._take_expired()
+        for sandbox in expired:
+            self._destroy(sandbox)
+        for language in {sandbox.language for sandbox in expired}:
+            self._in_background(self._refill, language)
+    
+    def warm(self, languages: Optional[List[Language]] = None):
+        """Fill the pool up to its configured size (blocking)"""
+        for language in languages or list(Language):
+            self._refill(language)
+    
+    def checkout(self, language: Language) -> Sandbox:
+        """
+        Take an idle sandbox for the language, or start one if none is warm
+        Raises RuntimeError if a sandbox cannot be started
+        """
+        with self._lock:
+            expired = self._take_expired()
+            idle = self._idle[language]
+            sandbox = idle.pop() if idle else None
+        for stale in expired:
+            self._in_background(self._destroy, stale)
+        
+        if sandbox is not None:
+            self._count("hits")
+        else:
+            self._count("misses")
+            sandbox = self._start(language)
+        
+        # A sandbox with no reuse left will not come back, so top the pool
+        # back up off the request path
+        if self.sizes.get(language, 0) > 0 and sandbox.uses + 1 >= self.max_reuse:
+            self._in_background(self._refill, language)
+        return sandbox
+    
+    def _reset(self, sandbox: Sandbox) -> bool:
+        """Kill leftover processes and wipe writable paths; False if the sandbox is unusable"""
+        try:
+            result = subprocess.run(
+                ["docker", "exec", sandbox.name] + self.reset_command,
+                capture_output=True,
+                timeout=10,
+            )
+            return result.returncode == 0
+        except Exception:
+            return False
+    
+    def checkin(self, sandbox: Sandbox):
+        """Return a sandbox after a run, recycling it when it is healthy and has reuse left"""
+        sandbox.uses += 1
+        sandbox.last_used = time.time()
+        
+        with self._lock:
+            wanted = len(self._idle[sandbox.language]) < self.sizes.get(sandbox.language, 0)
+        recycle = wanted and sandbox.healthy and sandbox.uses < self.max_reuse
+        
+        if recycle and self._reset(sandbox):
+            with self._lock:
+                self._idle[sandbox.language].append(sandbox)
+            self._count("recycled")
+        else:
+            self._destroy(sandbox)
+            if wanted:
+                self._in_background(self._refill, sandbox.language)
+    
+    def shutdown(self):
+        """Destroy every idle sandbox"""
+        with self._lock:
+            idle = [sandbox for sandboxes in self._idle.values() for sandbox in sandboxes]
+            for sandboxes in self._idle.values():
+                sandboxes.clear()
+        for sandbox in idle:
+            self._destroy(sandbox)
+    
+    def stats(self) -> Dict:
+        """Hit/miss and lifecycle counters plus idle sandboxes per language"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else None,
+                "idle": {language.value: len(idle) for language, idle in self._idle.items()},
+                "sizes": {language.value: self.sizes.get(language, 0) for language in Language},
+            }
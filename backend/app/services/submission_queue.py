@@ -0,0 +1,134 @@
+"""
+Background grading of queued submissions
+POST /execute/jobs puts a submission in the shared JobQueue and returns at
+once. Each server process runs settings.submission_workers workers on its
+event loop, which take jobs from the queue, grade them as POST
+/execute/test does and store the graded submission in the job for clients
+polling GET /execute/jobs/{job_id}.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+import weakref
+from typing import Dict, List, Optional
+from app.api.responses import render
+from app.core.config import settings
+from app.db.job_queue import DONE, FAILED, JobQueue, job_queue
+from app.schemas.assessment import SubmissionResponse, TestExecutionRequest
+from app.services.grading import NotFoundError, find_submission, grade_submission
+
+# Seconds between looks for jobs queued by other processes
+POLL_INTERVAL = 1.0
+
+
+class SubmissionWorkers:
+    def __init__(self, queue: JobQueue, workers: int):
+        self.queue = queue
+        self.workers = max(0, workers)
+        # Identifies this process's leases in the shared queue
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        # Set when a job finishes in this process; entries go away with
+        # their last waiter
+        self._finished: "weakref.WeakValueDictionary[str, asyncio.Event]" = weakref.WeakValueDictionary()
+        self._busy = 0
+    
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        if self.workers:
+            self._tasks.append(asyncio.create_task(self._keep_leases()))
+    
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Jobs cut short are taken up again by the next worker to start,
+        # without waiting for their lease to run out
+        await asyncio.to_thread(self.queue.release, self.owner)
+    
+    async def submit(self, request: TestExecutionRequest) -> Dict:
+        """Queue a submission for grading; returns its job"""
+        job = await asyncio.to_thread(self.queue.enqueue, str(uuid.uuid4()), request.model_dump_json())
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+    
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict]:
+        """Get a job once it has finished, or as it is after timeout seconds"""
+        deadline = time.monotonic() + timeout
+        event = self._finished.setdefault(job_id, asyncio.Event())
+        while True:
+            job = await asyncio.to_thread(self.queue.get, job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in (DONE, FAILED) or remaining <= 0:
+                return job
+            # Jobs finished by other processes are only seen by polling
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _work(self):
+        while True:
+            self._wakeup.clear()
+            claimed = await asyncio.to_thread(
+                self.queue.claim, self.owner, settings.submission_job_lease, settings.submission_job_max_attempts
+            )
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(*claimed)
+    
+    async def _run(self, job_id: str, request: str, attempt: int):
+        result = error = None
+        self._busy += 1
+        try:
+            request = TestExecutionRequest.model_validate_json(request)
+            # The job ID doubles as the submission ID, so a job run again
+            # after its worker died once the submission was stored picks
+            # that submission up instead of storing a second one
+            submission = None
+            if attempt > 1:
+                submission = await asyncio.to_thread(find_submission, request, job_id)
+            if submission is None:
+                submission = await grade_submission(request, job_id)
+            result = render(SubmissionResponse, submission).decode("utf-8")
+        except (NotFoundError, ValueError) as e:
+            error = str(e)
+        except Exception as e:
+            logging.exception(f"Grading job {job_id} failed")
+            error = f"Execution error: {str(e)}"
+        finally:
+            self._busy -= 1
+        if not await asyncio.to_thread(self.queue.finish, job_id, self.owner, result, error):
+            logging.warning(f"Grading job {job_id} was taken over by another worker; its result is dropped")
+        event = self._finished.get(job_id)
+        if event is not None:
+            event.set()
+    
+    async def _keep_leases(self):
+        lease = settings.submission_job_lease
+        while True:
+            await asyncio.sleep(lease / 3)
+            try:
+                await asyncio.to_thread(self.queue.renew, self.owner, lease)
+                retention = settings.submission_job_retention_hours * 3600
+                await asyncio.to_thread(self.queue.purge, time.time() - retention)
+            except Exception as e:
+                logging.warning(f"Failed to renew grading job leases: {e}")
+    
+    def stats(self) -> Dict:
+        return {**self.queue.stats(), "workers": self.workers, "busy": self._busy}
+
+
+# Global worker pool
+submission_workers = SubmissionWorkers(job_queue, settings.submission_workers)
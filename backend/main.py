@@ -1,12 +1,44 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.router import api_router
 from app.core.config import settings
+from app.services.pyston_executor import executor as pyston_executor
+from app.services.gvisor_executor import executor as gvisor_executor
+from app.db.json_storage import storage
+from app.services.submission_queue import submission_workers
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.gvisor_prebuild_images:
+        # Build or verify sandbox runtime images once, off the request path
+        errors = await asyncio.to_thread(gvisor_executor.ensure_images)
+        for language, error in errors.items():
+            if error:
+                logging.error(f"Sandbox image for {language.value} is not ready: {error}")
+        # Pre-start warm sandboxes in the background
+        asyncio.get_running_loop().run_in_executor(None, gvisor_executor.pool.warm)
+    # Grade queued submissions, including any left over from before a restart
+    await submission_workers.start()
+    yield
+    # Hand unfinished jobs back to the queue
+    await submission_workers.stop()
+    # Destroy idle sandboxes
+    await asyncio.to_thread(gvisor_executor.pool.shutdown)
+    # Close pooled Piston API connections
+    await pyston_executor.close()
+    # Flush batched submission log writes
+    await asyncio.to_thread(storage.close)
+
 
 app = FastAPI(
     title="Coding Assessment Platform",
     description="Online coding assessment platform with gVisor sandbox execution",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware - use environment variable for allowed origins
@@ -16,6 +48,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Include API router
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Build (or verify) the per-language sandbox runtime images used by the gVisor executor
+Run this at deploy time so no image is built on the request path
+"""
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.gvisor_executor import executor
+
+
+def build_sandbox_images():
+    """Build or verify every runtime image"""
+    failed = False
+    for language, error in executor.ensure_images().items():
+        image_name = executor._get_image_name(language)
+        if error:
+            failed = True
+            print(f"✗ {image_name}: {error}")
+        else:
+            print(f"✓ {image_name}")
+    return not failed
+
+
+if __name__ == '__main__':
+    sys.exit(0 if build_sandbox_images() else 1)
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Delete stored code that no submission refers to any more, e.g. blobs left
+behind by a crash between writing the code and logging its submission.
+Safe to run while the server is up.
+
+Usage: python scripts/collect_blobs.py
+"""
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.db.json_storage import storage
+
+
+if __name__ == '__main__':
+    deleted = storage.collect_blobs()
+    storage.close()
+    print(f"✓ Deleted {deleted} unreferenced blobs")
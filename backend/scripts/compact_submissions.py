@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Rewrite stored submissions into the compact format
+Older submissions store their code and the full test data of every test
+result inline. This moves the code into the blob store and makes test
+results reference the test case by ID and version instead; test data that
+no longer matches the current assessment is kept in the test case archive
+first, so nothing is lost. Stop the server before running it.
+
+Usage: python scripts/compact_submissions.py [--backend json|sqlite] [--storage-path ./storage]
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.config import settings
+from app.models.assessment import TestCase, TestCaseType, source_hash, test_case_version
+
+
+def compact(record: dict, storage, store_code) -> bool:
+    """Drop inline code and test data from a submission record; returns whether it changed"""
+    changed = False
+    if "code" in record:
+        record["code_hash"] = source_hash(record["code"])
+        store_code(record.pop("code"), record["code_hash"])
+        changed = True
+    
+    found = storage.get_question(record["question_id"])
+    replaced = []
+    for result in record["test_results"]:
+        if "input" not in result:
+            continue
+        version = test_case_version(result["input"], result["expected_output"])
+        if found is None or found[1].find_test_case(result["test_case_id"], version) is None:
+            # Only the data matters to the archive, not the test case type
+            replaced.append(TestCase(
+                id=result["test_case_id"],
+                input=result["input"],
+                expected_output=result["expected_output"],
+                type=TestCaseType.HIDDEN,
+            ))
+        del result["input"], result["expected_output"]
+        result["test_case_version"] = version
+        changed = True
+    storage.archive_test_cases(replaced)
+    return changed
+
+
+def compact_json(storage_path: Path) -> int:
+    from app.db.json_storage import JSONStorage
+    storage = JSONStorage(str(storage_path))
+    log = storage.submission_log
+    staging = log.with_suffix(".jsonl.compact.tmp")
+    changed = 0
+    with open(log, "rb") as source, open(staging, "wb") as target:
+        for line in source:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if compact(record, storage, storage.blobs.put):
+                changed += 1
+                line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+            target.write(line)
+        target.flush()
+        os.fsync(target.fileno())
+    # The submission index (and with it the blob reference counts) is
+    # rebuilt on next start, as the log's inode changes
+    os.replace(staging, log)
+    storage.close()
+    return changed
+
+
+def compact_sqlite(database: Path) -> int:
+    from app.db.sqlite_storage import SQLiteStorage
+    storage = SQLiteStorage(str(database))
+    conn = storage._connection()
+    
+    def store_code(code: str, code_hash: str):
+        conn.execute(
+            """
+            INSERT INTO blobs (hash, data, refs) VALUES (?, ?, 1)
+            ON CONFLICT (hash) DO UPDATE SET refs = refs + 1
+            """,
+            (code_hash, code),
+        )
+    
+    changed = 0
+    rows = conn.execute("SELECT seq, data FROM submissions ORDER BY seq").fetchall()
+    with conn:
+        for seq, data in rows:
+            record = json.loads(data)
+            if compact(record, storage, store_code):
+                changed += 1
+                conn.execute(
+                    "UPDATE submissions SET data = ? WHERE seq = ?",
+                    (json.dumps(record, default=str), seq),
+                )
+    # Give the freed pages back to the file system
+    conn.execute("VACUUM")
+    storage.close()
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite stored submissions into the compact format")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default=settings.storage_backend)
+    parser.add_argument("--storage-path", default=settings.storage_path)
+    args = parser.parse_args()
+    
+    storage_path = Path(args.storage_path)
+    if args.backend == "sqlite":
+        path = Path(settings.sqlite_path or storage_path / "assessments.db")
+        before = path.stat().st_size
+        changed = compact_sqlite(path)
+    else:
+        path = storage_path / "submissions.jsonl"
+        before = path.stat().st_size
+        changed = compact_json(storage_path)
+    after = path.stat().st_size
+    print(f"✓ Compacted {changed} submissions; {path} shrank from {before:,} to {after:,} bytes")
+
+
+if __name__ == '__main__':
+    main()
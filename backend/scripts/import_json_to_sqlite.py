@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Import JSON storage (assessments.json, test_cases.json, the code blobs and
+submissions.jsonl or the legacy submissions.json) into the SQLite storage
+backend.
+Safe to re-run: records that are already in the database are skipped.
+
+Usage: python scripts/import_json_to_sqlite.py [--storage-path ./storage] [--database ./storage/assessments.db]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.config import settings
+from app.db.blob_store import BlobStore
+from app.db.sqlite_storage import SQLiteStorage
+from app.models.assessment import Assessment, Submission, TestCase, TestCaseType
+
+
+def read_submissions(storage_path: Path):
+    """Yield submission records from the submission log, or the legacy array file"""
+    log = storage_path / "submissions.jsonl"
+    if log.exists():
+        with open(log, "rb") as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        print(f"Skipping unreadable submission record: {line[:80]!r}")
+        return
+    legacy = storage_path / "submissions.json"
+    if legacy.exists():
+        yield from json.loads(legacy.read_text() or "[]")
+
+
+def import_json(storage_path: Path, database: Path):
+    storage = SQLiteStorage(str(database))
+    imported = {"assessments": 0, "submissions": 0, "skipped": 0}
+    
+    assessments_file = storage_path / "assessments.json"
+    records = json.loads(assessments_file.read_text() or "[]") if assessments_file.exists() else []
+    for record in records:
+        try:
+            storage.create_assessment(Assessment.from_dict(record))
+            imported["assessments"] += 1
+        except sqlite3.IntegrityError:
+            imported["skipped"] += 1
+    
+    archive_file = storage_path / "test_cases.json"
+    archived = json.loads(archive_file.read_text() or "[]") if archive_file.exists() else []
+    storage.archive_test_cases(
+        TestCase(id=tc["version"], input=tc["input"], expected_output=tc["expected_output"], type=TestCaseType.HIDDEN)
+        for tc in archived
+    )
+    
+    blobs = BlobStore(storage_path / "blobs")
+    for record in read_submissions(storage_path):
+        try:
+            storage.create_submission(Submission.from_dict(record, load_code=blobs.get))
+            imported["submissions"] += 1
+        except sqlite3.IntegrityError:
+            imported["skipped"] += 1
+    
+    storage.close()
+    return imported
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import JSON storage into SQLite")
+    parser.add_argument("--storage-path", default=settings.storage_path)
+    parser.add_argument("--database", default=None, help="Defaults to SQLITE_PATH or <storage-path>/assessments.db")
+    args = parser.parse_args()
+    
+    storage_path = Path(args.storage_path)
+    database = Path(args.database or settings.sqlite_path or storage_path / "assessments.db")
+    counts = import_json(storage_path, database)
+    print(
+        f"✓ Imported {counts['assessments']} assessments and {counts['submissions']} submissions "
+        f"into {database} ({counts['skipped']} already present)"
+    )
+    print("Set STORAGE_BACKEND=sqlite to use it")
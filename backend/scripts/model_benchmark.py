@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the storage models
+Builds N submissions with T test results each, then reports the memory held
+per submission and the throughput of to_dict + dumps and loads + from_dict,
+with orjson (if installed) and with the json module.
+
+Usage: python scripts/model_benchmark.py [--submissions 100000] [--test-results 10]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models import serialization
+from app.models.assessment import Language, Submission, TestResult, source_hash
+
+CODE = "print(sum(map(int, input().split())))\n"
+CODE_HASH = source_hash(CODE)
+
+
+def make_submission(i: int, test_results: int) -> Submission:
+    return Submission(
+        id=f"s{i}",
+        assessment_id=f"assessment-{i % 10}",
+        question_id=f"q{i % 5}",
+        candidate_id=f"candidate-{i % 1000}",
+        code=CODE,
+        code_hash=CODE_HASH,
+        language=Language.PYTHON,
+        test_results=[
+            TestResult(
+                test_case_id=f"t{j}",
+                passed=j % 3 != 0,
+                input=None,
+                expected_output=None,
+                actual_output=f"{i * j}\n",
+                execution_time=0.01 * j,
+                test_case_version=f"{j:016x}",
+            )
+            for j in range(test_results)
+        ],
+        sample_passed=2,
+        sample_total=3,
+        hidden_passed=5,
+        hidden_total=7,
+    )
+
+
+def timed(label: str, count: int, run):
+    # As timeit does, so collections triggered by the objects kept alive do
+    # not dominate the timings
+    gc.collect()
+    gc.disable()
+    start = time.perf_counter()
+    try:
+        result = run()
+    finally:
+        elapsed = time.perf_counter() - start
+        gc.enable()
+    print(f"  {label:<28} {elapsed:7.2f}s  {count / elapsed:>10,.0f}/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the storage models")
+    parser.add_argument("--submissions", type=int, default=100_000)
+    parser.add_argument("--test-results", type=int, default=10)
+    args = parser.parse_args()
+    n = args.submissions
+    
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    submissions = [make_submission(i, args.test_results) for i in range(n)]
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"{n:,} submissions with {args.test_results} test results each")
+    print(f"  memory per submission       {held / n:,.0f} bytes")
+    
+    codecs = [("json", lambda d: json.dumps(d).encode("utf-8"), json.loads)]
+    if serialization.orjson is not None:
+        codecs.insert(0, ("orjson", serialization.orjson.dumps, serialization.orjson.loads))
+    for name, dumps, loads in codecs:
+        print(name)
+        lines = timed("to_dict + dumps", n, lambda: [dumps(s.to_dict()) for s in submissions])
+        timed("loads + from_dict", n, lambda: [Submission.from_dict(loads(line)) for line in lines])
+        print(f"  record size                 {sum(map(len, lines)) / n:,.0f} bytes")
+
+
+if __name__ == '__main__':
+    main()
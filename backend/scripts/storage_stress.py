@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for JSONStorage
+Starts several worker processes that create submissions and assessments in
+one storage directory at the same time (as uvicorn/gunicorn workers would),
+then checks that nothing was lost or corrupted.
+
+Usage: python scripts/storage_stress.py [--workers 8] [--submissions 200] [--assessments 20] [--backend json|sqlite] [--segment-mb 1]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def make_submission(worker: int, i: int):
+    from app.models.assessment import Language, Submission
+    # Every tenth record is large enough to need several write() calls
+    code = "print('hello')\n" * (8000 if i % 10 == 0 else 1)
+    return Submission(
+        id=f"w{worker}-s{i}",
+        assessment_id=f"assessment-{i % 3}",
+        question_id=f"q{i % 5}",
+        candidate_id=f"candidate-{worker}",
+        code=code,
+        language=Language.PYTHON,
+        test_results=[],
+        sample_passed=0,
+        sample_total=0,
+        hidden_passed=0,
+        hidden_total=0,
+    )
+
+
+def make_assessment(worker: int, i: int):
+    from app.models.assessment import Assessment
+    return Assessment(
+        id=f"assessment-w{worker}-{i}",
+        title=f"Worker {worker} #{i}",
+        description="Created by the storage stress test",
+        questions=[],
+        duration=60,
+    )
+
+
+def open_storage(backend: str, storage_path: str):
+    if backend == "sqlite":
+        from app.db.sqlite_storage import SQLiteStorage
+        return SQLiteStorage(os.path.join(storage_path, "assessments.db"))
+    from app.db.json_storage import JSONStorage
+    return JSONStorage(storage_path)
+
+
+def worker(backend: str, storage_path: str, worker_id: int, submissions: int, assessments: int, start):
+    storage = open_storage(backend, storage_path)
+    start.wait()
+    # Spread assessment read-modify-writes across the submission writes
+    every = max(1, submissions // max(1, assessments))
+    created = 0
+    for i in range(submissions):
+        storage.create_submission(make_submission(worker_id, i))
+        if i % every == 0 and created < assessments:
+            storage.create_assessment(make_assessment(worker_id, created))
+            created += 1
+        if i % 50 == 0:
+            # Interleave reads with the writes of other workers
+            storage.get_submissions(candidate_id=f"candidate-{worker_id}")
+    while created < assessments:
+        storage.create_assessment(make_assessment(worker_id, created))
+        created += 1
+    for i in range(assessments):
+        assessment = storage.get_assessment(f"assessment-w{worker_id}-{i}")
+        if assessment is not None:
+            assessment.title += " (updated)"
+            storage.update_assessment(assessment)
+    storage.close()
+
+
+def check(backend: str, storage_path: str, workers: int, submissions: int, assessments: int) -> list:
+    """Return a list of problems found in the storage directory"""
+    problems = []
+    
+    if backend == "json":
+        with open(os.path.join(storage_path, "submissions.jsonl"), "rb") as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    json.loads(line)
+                except ValueError:
+                    problems.append(f"submissions.jsonl line {number} is corrupt")
+        
+        # Drop the index checkpoint so it is rebuilt from the log as well
+        os.remove(os.path.join(storage_path, "submissions.idx.json"))
+    storage = open_storage(backend, storage_path)
+    
+    ids = [s.id for s in storage.get_submissions()]
+    expected = workers * submissions
+    if len(ids) != expected:
+        problems.append(f"expected {expected} submissions, found {len(ids)}")
+    if len(set(ids)) != len(ids):
+        problems.append("duplicate submissions found")
+    
+    for worker_id in range(workers):
+        mine = storage.get_submissions(candidate_id=f"candidate-{worker_id}")
+        if len(mine) != submissions:
+            problems.append(f"candidate-{worker_id}: expected {submissions} indexed submissions, found {len(mine)}")
+    
+    titles = {a.id: a.title for a in storage.get_all_assessments()}
+    lost = [
+        f"assessment-w{worker_id}-{i}"
+        for worker_id in range(workers)
+        for i in range(assessments)
+        if titles.get(f"assessment-w{worker_id}-{i}") != f"Worker {worker_id} #{i} (updated)"
+    ]
+    if lost:
+        problems.append(f"{len(lost)} of {workers * assessments} assessments lost or not updated, e.g. {lost[0]}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--submissions", type=int, default=200, help="Submissions per worker")
+    parser.add_argument("--assessments", type=int, default=20, help="Assessments created and updated per worker")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--segment-mb", type=float, default=None, help="Roll the JSON submission log at this size")
+    args = parser.parse_args()
+    if args.segment_mb is not None:
+        os.environ["SUBMISSION_SEGMENT_MAX_MB"] = str(args.segment_mb)
+    
+    with tempfile.TemporaryDirectory(prefix="storage_stress_") as storage_path:
+        # The module-level storage instance must not touch the real storage
+        os.environ["STORAGE_PATH"] = storage_path
+        
+        start = multiprocessing.Event()
+        processes = [
+            multiprocessing.Process(target=worker, args=(args.backend, storage_path, i, args.submissions, args.assessments, start))
+            for i in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        started = time.time()
+        start.set()
+        for process in processes:
+            process.join()
+        elapsed = time.time() - started
+        
+        failed = [p for p in processes if p.exitcode != 0]
+        problems = [f"{len(failed)} worker(s) crashed"] if failed else []
+        problems += check(args.backend, storage_path, args.workers, args.submissions, args.assessments)
+        
+        total = args.workers * args.submissions
+        print(
+            f"{args.workers} workers wrote {total} submissions and "
+            f"{args.workers * args.assessments} assessments in {elapsed:.2f}s"
+        )
+        for problem in problems:
+            print(f"✗ {problem}")
+        if not problems:
+            print("✓ No lost or corrupted submissions or assessments")
+        return not problems
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -70,7 +70,9 @@ const TestResults = ({ submission, showHidden = false }) => {
           return (
             <div
               key={testResult.test_case_id}
-              className={`test-case ${testResult.passed ? 'passed' : 'failed'} ${
+              className={`test-case ${
+                testResult.skipped ? 'skipped' : testResult.passed ? 'passed' : 'failed'
+              } ${
                 isHidden ? 'hidden' : ''
               }`}
             >
@@ -80,11 +82,12 @@ const TestResults = ({ submission, showHidden = false }) => {
               >
                 <div className="test-case-status">
                   <span className="status-icon">
-                    {testResult.passed ? '✓' : '✗'}
+                    {testResult.skipped ? '–' : testResult.passed ? '✓' : '✗'}
                   </span>
                   <span className="test-case-name">
                     Test Case {index + 1}
                     {isHidden && ' (Hidden)'}
+                    {testResult.skipped && ' (Skipped)'}
                   </span>
                 </div>
                 <div className="test-case-meta">
@@ -27,7 +27,7 @@ export const executeWithTests = async (
   candidateId = 'anonymous',
   includeHidden = false
 ) => {
-  const response = await api.post('/execute/test', {
+  const response = await api.post('/execute/jobs', {
     code,
     language,
     question_id: questionId,
@@ -35,7 +35,16 @@ export const executeWithTests = async (
     candidate_id: candidateId,
     include_hidden: includeHidden,
   })
-  return response.data
+  // Grading runs in the background; long-poll the job until it finishes
+  let job = response.data
+  while (job.status === 'queued' || job.status === 'running') {
+    const poll = await api.get(`/execute/jobs/${job.id}`, { params: { wait: 20 } })
+    job = poll.data
+  }
+  if (job.status === 'failed') {
+    throw new Error(job.error || 'Execution failed')
+  }
+  return job.submission
 }
 
 export const getSubmissions = async (assessmentId, questionId, candidateId) => {